@@ -1,7 +1,12 @@
 import os
 import json
 
+from automator.logger import configure_logging
 from automator.tasks import AutomatorTasks
+from automator.async_tasks import AsyncAutomatorTasks
+from automator.base.contracts import install_abi_cache
+from automator.utils import configure_metrics_publisher
+from automator.base.metrics import start_metrics_server
 
 
 def options_from_config(filename=None):
@@ -24,9 +29,30 @@ if __name__ == '__main__':
     if 'APP_CONFIG' in os.environ:
         config = json.loads(os.environ['APP_CONFIG'])
 
+    # queue logging, json lines and deduplication of repeated lines
+    configure_logging(config.get('logging', dict()))
+
     # override connection uri from env
     if 'APP_CONNECTION_URI' in os.environ:
         config['uri'] = os.environ['APP_CONNECTION_URI']
+        # several nodes separated by comma
+        if ',' in config['uri']:
+            config['uri'] = [uri.strip() for uri in config['uri'].split(',')]
+
+    # precompiled abis and selectors (python -m automator.base.abi_cache abi_cache.json)
+    if config.get('abi_cache') and os.path.isfile(config['abi_cache']):
+        install_abi_cache(config['abi_cache'])
+
+    # cloudwatch metrics are buffered and published in background
+    configure_metrics_publisher(config.get('cloudwatch', dict()))
+
+    # execution engine: thread pool (default) or asyncio
+    if config.get('engine', 'thread') == 'asyncio':
+        moc_tasks = AsyncAutomatorTasks(config)
+    else:
+        moc_tasks = AutomatorTasks(config)
+
+    # prometheus /metrics endpoint next to the tasks loop
+    start_metrics_server(config)
 
-    moc_tasks = AutomatorTasks(config)
     moc_tasks.start_loop()
@@ -0,0 +1,290 @@
+import asyncio
+import datetime
+
+from .base.main import AsyncConnectionHelper
+from .base.gas import multiply_gas_price
+from .base.metrics import metrics
+from .async_tasks_manager import AsyncPendingTransactionsTasksManager, on_pending_transactions_async
+from .jobs import AutomatorJobs, Read, Send, BlockNumber
+from .logger import log
+
+
+def unsupported_settings(config):
+    """ Settings of config.json only implemented by the thread engine """
+
+    unsupported = list()
+
+    for section in ('block_watcher', 'confirmations', 'replacement', 'simulation', 'journal', 'addresses_snapshot'):
+        if config.get(section, dict()).get('enabled', False):
+            unsupported.append('{0}.enabled'.format(section))
+
+    if isinstance(config['uri'], list) and len(config['uri']) > 1:
+        unsupported.append('several nodes in uri')
+    if config.get('gas_price', dict()).get('strategy', 'node') != 'node':
+        unsupported.append('gas_price.strategy')
+    if config.get('concurrency_groups'):
+        unsupported.append('concurrency_groups')
+    if config.get('senders', dict()).get('policy', 'single') != 'single':
+        unsupported.append('senders.policy')
+
+    tasks_settings = list()
+    for task_name, task_settings in config['tasks'].items():
+        if isinstance(task_settings, list):
+            tasks_settings += [('{0}.{1}'.format(task_name, index), settings)
+                               for index, settings in enumerate(task_settings)]
+        else:
+            tasks_settings.append((task_name, task_settings))
+
+    for task_name, task_settings in tasks_settings:
+        for setting in ('on_block', 'hedge', 'account', 'concurrency_group'):
+            if task_settings.get(setting) not in (None, False):
+                unsupported.append('tasks.{0}.{1}'.format(task_name, setting))
+        if task_settings.get('adaptive_steps', dict()).get('enabled', False):
+            unsupported.append('tasks.{0}.adaptive_steps.enabled'.format(task_name))
+
+    return unsupported
+
+
+class AsyncAutomator(AutomatorJobs, AsyncPendingTransactionsTasksManager):
+    """ Same jobs of Automator (AutomatorJobs) on the asyncio engine """
+
+    def __init__(self,
+                 config,
+                 connection_helper,
+                 contracts_loaded
+                 ):
+        self.config = config
+        self.connection_helper = connection_helper
+        self.contracts_loaded = contracts_loaded
+
+        # init AsyncPendingTransactionsTasksManager
+        super().__init__(self.config,
+                         self.connection_helper,
+                         self.contracts_loaded)
+
+    async def send_task_transaction(self, task, task_result, tx_function, *tx_args, task_settings=None, extra=None):
+        """ Send the transaction and add it to the pending transactions of the task,
+        extra fields are kept with the pending transaction """
+
+        connection_manager = self.connection_helper.connection_manager
+        web3 = connection_manager.web3
+
+        # tasks run concurrently, nonce and send must be atomic per account
+        async with connection_manager.send_lock:
+
+            nonce, gas_price = await asyncio.gather(
+                web3.eth.get_transaction_count(connection_manager.accounts[0].address, "pending"),
+                web3.eth.gas_price)
+
+            # Multiply factor of the using gas price
+            gas_price = multiply_gas_price(gas_price, self.config['gas_price_multiply_factor'])
+
+            try:
+                tx_hash = await tx_function(
+                    *tx_args,
+                    gas_limit=task_settings['gas_limit'],
+                    gas_price=gas_price,
+                    nonce=nonce
+                )
+            except ValueError as err:
+                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
+                return None
+
+        if tx_hash:
+            new_tx = dict()
+            new_tx['hash'] = tx_hash
+            new_tx['timestamp'] = datetime.datetime.now()
+            new_tx['gas_price'] = gas_price
+            new_tx['nonce'] = nonce
+            new_tx['timeout'] = task_settings['wait_timeout']
+            if extra:
+                new_tx.update(extra)
+            task_result['pending_transactions'].append(new_tx)
+            metrics.transaction_event(task.task_name, 'sent')
+
+            log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]",
+                     task.task_name, new_tx['hash'], new_tx['nonce'], gas_price)
+
+        return tx_hash
+
+    async def run_job(self, job):
+        """ Run the shared body of the task (see AutomatorJobs) awaiting its requests """
+
+        try:
+            request = next(job)
+            while True:
+                request = job.send(await self.job_request(request))
+        except StopIteration as stop:
+            return stop.value
+
+    async def job_request(self, request):
+        """ Reads of a list at the same time """
+
+        if isinstance(request, list):
+            return list(await asyncio.gather(*[self.job_request(read) for read in request]))
+
+        if isinstance(request, Read):
+            return await request.function(*request.args).call()
+
+        if isinstance(request, Send):
+            return await self.send_task_transaction(*request.args, **request.kwargs)
+
+        if isinstance(request, BlockNumber):
+            return await self.connection_helper.connection_manager.block_number
+
+        raise Exception("Not valid request of the job: {0}".format(request))
+
+    @on_pending_transactions_async
+    async def calculate_ema(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.calculate_ema_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def daily_inrate_payment(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.daily_inrate_payment_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def run_settlement(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.run_settlement_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def contract_liquidation(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.contract_liquidation_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def pay_bitpro_holders(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.pay_bitpro_holders_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def oracle_poke(self, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.oracle_poke_job(task, global_manager, task_result))
+
+    @on_pending_transactions_async
+    async def commission_splitter(self, index, task=None, global_manager=None, task_result=None):
+
+        return await self.run_job(self.commission_splitter_job(index, task, global_manager, task_result))
+
+
+class AsyncAutomatorTasks(AsyncAutomator):
+
+    def __init__(self, config):
+
+        self.config = config
+        self.app_mode = self.config['app_mode']
+
+        # refuse the settings it would silently ignore
+        unsupported = unsupported_settings(self.config)
+        if unsupported:
+            raise Exception("Not supported by the asyncio engine, use \"engine\": \"thread\" "
+                            "or disable them: {0}".format(', '.join(unsupported)))
+
+        self.connection_helper = AsyncConnectionHelper(config)
+
+        self.contracts_loaded = dict()
+        self.contracts_addresses = dict()
+
+        # init automator
+        super().__init__(self.config,
+                         self.connection_helper,
+                         self.contracts_loaded)
+
+        # Add tasks
+        self.schedule_tasks()
+
+    async def load_contracts(self):
+        """ Get contract address to use later """
+
+        log.info("Getting addresses from Main Contract...")
+
+        self.load_main_contracts()
+
+        self.load_protocol_contracts(await self.run_job(self.discover_addresses_job()))
+
+    def schedule_tasks(self):
+
+        log.info("Starting adding tasks...")
+
+        # run_settlement
+        if 'run_settlement' in self.config['tasks']:
+            log.info("Jobs add: 2. Run Settlement")
+            interval = self.config['tasks']['run_settlement']['interval']
+            self.add_task(self.run_settlement,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='2. Run Settlement')
+
+        # liquidation
+        if 'liquidation' in self.config['tasks']:
+            log.info("Jobs add: 1. Liquidation")
+            interval = self.config['tasks']['liquidation']['interval']
+            self.add_task(self.contract_liquidation,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='1. Liquidation')
+
+        # Daily inrate payment
+        if 'daily_inrate_payment' in self.config['tasks']:
+            log.info("Jobs add: 3. Daily Inrate Payment")
+            interval = self.config['tasks']['daily_inrate_payment']['interval']
+            self.add_task(self.daily_inrate_payment,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='3. Daily Inrate Payment')
+
+        # pay bitpro holders
+        if 'pay_bitpro_holders' in self.config['tasks']:
+            log.info("Jobs add: 4. Pay Bitpro Holders")
+            interval = self.config['tasks']['pay_bitpro_holders']['interval']
+            self.add_task(self.pay_bitpro_holders,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='4. Pay Bitpro Holders')
+
+        # calculate EMA
+        if 'calculate_bma' in self.config['tasks']:
+            log.info("Jobs add: 5. Calculate EMA")
+            interval = self.config['tasks']['calculate_bma']['interval']
+            self.add_task(self.calculate_ema,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='5. Calculate EMA')
+
+        # Oracle Poke
+        if 'oracle_poke' in self.config['tasks']:
+            log.info("Jobs add: 6. Oracle Compute")
+            interval = self.config['tasks']['oracle_poke']['interval']
+            self.add_task(self.oracle_poke,
+                          args=[],
+                          wait=interval,
+                          timeout=180,
+                          task_name='6. Oracle Compute')
+
+        # Commission splitters
+        if 'commission_splitters' in self.config['tasks']:
+            count = 0
+            for setting_commission in self.config['tasks']['commission_splitters']:
+                log.info("Jobs add: 7. Commission Splitter: {0}".format(setting_commission['address']))
+                interval = setting_commission['interval']
+                self.add_task(self.commission_splitter,
+                              args=[count],
+                              wait=interval,
+                              timeout=180,
+                              task_name="7. Commission Splitter: {0}".format(setting_commission['address']))
+                count += 1
+
+    async def run_loop(self):
+
+        # contract addresses
+        await self.load_contracts()
+
+        await super().run_loop()
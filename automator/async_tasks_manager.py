@@ -0,0 +1,171 @@
+import asyncio
+import signal
+import datetime
+import uuid
+from functools import wraps
+from web3 import exceptions
+
+from .base.metrics import metrics
+from .logger import log
+from .tasks_manager import Task, update_pending_transactions
+
+
+class AsyncTransactionsTasksManager:
+    """ Event loop scheduler, every task is a coroutine so the node calls of
+    all the tasks are in flight at the same time on one thread """
+
+    def __init__(self):
+        self.tasks = dict()
+        self.timeout = 180
+        self.stop_event = None
+
+    def add_task(self, func, args=None, kwargs=None, wait=1, timeout=180, tid=None, task_name='Task N'):
+
+        if not tid:
+            tid = uuid.uuid4()
+
+        task = Task(func, args=args, kwargs=kwargs, wait=wait, timeout=timeout, task_name=task_name)
+        self.tasks[tid] = task
+
+    def on_task_done(self, task, result):
+
+        task.result = result
+        if isinstance(task.result, dict):
+            if 'shutdown' in task.result:
+                if task.result['shutdown']:
+                    task.shutdown = True
+            elif 'pending_transactions' in task.result:
+                task.pending_transactions = task.result['pending_transactions']
+
+    async def run_task(self, task, global_manager=None):
+        """ Run the task every task.wait seconds until shutdown """
+
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + task.wait
+
+        while not self.stop_event.is_set():
+
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=max(0.0, next_run - loop.time()))
+                break
+            except asyncio.TimeoutError:
+                pass
+
+            task.running = True
+            start = loop.time()
+            task.last_delay = start - next_run
+            # pass task object as vars to run funtion
+            task.kwargs["task"] = task
+            task.kwargs["global_manager"] = global_manager
+            try:
+                result = await asyncio.wait_for(task.func(*task.args, **task.kwargs), timeout=task.timeout)
+                self.on_task_done(task, result)
+            except asyncio.TimeoutError:
+                log.info("Function took longer than %d seconds. Task going to cancel!" % task.timeout)
+                metrics.task_error(task.task_name)
+            except Exception as e:
+                log.info("Function raised %s" % e)
+                log.info(e, exc_info=True)
+                metrics.task_error(task.task_name)
+            metrics.observe_task(task.task_name, loop.time() - start, task.last_delay)
+
+            task.last_run = datetime.datetime.now()
+            task.running = False
+
+            # shutdown task manager!
+            if task.shutdown:
+                self.stop_event.set()
+                break
+
+            next_run = loop.time() + task.wait
+
+    async def run_loop(self):
+
+        log.info("Start Task jobs loop")
+
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.on_terminate_signal)
+
+        global_manager = dict()
+        runners = [asyncio.create_task(self.run_task(task, global_manager=global_manager))
+                   for task in self.tasks.values()]
+
+        await self.stop_event.wait()
+        log.info("Terminal Signal received... Going to shutdown... stop pooling now!")
+
+        # wait to finish tasks ...
+        done, pending = await asyncio.wait(runners, timeout=self.timeout)
+        for runner in pending:
+            runner.cancel()
+
+        log.info("End Task Jobs loop")
+
+    def on_terminate_signal(self):
+        log.info("Termination request received!")
+        self.stop_event.set()
+
+    def start_loop(self):
+
+        asyncio.run(self.run_loop())
+
+
+def on_pending_transactions_async(method):
+    @wraps(method)
+    async def _impl(self, *method_args, **method_kwargs):
+        pending_txs, confirmed_txs = await self.pending_transactions(method_kwargs['task'])
+        task_result = dict()
+        task_result['pending_transactions'] = pending_txs
+        task_result['confirmed_txs'] = confirmed_txs
+        method_kwargs['task_result'] = task_result
+        method_result = await method(self, *method_args, **method_kwargs)
+        return method_result
+    return _impl
+
+
+class AsyncPendingTransactionsTasksManager(AsyncTransactionsTasksManager):
+
+    def __init__(self,
+                 config,
+                 connection_helper,
+                 contracts_loaded
+                 ):
+
+        AsyncTransactionsTasksManager.__init__(self)
+
+        self.config = config
+        self.connection_helper = connection_helper
+        self.contracts_loaded = contracts_loaded
+
+    async def lookup_transaction(self, tx):
+        """ (tx, transaction found, transaction receipt or None) """
+
+        web3 = self.connection_helper.connection_manager.web3
+
+        try:
+            await web3.eth.get_transaction(tx['hash'])
+        except exceptions.TransactionNotFound:
+            return tx, False, None
+
+        try:
+            tx_rcp = await web3.eth.get_transaction_receipt(tx['hash'])
+        except exceptions.TransactionNotFound:
+            tx_rcp = None
+
+        return tx, True, tx_rcp
+
+    async def pending_transactions(self, task, account_index=0):
+        """ Iterate on pending list and change status if need it """
+
+        web3 = self.connection_helper.connection_manager.web3
+
+        # get index account, default first index 0
+        account_address = self.connection_helper.connection_manager.accounts[account_index].address
+
+        # get the last nonce and the status of all the pending transactions at the same time
+        last_used_nonce, *tx_lookups = await asyncio.gather(
+            web3.eth.get_transaction_count(account_address),
+            *[self.lookup_transaction(tx) for tx in task.pending_transactions or list()])
+
+        return update_pending_transactions(task, last_used_nonce, tx_lookups)
@@ -0,0 +1,52 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+
+Precompiled cache of the abi files of the package and the selectors of their functions,
+one compact json file (abis keyed by file, selectors as hex) loaded with install_abi_cache
+instead of parsing every json abi.
+
+Usage: python -m automator.base.abi_cache abi_cache.json
+"""
+
+import glob
+import json
+import os
+import sys
+
+from eth_utils.abi import abi_to_signature, function_abi_to_4byte_selector
+
+from .contracts import package_dir
+
+
+def build(cache_file):
+    """ Write the cache file, return the number of abis and selectors """
+
+    abis = dict()
+    selectors = dict()
+    for abi_file in sorted(glob.glob(os.path.join(package_dir, '**', '*.abi'), recursive=True)):
+        with open(abi_file) as f:
+            abi = json.load(f)
+        abis[os.path.relpath(abi_file, package_dir)] = abi
+        for item in abi:
+            if item.get('type') == 'function':
+                selectors[abi_to_signature(item)] = function_abi_to_4byte_selector(item).hex()
+
+    with open(cache_file, 'w') as f:
+        json.dump(dict(abis=abis, selectors=selectors), f, separators=(',', ':'))
+
+    return len(abis), len(selectors)
+
+
+if __name__ == '__main__':
+    cache_file = sys.argv[1] if len(sys.argv) > 1 else 'abi_cache.json'
+    count_abis, count_selectors = build(cache_file)
+    print("ABI cache :: {0} :: {1} abis, {2} selectors".format(cache_file, count_abis, count_selectors))
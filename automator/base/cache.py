@@ -0,0 +1,200 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import json
+import logging
+import threading
+import time
+
+from web3.middleware import Web3Middleware
+
+
+class BlockReadCache(object):
+    """ Read-through cache of node reads keyed by (block number, method, params).
+    All the entries are dropped when a new block head is seen. """
+
+    log = logging.getLogger()
+
+    # reads that can not change inside a block
+    cached_methods = ('eth_call',
+                      'eth_getBalance',
+                      'eth_gasPrice',
+                      'eth_getTransactionCount',
+                      'eth_getCode',
+                      'eth_chainId')
+
+    def __init__(self, head_max_age=1):
+
+        # seconds the last seen head is trusted before asking again eth_blockNumber
+        self.head_max_age = head_max_age
+
+        self.lock = threading.Lock()
+        self.entries = dict()
+        self.head = None
+        self.head_checked_at = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def set_head(self, block_number):
+        """ New block head seen, drop the entries of older blocks """
+
+        with self.lock:
+            self.head_checked_at = time.monotonic()
+            if self.head is not None and block_number <= self.head:
+                return
+            self.head = block_number
+            if self.entries:
+                self.entries = dict()
+                self.invalidations += 1
+
+    def invalidate_pending(self):
+        """ Entries that change with our own transactions (pending state, nonces) """
+
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if key[1] == 'eth_getTransactionCount' or '"pending"' in key[2]:
+                    del self.entries[key]
+
+    def head_is_stale(self):
+
+        return self.head is None or self.head_checked_at is None or time.monotonic() - self.head_checked_at >= self.head_max_age
+
+    def key(self, method, params):
+
+        return self.head, method, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, key):
+
+        with self.lock:
+            response = self.entries.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, key, response):
+
+        if 'error' in response or key[0] != self.head:
+            return
+
+        with self.lock:
+            self.entries[key] = response
+
+    def stats(self):
+        """ Hit / miss counters """
+
+        return dict(head=self.head,
+                    entries=len(self.entries),
+                    hits=self.hits,
+                    misses=self.misses,
+                    invalidations=self.invalidations)
+
+    def head_response(self):
+        """ eth_blockNumber response from the last seen head """
+
+        with self.lock:
+            self.hits += 1
+        return {'jsonrpc': '2.0', 'id': 0, 'result': hex(self.head)}
+
+    def on_block_number(self, response):
+
+        if 'result' in response and response['result'] is not None:
+            block_number = response['result']
+            if isinstance(block_number, str):
+                block_number = int(block_number, 16)
+            self.set_head(block_number)
+
+    def middleware(self, w3):
+        """ Web3 middleware on this cache, ex.: w3.middleware_onion.inject(cache.middleware, layer=0) """
+
+        return BlockReadCacheMiddleware(w3, self)
+
+
+class BlockReadCacheMiddleware(Web3Middleware):
+
+    def __init__(self, w3, cache):
+        super().__init__(w3)
+        self.cache = cache
+
+    def wrap_make_request(self, make_request):
+
+        cache = self.cache
+
+        def middleware(method, params):
+
+            if method == 'eth_blockNumber':
+                if not cache.head_is_stale():
+                    return cache.head_response()
+                response = make_request(method, params)
+                cache.on_block_number(response)
+                return response
+
+            if method == 'eth_sendRawTransaction':
+                try:
+                    return make_request(method, params)
+                finally:
+                    cache.invalidate_pending()
+
+            if method not in cache.cached_methods:
+                return make_request(method, params)
+
+            if cache.head_is_stale():
+                cache.on_block_number(make_request('eth_blockNumber', []))
+
+            key = cache.key(method, params)
+            response = cache.get(key)
+            if response is None:
+                response = make_request(method, params)
+                cache.put(key, response)
+
+            return response
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+
+        cache = self.cache
+
+        async def middleware(method, params):
+
+            if method == 'eth_blockNumber':
+                if not cache.head_is_stale():
+                    return cache.head_response()
+                response = await make_request(method, params)
+                cache.on_block_number(response)
+                return response
+
+            if method == 'eth_sendRawTransaction':
+                try:
+                    return await make_request(method, params)
+                finally:
+                    cache.invalidate_pending()
+
+            if method not in cache.cached_methods:
+                return await make_request(method, params)
+
+            if cache.head_is_stale():
+                cache.on_block_number(await make_request('eth_blockNumber', []))
+
+            key = cache.key(method, params)
+            response = cache.get(key)
+            if response is None:
+                response = await make_request(method, params)
+                cache.put(key, response)
+
+            return response
+
+        return middleware
@@ -0,0 +1,264 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+from .tracker import PendingTransactionsTracker
+
+
+class TrackedTransaction(object):
+    """ A transaction submitted by a task and its status in the confirmation service """
+
+    def __init__(self, owner, address, tx, replaced_hashes=None):
+        self.owner = owner
+        self.address = address
+        self.tx = tx
+        self.tx_hash = Web3.to_hex(tx['hash'])
+        # earlier hashes of the same nonce, the miner may still include one of them
+        self.replaced_hashes = replaced_hashes or list()
+        # pending, confirmed, reverted, dropped, timeout, replaced
+        self.status = 'pending'
+        self.receipt = None
+        self.confirmations = 0
+        self.missing = 0
+        self.finished_at = None
+        # seconds from sent to the first receipt seen
+        self.inclusion_time = None
+
+    def is_finished(self):
+
+        return self.status != 'pending'
+
+
+class ConfirmationService(object):
+    """ Owns every submitted transaction. A background thread polls their receipts in one batch
+    when a new block arrives (or with backoff if no block is notified) and emits the events
+    confirmed, reverted, dropped and timeout to the subscribers. Tasks only read the status """
+
+    log = logging.getLogger()
+
+    events = ('confirmed', 'reverted', 'dropped', 'timeout')
+
+    def __init__(self,
+                 connection_manager,
+                 depth=1,
+                 poll_interval=1.0,
+                 max_poll_interval=8.0,
+                 drop_after=2,
+                 retention=600):
+
+        self.connection_manager = connection_manager
+        # confirmations of the receipt to be confirmed (1: included in the last block)
+        self.depth = depth
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        # polls without finding the transaction to take it as dropped
+        self.drop_after = drop_after
+        # seconds to keep the finished transactions for the tasks to read them
+        self.retention = retention
+
+        self.tracker = PendingTransactionsTracker(connection_manager, self.pending_hashes)
+        self.transactions = dict()
+        self.subscribers = list()
+        self.lock = threading.Lock()
+        self.wake_up = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def subscribe(self, callback):
+        """ callback(event, tracked_transaction) is called from the service thread """
+
+        self.subscribers.append(callback)
+
+    def submit(self, owner, address, tx, replaced_hashes=None):
+        """ Start to follow the transaction """
+
+        tracked = TrackedTransaction(owner, address, tx, replaced_hashes=replaced_hashes)
+        with self.lock:
+            if tracked.tx_hash not in self.transactions:
+                self.transactions[tracked.tx_hash] = tracked
+        self.wake_up.set()
+
+    def replace(self, old_hash, owner, address, tx):
+        """ The transaction was replaced (same nonce, other gas price), follow the new one """
+
+        old_hash = Web3.to_hex(old_hash)
+        with self.lock:
+            tracked = self.transactions.get(old_hash)
+            replaced_hashes = (tracked.replaced_hashes if tracked is not None else list()) + [old_hash]
+            if tracked is not None and not tracked.is_finished():
+                tracked.status = 'replaced'
+                tracked.finished_at = time.monotonic()
+
+        self.submit(owner, address, tx, replaced_hashes=replaced_hashes)
+
+    def status(self, tx_hash):
+
+        with self.lock:
+            return self.transactions.get(tx_hash)
+
+    def nonce(self, address):
+        """ Transaction count of the address in the last poll, None if not polled yet """
+
+        return self.tracker.nonces.get(address)
+
+    def pending_hashes(self):
+
+        with self.lock:
+            tx_hashes = list()
+            for tx_hash, tracked in self.transactions.items():
+                if not tracked.is_finished():
+                    tx_hashes += [tx_hash] + tracked.replaced_hashes
+            return tx_hashes
+
+    def on_new_block(self, block_number):
+        """ Block watcher subscriber """
+
+        self.wake_up.set()
+
+    def start(self):
+
+        if self.thread is not None:
+            return
+
+        self.thread = threading.Thread(target=self.run, name='ConfirmationService', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.stop_event.set()
+        self.wake_up.set()
+
+    def emit(self, event, tracked):
+
+        self.log.debug("Confirmations :: {0} :: {1} :: {2}".format(tracked.owner, event, tracked.tx_hash))
+
+        for callback in self.subscribers:
+            try:
+                callback(event, tracked)
+            except Exception as e:
+                self.log.error("Confirmations :: Subscriber error! {0}".format(e))
+
+    def finish(self, tracked, event):
+
+        with self.lock:
+            # replaced while it was polled
+            if tracked.is_finished():
+                return
+            tracked.status = event
+            tracked.finished_at = time.monotonic()
+
+            if event in ('confirmed', 'reverted'):
+                # one of the hashes of the nonce was mined: the replaced ones are settled with
+                # the same receipt, only the last one emits the event
+                for tx_hash in tracked.replaced_hashes:
+                    replaced = self.transactions.get(tx_hash)
+                    if replaced is not None:
+                        replaced.status = event
+                        replaced.receipt = tracked.receipt
+
+        self.emit(event, tracked)
+
+    def poll(self):
+        """ One batch for all the pending transactions, return the block number polled
+        or None if there is nothing pending """
+
+        with self.lock:
+            pending = [tracked for tracked in self.transactions.values() if not tracked.is_finished()]
+            addresses = sorted(set(tracked.address for tracked in pending) | set(self.tracker.nonces))
+
+            # forget finished transactions already read by the tasks
+            now = time.monotonic()
+            for tx_hash in [tx_hash for tx_hash, tracked in self.transactions.items()
+                            if tracked.is_finished() and now - tracked.finished_at > self.retention]:
+                del self.transactions[tx_hash]
+
+        if not pending:
+            # nothing to follow, no need to ask the node
+            return None
+
+        block_number = self.connection_manager.web3.eth.block_number
+
+        tx_hashes = set()
+        for tracked in pending:
+            tx_hashes.add(tracked.tx_hash)
+            tx_hashes.update(tracked.replaced_hashes)
+
+        with self.tracker.lock:
+            self.tracker.refresh(block_number, sorted(tx_hashes), addresses)
+            results = dict(self.tracker.transactions)
+
+        for tracked in pending:
+            tx_found, tx_rcp = results[tracked.tx_hash]
+            for tx_hash in tracked.replaced_hashes:
+                # the miner included the transaction before the replacement
+                replaced_found, replaced_rcp = results[tx_hash]
+                tx_found = tx_found or replaced_found
+                if tx_rcp is None and replaced_rcp is not None:
+                    tx_rcp = replaced_rcp
+
+            if tx_rcp is not None:
+                if tracked.receipt is None:
+                    tracked.inclusion_time = (datetime.datetime.now() - tracked.tx['timestamp']).total_seconds()
+                tracked.receipt = tx_rcp
+                tracked.missing = 0
+                tracked.confirmations = block_number - tx_rcp['blockNumber'] + 1
+                if tracked.confirmations >= self.depth:
+                    self.finish(tracked, 'confirmed' if tx_rcp['status'] > 0 else 'reverted')
+                continue
+
+            # receipt lost in a reorg or not mined yet
+            tracked.receipt = None
+            tracked.confirmations = 0
+
+            if not tx_found:
+                if Web3.to_hex(tracked.tx['hash']) != tracked.tx_hash:
+                    # the task replaced it (same tx, new hash): not dropped, the new hash is submitted
+                    continue
+                tracked.missing += 1
+                if tracked.missing >= self.drop_after:
+                    self.finish(tracked, 'dropped')
+                continue
+
+            tracked.missing = 0
+            elapsed = datetime.datetime.now() - tracked.tx['timestamp']
+            if elapsed > datetime.timedelta(seconds=tracked.tx['timeout']):
+                self.finish(tracked, 'timeout')
+
+        return block_number
+
+    def run(self):
+
+        interval = self.poll_interval
+        last_block = None
+        while not self.stop_event.is_set():
+            woken = self.wake_up.wait(interval)
+            self.wake_up.clear()
+            try:
+                block_number = self.poll()
+            except Exception as e:
+                self.log.error("Confirmations :: Error polling receipts! {0}".format(e))
+                interval = min(interval * 2, self.max_poll_interval)
+                continue
+
+            # aligned to the blocks: back off while the head does not move
+            if block_number is None or (block_number == last_block and not woken):
+                interval = min(interval * 2, self.max_poll_interval)
+            else:
+                interval = self.poll_interval
+            last_block = block_number
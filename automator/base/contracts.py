@@ -13,6 +13,76 @@
 
 import json
 import logging
+import os
+import threading
+
+from eth_utils.abi import abi_to_signature, function_abi_to_4byte_selector
+
+
+# abi file (real path) -> abi, loaded once on first use
+abi_files = dict()
+abi_files_lock = threading.Lock()
+
+# abi files and selectors precompiled with automator.base.abi_cache, empty if not installed
+precompiled_abis = dict()
+
+# function signature -> 4 bytes selector
+function_selectors = dict()
+
+# abi files in the precompiled cache are relative to the automator package
+package_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def install_abi_cache(cache_file):
+    """ Load the precompiled abis and selectors (see automator.base.abi_cache) """
+
+    with open(cache_file) as f:
+        content = json.load(f)
+
+    for abi_file, abi in content['abis'].items():
+        precompiled_abis[os.path.realpath(os.path.join(package_dir, abi_file))] = abi
+    function_selectors.update((signature, bytes.fromhex(selector))
+                              for signature, selector in content['selectors'].items())
+
+    return content
+
+
+def function_selector(function_abi):
+    """ 4 bytes selector of the function, the keccak is computed once per signature """
+
+    signature = abi_to_signature(function_abi)
+    selector = function_selectors.get(signature)
+    if selector is None:
+        selector = function_abi_to_4byte_selector(function_abi)
+        function_selectors[signature] = selector
+
+    return selector
+
+
+def load_abi_file(abi_file):
+    """ Abi of the file, parsed only the first time """
+
+    abi_file = os.path.realpath(abi_file)
+
+    with abi_files_lock:
+        if abi_file not in abi_files:
+            if abi_file in precompiled_abis:
+                abi_files[abi_file] = precompiled_abis[abi_file]
+            else:
+                with open(abi_file) as f:
+                    abi_files[abi_file] = json.load(f)
+
+        return abi_files[abi_file]
+
+
+class LazyAbi(object):
+    """ Class attribute with the abi of a file, read when the contract class is first used """
+
+    def __init__(self, abi_file):
+        self.abi_file = abi_file
+
+    def __get__(self, instance, owner):
+        return load_abi_file(self.abi_file)
 
 
 class Contract(object):
@@ -50,6 +120,12 @@ class Contract(object):
 
         return abi
 
+    @staticmethod
+    def lazy_abi_file(abi_file):
+        """ contract_abi loaded on first use, importing the class do not parse the file """
+
+        return LazyAbi(abi_file)
+
     @staticmethod
     def content_bin_file(bin_file):
 
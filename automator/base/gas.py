@@ -0,0 +1,149 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import logging
+import threading
+import time
+from fractions import Fraction
+
+from web3.exceptions import MethodUnavailable
+
+
+def multiply_gas_price(gas_price, multiply_factor):
+    """ Gas price in wei multiplied by the factor with integer math, ex.: factor 1.01 """
+
+    factor = Fraction(str(multiply_factor))
+    return gas_price * factor.numerator // factor.denominator
+
+
+class NodeGasPriceStrategy(object):
+    """ eth_gasPrice of the node x factor """
+
+    name = 'node'
+
+    def __init__(self, multiply_factor=1):
+        self.multiply_factor = multiply_factor
+
+    def gas_price(self, web3):
+
+        return multiply_gas_price(web3.eth.gas_price, self.multiply_factor)
+
+
+class FeeHistoryGasPriceStrategy(object):
+    """ Base fee of the last block + percentile of the rewards paid in recent blocks (eth_feeHistory) x factor """
+
+    name = 'fee_history'
+
+    def __init__(self, multiply_factor=1, blocks=20, percentile=50):
+        self.multiply_factor = multiply_factor
+        self.blocks = blocks
+        self.percentile = percentile
+
+    def gas_price(self, web3):
+
+        history = web3.eth.fee_history(self.blocks, 'latest', [self.percentile])
+
+        base_fee = history['baseFeePerGas'][-1]
+        rewards = sorted(reward[0] for reward in history.get('reward', []) if reward)
+        reward = rewards[len(rewards) // 2] if rewards else 0
+
+        return multiply_gas_price(base_fee + reward, self.multiply_factor)
+
+
+class GasPriceOracle(object):
+    """ Gas price shared by all the tasks, refreshed once per block or when ttl expires """
+
+    log = logging.getLogger()
+
+    strategies = {
+        NodeGasPriceStrategy.name: NodeGasPriceStrategy,
+        FeeHistoryGasPriceStrategy.name: FeeHistoryGasPriceStrategy
+    }
+
+    def __init__(self, connection_manager, strategy, ttl=15):
+
+        self.connection_manager = connection_manager
+        self.strategy = strategy
+        self.ttl = ttl
+
+        # the node price is the fallback if the strategy fails
+        self.fallback = NodeGasPriceStrategy(multiply_factor=getattr(strategy, 'multiply_factor', 1))
+
+        self.lock = threading.Lock()
+        self.value = None
+        self.block_number = None
+        self.refreshed_at = None
+
+    @classmethod
+    def from_config(cls, connection_manager, config):
+
+        settings = config.get('gas_price', dict())
+        multiply_factor = config.get('gas_price_multiply_factor', 1)
+        strategy_name = settings.get('strategy', NodeGasPriceStrategy.name)
+
+        if strategy_name == FeeHistoryGasPriceStrategy.name:
+            strategy = FeeHistoryGasPriceStrategy(multiply_factor=multiply_factor,
+                                                  blocks=settings.get('fee_history_blocks', 20),
+                                                  percentile=settings.get('fee_history_percentile', 50))
+        elif strategy_name == NodeGasPriceStrategy.name:
+            strategy = NodeGasPriceStrategy(multiply_factor=multiply_factor)
+        else:
+            raise Exception("Not valid gas price strategy: {0}".format(strategy_name))
+
+        return cls(connection_manager, strategy, ttl=settings.get('ttl', 15))
+
+    def current_block(self):
+        """ Last head seen by the read cache, no extra call to the node """
+
+        read_cache = self.connection_manager.read_cache
+        if read_cache:
+            return read_cache.head
+        return None
+
+    def is_fresh(self):
+
+        if self.value is None:
+            return False
+
+        if time.monotonic() - self.refreshed_at >= self.ttl:
+            return False
+
+        block_number = self.current_block()
+        return block_number is None or block_number == self.block_number
+
+    def refresh(self):
+
+        web3 = self.connection_manager.web3
+        try:
+            value = self.strategy.gas_price(web3)
+        except MethodUnavailable as e:
+            # ex. eth_feeHistory on RSK: do not ask for it again on every block
+            self.log.warning("Gas Price :: Strategy {0} not supported by the node, using node price "
+                             "from now on. {1}".format(self.strategy.name, e))
+            self.strategy = self.fallback
+            value = self.fallback.gas_price(web3)
+        except Exception as e:
+            self.log.error("Gas Price :: Strategy {0} failed, using node price. {1}".format(self.strategy.name, e))
+            value = self.fallback.gas_price(web3)
+
+        self.value = value
+        self.block_number = self.current_block()
+        self.refreshed_at = time.monotonic()
+
+    def gas_price(self):
+        """ Precomputed gas price in wei """
+
+        with self.lock:
+            if not self.is_fresh():
+                self.refresh()
+            return self.value
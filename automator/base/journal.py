@@ -0,0 +1,131 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+
+def encode_tx(tx):
+    """ Pending transaction to json, hashes as hex and datetimes as iso format """
+
+    def default(value):
+        if isinstance(value, (bytes, bytearray)):
+            return Web3.to_hex(value)
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return str(value)
+
+    return json.dumps(tx, default=default)
+
+
+def decode_tx(data):
+    """ Pending transaction from json, inverse of encode_tx for the fields used by the tasks """
+
+    tx = json.loads(data)
+    tx['hash'] = HexBytes(tx['hash'])
+    tx['timestamp'] = datetime.datetime.fromisoformat(tx['timestamp'])
+
+    return tx
+
+
+class TransactionJournal(object):
+    """ Append only journal (SQLite in WAL mode) of the transactions sent by the tasks: sent,
+    replaced and the final status. On restart the pending transactions of every task are
+    rebuilt from it, so nothing is sent twice """
+
+    log = logging.getLogger()
+
+    final_events = ('confirmed', 'reverted', 'timeout', 'dropped', 'cleared')
+
+    def __init__(self, path, retention_days=7):
+
+        self.path = path
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS transactions ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "task_name TEXT NOT NULL, "
+                        "journal_id TEXT NOT NULL, "
+                        "event TEXT NOT NULL, "
+                        "hash TEXT NOT NULL, "
+                        "nonce INTEGER, "
+                        "tx TEXT NOT NULL, "
+                        "created_at REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS transactions_journal_id ON transactions (journal_id)")
+
+        self.compact()
+
+    @classmethod
+    def from_config(cls, config):
+
+        settings = config.get('journal', dict())
+        if not settings.get('enabled', False):
+            return None
+
+        return cls(settings.get('path', 'transactions_journal.db'),
+                   retention_days=settings.get('retention_days', 7))
+
+    def record(self, task_name, event, tx):
+        """ Append the event of the transaction, the tx is saved as it is now """
+
+        # the first hash identifies the transaction in all its replacements
+        journal_id = tx.setdefault('journal_id', Web3.to_hex(tx['hash']))
+
+        with self.lock:
+            self.db.execute("INSERT INTO transactions (task_name, journal_id, event, hash, nonce, tx, created_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (task_name, journal_id, event, Web3.to_hex(tx['hash']), tx.get('nonce'),
+                             encode_tx(tx), time.time()))
+
+    def pending(self):
+        """ task_name -> pending transactions (last state of the ones without final event) """
+
+        with self.lock:
+            rows = self.db.execute("SELECT task_name, journal_id, event, tx FROM transactions ORDER BY id").fetchall()
+
+        last = dict()
+        for task_name, journal_id, event, data in rows:
+            if event in self.final_events:
+                last.pop(journal_id, None)
+            else:
+                last[journal_id] = (task_name, data)
+
+        pending = dict()
+        for task_name, data in last.values():
+            pending.setdefault(task_name, list()).append(decode_tx(data))
+
+        for txs in pending.values():
+            txs.sort(key=lambda tx: tx['nonce'])
+
+        return pending
+
+    def compact(self):
+        """ Forget the finished transactions older than retention_days """
+
+        since = time.time() - self.retention_days * 86400
+        with self.lock:
+            self.db.execute("DELETE FROM transactions WHERE created_at < ? AND journal_id IN "
+                            "(SELECT journal_id FROM transactions WHERE event IN ({0}))".format(
+                                ", ".join("?" * len(self.final_events))),
+                            (since,) + self.final_events)
@@ -1,4 +1,6 @@
-from .network import ConnectionManager
+from .network import ConnectionManager, AsyncConnectionManager
+from .gas import GasPriceOracle
+from .senders import SenderPool
 
 
 class ConnectionHelperBase(object):
@@ -9,8 +11,37 @@ class ConnectionHelperBase(object):
         self.config = config
         self.config_uri = config["uri"]
         self.chain_id = config["chain_id"]
+        self.read_cache = config.get("read_cache", dict())
+        self.node_pool = config.get("node_pool", dict())
         self.connection_manager = self.connect_node()
 
     def connect_node(self):
 
-        return ConnectionManager(uris=self.config_uri, chain_id=self.chain_id)
+        connection_manager = ConnectionManager(uris=self.config_uri,
+                                               chain_id=self.chain_id,
+                                               read_cache=self.read_cache.get('enabled', True),
+                                               cache_head_max_age=self.read_cache.get('head_max_age', 1),
+                                               node_pool=self.node_pool)
+
+        # gas price shared by all the tasks
+        connection_manager.gas_price_oracle = GasPriceOracle.from_config(connection_manager, self.config)
+
+        # account to send every transaction
+        connection_manager.sender_pool = SenderPool.from_config(connection_manager, self.config)
+
+        # simulate the transactions before sending, the ones reverting are not sent
+        simulation = self.config.get('simulation', dict())
+        if simulation.get('enabled', False):
+            connection_manager.simulate_block_identifier = simulation.get('block_identifier', 'pending')
+
+        return connection_manager
+
+
+class AsyncConnectionHelper(ConnectionHelperBase):
+
+    def connect_node(self):
+
+        return AsyncConnectionManager(uris=self.config_uri,
+                                      chain_id=self.chain_id,
+                                      read_cache=self.read_cache.get('enabled', True),
+                                      cache_head_max_age=self.read_cache.get('head_max_age', 1))
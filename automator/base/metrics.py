@@ -0,0 +1,159 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import logging
+from urllib.parse import urlparse
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+
+
+log = logging.getLogger()
+
+
+# seconds, from a cached read to a slow liquidation
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+RPC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+INCLUSION_BUCKETS = (5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+GAS_BUCKETS = (50000, 100000, 250000, 500000, 1000000, 2000000, 3000000, 4000000, 5000000, 6000000, 6800000)
+
+
+def node_label(uri):
+    """ Only scheme and host of the node, the path may have an api key """
+
+    parsed = urlparse(uri)
+    if not parsed.netloc:
+        return str(uri)
+    return '{0}://{1}'.format(parsed.scheme, parsed.netloc)
+
+
+class AutomatorMetrics(object):
+    """ Histograms and counters of the tasks, the node requests and the transactions """
+
+    def __init__(self, registry=None):
+
+        if registry is None:
+            registry = CollectorRegistry()
+        self.registry = registry
+
+        self.task_duration = Histogram(
+            'automator_task_duration_seconds', 'Duration of a task run',
+            ['task'], buckets=DURATION_BUCKETS, registry=registry)
+        self.task_queue_delay = Histogram(
+            'automator_task_queue_delay_seconds', 'Delay from the due time of a task to its start',
+            ['task'], buckets=DURATION_BUCKETS, registry=registry)
+        self.task_errors = Counter(
+            'automator_task_errors_total', 'Task runs that raised or timed out',
+            ['task'], registry=registry)
+
+        self.rpc_latency = Histogram(
+            'automator_rpc_latency_seconds', 'Latency of the requests to the node',
+            ['method', 'node'], buckets=RPC_BUCKETS, registry=registry)
+        self.rpc_errors = Counter(
+            'automator_rpc_errors_total', 'Requests to the node that raised (connection error or timeout)',
+            ['method', 'node'], registry=registry)
+
+        self.hedge_sent = Counter(
+            'automator_hedge_sent_total',
+            'Hedged requests sent to a second node by reason: slow (no answer in the hedge delay) or failover',
+            ['method', 'reason'], registry=registry)
+        self.hedge_won = Counter(
+            'automator_hedge_won_total', 'Hedged requests answered by the second node',
+            ['method'], registry=registry)
+
+        self.steps_chosen = Gauge(
+            'automator_steps_chosen', 'Steps asked in the last transaction of an adaptive steps task',
+            ['task'], registry=registry)
+        self.steps_gas_used = Histogram(
+            'automator_steps_gas_used', 'Gas used by the transactions of an adaptive steps task',
+            ['task'], buckets=GAS_BUCKETS, registry=registry)
+        self.steps_out_of_gas = Counter(
+            'automator_steps_out_of_gas_total', 'Transactions of an adaptive steps task that ran out of gas',
+            ['task'], registry=registry)
+
+        self.tx_inclusion = Histogram(
+            'automator_transaction_inclusion_seconds', 'Time from sending a transaction to its receipt',
+            ['task'], buckets=INCLUSION_BUCKETS, registry=registry)
+        self.tx_events = Counter(
+            'automator_transactions_total',
+            'Transactions by event: sent, replaced, confirmed, reverted, dropped, timeout',
+            ['task', 'event'], registry=registry)
+
+        self.server = None
+
+    def observe_task(self, task_name, duration, queue_delay):
+
+        self.task_duration.labels(task_name).observe(duration)
+        self.task_queue_delay.labels(task_name).observe(max(0.0, queue_delay))
+
+    def task_error(self, task_name):
+
+        self.task_errors.labels(task_name).inc()
+
+    def observe_rpc(self, method, uri, elapsed, error=False):
+
+        node = node_label(uri)
+        self.rpc_latency.labels(method, node).observe(elapsed)
+        if error:
+            self.rpc_errors.labels(method, node).inc()
+
+    def hedge_sent_event(self, method, reason):
+
+        self.hedge_sent.labels(method, reason).inc()
+
+    def hedge_won_event(self, method):
+
+        self.hedge_won.labels(method).inc()
+
+    def steps_chosen_event(self, task_name, steps):
+
+        self.steps_chosen.labels(task_name).set(steps)
+
+    def steps_receipt(self, task_name, gas_used, out_of_gas=False):
+
+        self.steps_gas_used.labels(task_name).observe(gas_used)
+        if out_of_gas:
+            self.steps_out_of_gas.labels(task_name).inc()
+
+    def transaction_event(self, task_name, event, inclusion_time=None):
+
+        self.tx_events.labels(task_name, event).inc()
+        if inclusion_time is not None:
+            self.tx_inclusion.labels(task_name).observe(inclusion_time)
+
+    def on_confirmation_event(self, event, tracked):
+        """ Subscriber of the confirmation service, every transaction emits only one event """
+
+        self.transaction_event(tracked.owner, event, inclusion_time=tracked.inclusion_time)
+
+    def start_server(self, port=9100, addr='127.0.0.1'):
+        """ /metrics endpoint in a daemon thread """
+
+        if self.server is not None:
+            return
+
+        self.server, _ = start_http_server(port, addr=addr, registry=self.registry)
+        log.info("Metrics :: Serving /metrics on {0}:{1}".format(addr, port))
+
+
+# one collector for the process, always recording; the endpoint is optional
+metrics = AutomatorMetrics()
+
+
+def start_metrics_server(config):
+    """ Start the endpoint if prometheus is enabled in config """
+
+    settings = config.get('prometheus', dict())
+    if not settings.get('enabled', False):
+        return
+
+    metrics.start_server(port=settings.get('port', 9100), addr=settings.get('addr', '127.0.0.1'))
@@ -11,11 +11,26 @@
 
 """
 
-from web3 import Web3, Account
+from web3 import Web3, AsyncWeb3, Account
+from web3.exceptions import ContractLogicError, Web3RPCError
+import aiohttp
+import asyncio
+import collections
+import contextlib
 import json
 import os
 import datetime
 import logging
+import threading
+
+from .cache import BlockReadCache
+from .nonce import NonceManager
+from .provider import NodePoolProvider, MeteredHTTPProvider, MeteredAsyncHTTPProvider
+
+
+class SimulationReverted(ValueError):
+    """ The transaction reverts in the eth_call simulation, it is not sent """
+    pass
 
 
 class BaseConnectionManager(object):
@@ -30,18 +45,39 @@ class ConnectionManager(BaseConnectionManager):
     default_account = 0  # index of the account
     index_uri = 0
     accounts = None
+    read_cache = None
+    gas_price_oracle = None
+    sender_pool = None
+    # eth_call the transaction before sending, None to not simulate
+    simulate_block_identifier = None
 
     def __init__(self,
                  uris=None,
                  request_timeout=180,
-                 chain_id=31
+                 chain_id=31,
+                 read_cache=True,
+                 cache_head_max_age=1,
+                 node_pool=None
                  ):
 
         # Parameters
         self.uris = uris
         self.request_timeout = request_timeout
+        self.node_pool = node_pool or dict()
         self.chain_id = chain_id
 
+        # block scoped cache of the reads to the node
+        if read_cache:
+            self.read_cache = BlockReadCache(head_max_age=cache_head_max_age)
+
+        # local nonces of the accounts, tasks send in parallel
+        self.nonce_manager = NonceManager(self)
+
+        # last transactions sent, to replace them with other gas price
+        self.sent_transactions = collections.OrderedDict()
+        self.max_sent_transactions = 256
+        self.sent_lock = threading.Lock()
+
         # connect to node
         self.web3 = self.connect_node()
 
@@ -62,8 +98,31 @@ class ConnectionManager(BaseConnectionManager):
             raise Exception("Not valid uri")
 
         self.index_uri = index_uri
-        return Web3(Web3.HTTPProvider(current_uri,
-                                      request_kwargs={'timeout': self.request_timeout}))
+        if isinstance(uri, list) and len(uri) > 1:
+            # several nodes: failover and route to the fastest one
+            provider = NodePoolProvider(uri[index_uri:] + uri[:index_uri],
+                                        request_timeout=self.request_timeout,
+                                        **self.node_pool)
+        else:
+            provider = MeteredHTTPProvider(current_uri, request_kwargs={'timeout': self.request_timeout})
+        web3 = Web3(provider)
+        self.install_read_cache(web3)
+
+        return web3
+
+    def hedging(self, enabled=True):
+        """ Hedge the requests of the current task, only with several nodes """
+
+        if enabled and isinstance(self.web3.provider, NodePoolProvider):
+            return self.web3.provider.hedging()
+
+        return contextlib.nullcontext()
+
+    def install_read_cache(self, web3):
+        """ Read cache as the innermost middleware, it sees the raw requests to the node """
+
+        if self.read_cache:
+            web3.middleware_onion.inject(self.read_cache.middleware, name='block_read_cache', layer=0)
 
     def scan_accounts(self):
         """ Accounts from config or environment"""
@@ -224,19 +283,26 @@ class ConnectionManager(BaseConnectionManager):
             max_priority_fee_per_gas=None):
         """Contract agnostic transaction function with extras"""
 
-        if not default_account:
+        if default_account is None:
             default_account = self.default_account
 
         built_fxn = tx_function(*tx_args)
 
-        if not nonce:
-            nonce = self.web3.eth.get_transaction_count(self.accounts[default_account].address, "pending")
+        address = self.accounts[default_account].address
+        allocated = False
+        if nonce is None:
+            nonce = self.nonce_manager.allocate(address)
+            allocated = True
 
         if not gas_price:
-            gas_price = self.gas_price
+            if self.gas_price_oracle:
+                gas_price = self.gas_price_oracle.gas_price()
+            else:
+                gas_price = self.gas_price
 
         transaction_dict = {
             'chainId': self.chain_id,
+            'from': address,
             'nonce': nonce,
             'gasPrice': gas_price,
             'value': value
@@ -245,14 +311,218 @@ class ConnectionManager(BaseConnectionManager):
         if gas_limit:
             transaction_dict['gas'] = gas_limit
 
-        transaction = built_fxn.build_transaction(transaction_dict)
-
         pk = self.accounts[default_account].key
+
+        try:
+            transaction = built_fxn.build_transaction(transaction_dict)
+            if self.simulate_block_identifier:
+                self.simulate_transaction(transaction)
+            signed = self.web3.eth.account.sign_transaction(transaction,
+                                                            private_key=pk)
+        except Exception:
+            if allocated:
+                self.nonce_manager.release(address, nonce)
+            raise
+
+        try:
+            transaction_hash = self.web3.eth.send_raw_transaction(
+                signed.raw_transaction)
+        except Exception:
+            # not known if the node got it, sync the nonce again
+            self.nonce_manager.reset(address)
+            raise
+
+        self.remember_transaction(transaction_hash, transaction, default_account)
+
+        return transaction_hash
+
+    def revert_reason(self, error):
+        """ Error(string) reason from the revert data, the message of the error if not decodable """
+
+        data = error.get('data') if isinstance(error, dict) else None
+        if isinstance(data, str) and data.startswith('0x08c379a0'):
+            try:
+                return self.web3.codec.decode(['string'], bytes.fromhex(data[10:]))[0]
+            except Exception:
+                pass
+
+        return error.get('message') if isinstance(error, dict) else str(error)
+
+    def simulate_transaction(self, transaction):
+        """ eth_call of the transaction, raise SimulationReverted with the revert reason if it fails """
+
+        call = dict((k, v) for k, v in transaction.items() if k in ('from', 'to', 'data', 'value', 'gas', 'gasPrice'))
+        try:
+            self.web3.eth.call(call, block_identifier=self.simulate_block_identifier)
+        except ContractLogicError as e:
+            reason = e.message or str(e)
+        except Web3RPCError as e:
+            # RSK answer the reverts with its own error code (-32015 "VM execution error")
+            if 'revert' not in str(e).lower() and 'vm execution error' not in str(e).lower():
+                raise
+            reason = self.revert_reason(e.rpc_response.get('error') if e.rpc_response else str(e))
+        else:
+            return
+
+        self.log.error("Simulation :: Transaction to [{0}] reverts, not sent! Reason: {1}".format(
+            transaction.get('to'), reason))
+        raise SimulationReverted("Transaction reverts in simulation: {0}".format(reason))
+
+    def remember_transaction(self, transaction_hash, transaction, default_account):
+        """ Keep the last transactions sent to sign them again (replace by fee) """
+
+        with self.sent_lock:
+            self.sent_transactions[bytes(transaction_hash)] = (transaction, default_account)
+            while len(self.sent_transactions) > self.max_sent_transactions:
+                self.sent_transactions.popitem(last=False)
+
+    def is_sent_transaction(self, transaction_hash):
+        """ The transaction can be signed again by this connection """
+
+        with self.sent_lock:
+            return bytes(transaction_hash) in self.sent_transactions
+
+    def recover_transaction(self, transaction_hash):
+        """ Remember a transaction sent before a restart (ex. from the journal) from the node,
+        to replace it. False if the node does not know it or the account is not ours """
+
+        tx = self.web3.eth.get_transaction(transaction_hash)
+
+        addresses = [account.address.lower() for account in self.accounts]
+        if tx['from'].lower() not in addresses:
+            return False
+
+        transaction = {
+            'chainId': self.chain_id,
+            'from': tx['from'],
+            'nonce': tx['nonce'],
+            'gasPrice': tx['gasPrice'],
+            'gas': tx['gas'],
+            'to': tx['to'],
+            'value': tx['value'],
+            'data': tx['input']
+        }
+        self.remember_transaction(transaction_hash, transaction, addresses.index(tx['from'].lower()))
+
+        return True
+
+    def replace_transaction(self, transaction_hash, gas_price):
+        """ Sign again the transaction sent with the same nonce and a new gas price """
+
+        with self.sent_lock:
+            sent = self.sent_transactions.get(bytes(transaction_hash))
+        if sent is None:
+            raise Exception("Transaction not sent by this connection: {0}".format(Web3.to_hex(transaction_hash)))
+
+        transaction, default_account = sent
+        transaction = dict(transaction)
+        transaction['gasPrice'] = gas_price
+
         signed = self.web3.eth.account.sign_transaction(transaction,
-                                                        private_key=pk)
+                                                        private_key=self.accounts[default_account].key)
+        new_transaction_hash = self.web3.eth.send_raw_transaction(signed.raw_transaction)
+
+        self.remember_transaction(new_transaction_hash, transaction, default_account)
+
+        return new_transaction_hash
+
+
+class AsyncConnectionManager(ConnectionManager):
+    """ Connection manager on AsyncWeb3, every node call is a coroutine
+    (properties like gas_price and block_number return an awaitable) """
+
+    def __init__(self,
+                 uris=None,
+                 request_timeout=180,
+                 chain_id=31,
+                 read_cache=True,
+                 cache_head_max_age=1
+                 ):
+
+        super().__init__(uris=uris,
+                         request_timeout=request_timeout,
+                         chain_id=chain_id,
+                         read_cache=read_cache,
+                         cache_head_max_age=cache_head_max_age)
+
+        # nonce and send of one transaction must be atomic between coroutines,
+        # the nonce comes from the node inside the lock
+        self.send_lock = asyncio.Lock()
+        self.nonce_manager = None
+
+    def connect_node(self, index_uri=0):
+        """Connect to the node"""
+
+        uri = self.uris
+        if not uri:
+            uri = ["https://public-node.testnet.rsk.co"]
+        if isinstance(uri, list):
+            current_uri = uri[index_uri]
+        elif isinstance(uri, str):
+            current_uri = uri
+        else:
+            raise Exception("Not valid uri")
+
+        self.index_uri = index_uri
+        web3 = AsyncWeb3(MeteredAsyncHTTPProvider(
+            current_uri,
+            request_kwargs={'timeout': aiohttp.ClientTimeout(total=self.request_timeout)}))
+        self.install_read_cache(web3)
+
+        return web3
+
+    async def block_timestamp(self, block):
+        """ Block timestamp """
+        block_timestamp = (await self.web3.eth.get_block(block)).timestamp
+        dt_object = datetime.datetime.fromtimestamp(block_timestamp)
+        return dt_object
+
+    async def send_function_transaction(
+            self,
+            tx_function,
+            *tx_args,
+            value=0,
+            gas_limit=None,
+            default_account=None,
+            nonce=None,
+            gas_price=None,
+            max_fee_per_gas=None,
+            max_priority_fee_per_gas=None):
+        """Contract agnostic transaction function with extras"""
+
+        if default_account is None:
+            default_account = self.default_account
+
+        built_fxn = tx_function(*tx_args)
+
+        async def send(nonce):
+
+            transaction_dict = {
+                'chainId': self.chain_id,
+                'nonce': nonce,
+                'gasPrice': gas_price if gas_price else await self.gas_price,
+                'value': value
+            }
+
+            if gas_limit:
+                transaction_dict['gas'] = gas_limit
+
+            transaction = await built_fxn.build_transaction(transaction_dict)
+
+            pk = self.accounts[default_account].key
+            signed = self.web3.eth.account.sign_transaction(transaction,
+                                                            private_key=pk)
+
+            return await self.web3.eth.send_raw_transaction(signed.raw_transaction)
+
+        # a nonce given by the caller is already reserved (the caller holds send_lock,
+        # asyncio.Lock is not reentrant)
+        if nonce is not None:
+            return await send(nonce)
 
-        transaction_hash = self.web3.eth.send_raw_transaction(
-            signed.raw_transaction)
+        async with self.send_lock:
+            nonce = await self.web3.eth.get_transaction_count(self.accounts[default_account].address, "pending")
+            transaction_hash = await send(nonce)
 
         return transaction_hash
 
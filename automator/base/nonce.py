@@ -0,0 +1,129 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import logging
+import threading
+
+
+class NonceManager(object):
+    """ Local allocator of nonces per account.
+
+    Sync with the node pending nonce the first time and after errors, then hand out
+    nonces atomically to the tasks running in parallel without asking the node.
+    """
+
+    log = logging.getLogger()
+
+    def __init__(self, connection_manager):
+
+        self.connection_manager = connection_manager
+        self.lock = threading.Lock()
+
+        # address -> lock held while the address syncs with the node, so concurrent
+        # allocations of an unknown address do not sync twice
+        self.sync_locks = dict()
+
+        # address -> next nonce to hand out
+        self.next_nonce = dict()
+
+        # address -> nonces handed out and not yet seen mined
+        self.in_flight = dict()
+
+    def sync_lock(self, address):
+
+        with self.lock:
+            return self.sync_locks.setdefault(address, threading.RLock())
+
+    def sync(self, address):
+        """ Next nonce from the node pending transaction count """
+
+        with self.sync_lock(address):
+            nonce = self.connection_manager.web3.eth.get_transaction_count(address, "pending")
+
+            with self.lock:
+                self.next_nonce[address] = nonce
+                self.in_flight[address] = set()
+
+        self.log.info("Nonce :: {0} :: Sync. Next Nonce: [{1}]".format(address, nonce))
+
+        return nonce
+
+    def allocate(self, address):
+        """ Hand out the next nonce of the address """
+
+        with self.sync_lock(address):
+            while True:
+                with self.lock:
+                    if address in self.next_nonce:
+                        nonce = self.next_nonce[address]
+                        self.next_nonce[address] = nonce + 1
+                        self.in_flight[address].add(nonce)
+                        return nonce
+
+                # unknown address (first use or after a reset), reset may run again meanwhile
+                self.sync(address)
+
+    def release(self, address, nonce):
+        """ The nonce was not used (the transaction was not sent) """
+
+        with self.lock:
+            if address not in self.next_nonce:
+                return
+            self.in_flight[address].discard(nonce)
+            if nonce == self.next_nonce[address] - 1:
+                # last one handed out, give it back
+                self.next_nonce[address] = nonce
+                return
+
+        # there are higher nonces in flight, sync to not leave a gap
+        self.reset(address)
+
+    def reset(self, address):
+        """ Forget the local state, the next allocate sync with the node """
+
+        with self.lock:
+            self.next_nonce.pop(address, None)
+            self.in_flight.pop(address, None)
+
+        self.log.warning("Nonce :: {0} :: Reset. Going to sync with the node".format(address))
+
+    def check(self, address, confirmed_nonce):
+        """ Detect stale nonces or gaps with the mined transaction count of the address """
+
+        with self.lock:
+            if address not in self.next_nonce:
+                return
+
+            next_nonce = self.next_nonce[address]
+
+            # mined nonces are not in flight anymore
+            in_flight = set(n for n in self.in_flight[address] if n >= confirmed_nonce)
+            self.in_flight[address] = in_flight
+
+            if confirmed_nonce > next_nonce:
+                # transactions sent from outside, local nonce is stale
+                self.next_nonce[address] = confirmed_nonce
+                self.log.warning("Nonce :: {0} :: Stale nonce. Nonce: [{1}] Mined Nonce: [{2}]".format(
+                    address, next_nonce, confirmed_nonce))
+                return
+
+            if confirmed_nonce < next_nonce and not in_flight:
+                # nothing in flight but the node is behind: there is a gap
+                gap = True
+            else:
+                gap = False
+
+        if gap:
+            self.log.warning("Nonce :: {0} :: Gap detected. Nonce: [{1}] Mined Nonce: [{2}]".format(
+                address, next_nonce, confirmed_nonce))
+            self.reset(address)
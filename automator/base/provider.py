@@ -0,0 +1,366 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from web3 import Web3, AsyncWeb3
+from web3.providers import JSONBaseProvider
+
+from .metrics import metrics
+
+
+class MeteredHTTPProvider(Web3.HTTPProvider):
+    """ HTTP provider recording the latency of every request by method and node """
+
+    def make_request(self, method, params):
+
+        start = time.monotonic()
+        try:
+            response = super().make_request(method, params)
+        except Exception:
+            metrics.observe_rpc(method, self.endpoint_uri, time.monotonic() - start, error=True)
+            raise
+        metrics.observe_rpc(method, self.endpoint_uri, time.monotonic() - start)
+
+        return response
+
+    def make_batch_request(self, batch_requests):
+
+        start = time.monotonic()
+        try:
+            response = super().make_batch_request(batch_requests)
+        except Exception:
+            metrics.observe_rpc('batch', self.endpoint_uri, time.monotonic() - start, error=True)
+            raise
+        metrics.observe_rpc('batch', self.endpoint_uri, time.monotonic() - start)
+
+        return response
+
+
+class MeteredAsyncHTTPProvider(AsyncWeb3.AsyncHTTPProvider):
+    """ Async HTTP provider recording the latency of every request by method and node """
+
+    async def make_request(self, method, params):
+
+        start = time.monotonic()
+        try:
+            response = await super().make_request(method, params)
+        except Exception:
+            metrics.observe_rpc(method, self.endpoint_uri, time.monotonic() - start, error=True)
+            raise
+        metrics.observe_rpc(method, self.endpoint_uri, time.monotonic() - start)
+
+        return response
+
+    async def make_batch_request(self, batch_requests):
+
+        start = time.monotonic()
+        try:
+            response = await super().make_batch_request(batch_requests)
+        except Exception:
+            metrics.observe_rpc('batch', self.endpoint_uri, time.monotonic() - start, error=True)
+            raise
+        metrics.observe_rpc('batch', self.endpoint_uri, time.monotonic() - start)
+
+        return response
+
+
+class NodeStatus(object):
+    """ Health and rolling latency of one node of the pool """
+
+    def __init__(self, uri, provider, latency_window=50):
+        self.uri = uri
+        self.provider = provider
+        self.healthy = True
+        self.latency = None
+        self.samples = collections.deque(maxlen=latency_window)
+        self.requests = 0
+        self.failures = 0
+        self.block_number = None
+        self.down_until = 0.0
+
+    def record_latency(self, elapsed, alpha):
+
+        self.samples.append(elapsed)
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency = alpha * elapsed + (1 - alpha) * self.latency
+
+    def stats(self):
+
+        return dict(uri=self.uri,
+                    healthy=self.healthy,
+                    latency_ms=None if self.latency is None else round(self.latency * 1000, 3),
+                    requests=self.requests,
+                    failures=self.failures,
+                    block_number=self.block_number)
+
+
+class NodePoolProvider(JSONBaseProvider):
+    """ Provider over several nodes. Requests go to the fastest healthy node, a node that fails
+    is taken out of the pool for down_time seconds and the next one is used instead. A background
+    health check measures every node, re-admits recovered nodes and drops nodes lagging behind. """
+
+    log = logging.getLogger()
+
+    def __init__(self,
+                 uris,
+                 request_timeout=180,
+                 health_check_interval=15,
+                 down_time=30,
+                 max_block_lag=3,
+                 latency_alpha=0.2,
+                 hedge_percentile=95,
+                 hedge_min_delay=0.05,
+                 hedge_max_delay=1.0,
+                 hedge_min_samples=10):
+
+        super().__init__()
+
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+        self.down_time = down_time
+        self.max_block_lag = max_block_lag
+        self.latency_alpha = latency_alpha
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_min_samples = hedge_min_samples
+
+        # no retries inside the node provider, the pool retry on the next node
+        self.nodes = [NodeStatus(uri, MeteredHTTPProvider(uri,
+                                                          request_kwargs={'timeout': request_timeout},
+                                                          exception_retry_configuration=None))
+                      for uri in uris]
+
+        self.lock = threading.Lock()
+
+        # hedging is enabled per thread (per task) with hedging()
+        self.hedge_local = threading.local()
+        self.hedge_executor = ThreadPoolExecutor(max_workers=2 * len(self.nodes),
+                                                 thread_name_prefix='NodePoolHedge')
+        self.hedge_stats = collections.Counter()
+        self.health_check_thread = None
+        if health_check_interval:
+            self.health_check_thread = threading.Thread(target=self.health_check_loop,
+                                                        name='NodePoolHealthCheck',
+                                                        daemon=True)
+            self.health_check_thread.start()
+
+    def __str__(self):
+
+        return "NodePoolProvider<{0}>".format(", ".join(node.uri for node in self.nodes))
+
+    def ranked_nodes(self):
+        """ Healthy nodes fastest first (not measured yet first), then the nodes down """
+
+        now = time.monotonic()
+        with self.lock:
+            for node in self.nodes:
+                if not node.healthy and node.down_until <= now:
+                    # down time expired, give it another chance
+                    node.healthy = True
+
+            healthy = [node for node in self.nodes if node.healthy]
+            down = [node for node in self.nodes if not node.healthy]
+
+        healthy.sort(key=lambda node: -1 if node.latency is None else node.latency)
+        down.sort(key=lambda node: node.down_until)
+
+        return healthy + down
+
+    def mark_success(self, node, elapsed):
+
+        with self.lock:
+            node.requests += 1
+            node.record_latency(elapsed, self.latency_alpha)
+            if not node.healthy:
+                node.healthy = True
+                self.log.info("Node Pool :: {0} :: Re-admitted".format(node.uri))
+
+    def mark_failure(self, node, error):
+
+        with self.lock:
+            node.requests += 1
+            node.failures += 1
+            node.down_until = time.monotonic() + self.down_time
+            was_healthy = node.healthy
+            node.healthy = False
+
+        if was_healthy:
+            self.log.warning("Node Pool :: {0} :: Down for {1} seconds. {2}".format(node.uri, self.down_time, error))
+
+    def request_node(self, node, method, params):
+
+        start = time.monotonic()
+        response = node.provider.make_request(method, params)
+        self.mark_success(node, time.monotonic() - start)
+
+        return response
+
+    @contextlib.contextmanager
+    def hedging(self, enabled=True):
+        """ Requests of the current thread inside the block are hedged """
+
+        previous = getattr(self.hedge_local, 'enabled', False)
+        self.hedge_local.enabled = enabled
+        try:
+            yield
+        finally:
+            self.hedge_local.enabled = previous
+
+    def hedge_delay(self, node):
+        """ Wait for the node up to the percentile of its latency before hedging """
+
+        with self.lock:
+            samples = sorted(node.samples)
+
+        if len(samples) < self.hedge_min_samples:
+            return self.hedge_max_delay
+
+        delay = samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+        return min(max(delay, self.hedge_min_delay), self.hedge_max_delay)
+
+    def hedged_request(self, first, second, method, params):
+        """ Request to the first node, if it has not answered after the hedge delay the same
+        request goes to the second node. The first good answer wins. """
+
+        with self.lock:
+            self.hedge_stats['requests'] += 1
+
+        futures = {self.hedge_executor.submit(self.request_node, first, method, params): first}
+        done, pending = wait(futures, timeout=self.hedge_delay(first))
+        if pending or next(iter(done)).exception() is not None:
+            with self.lock:
+                self.hedge_stats['fired' if pending else 'failover'] += 1
+            metrics.hedge_sent_event(method, 'slow' if pending else 'failover')
+            futures[self.hedge_executor.submit(self.request_node, second, method, params)] = second
+            if pending:
+                self.log.info("Node Pool :: {0} :: Hedged to {1} ({2})".format(first.uri, second.uri, method))
+
+        pending = set(futures)
+        last_error = None
+        error_response = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    self.mark_failure(node, e)
+                    last_error = e
+                    continue
+                if 'error' in response:
+                    # ex.: the other node already has the raw transaction, wait for its answer
+                    error_response = response
+                    continue
+                if node is second:
+                    with self.lock:
+                        self.hedge_stats['won'] += 1
+                    metrics.hedge_won_event(method)
+                return response
+
+        if error_response is not None:
+            return error_response
+
+        raise ConnectionError("All the nodes failed! Last error: {0}".format(last_error))
+
+    def make_request(self, method, params):
+
+        if getattr(self.hedge_local, 'enabled', False):
+            healthy = [node for node in self.ranked_nodes() if node.healthy]
+            if len(healthy) > 1:
+                return self.hedged_request(healthy[0], healthy[1], method, params)
+
+        last_error = None
+        for node in self.ranked_nodes():
+            try:
+                return self.request_node(node, method, params)
+            except Exception as e:
+                self.mark_failure(node, e)
+                last_error = e
+
+        raise ConnectionError("All the nodes failed! Last error: {0}".format(last_error))
+
+    def make_batch_request(self, batch_requests):
+
+        last_error = None
+        for node in self.ranked_nodes():
+            start = time.monotonic()
+            try:
+                response = node.provider.make_batch_request(batch_requests)
+            except Exception as e:
+                self.mark_failure(node, e)
+                last_error = e
+                continue
+            self.mark_success(node, time.monotonic() - start)
+            return response
+
+        raise ConnectionError("All the nodes failed! Last error: {0}".format(last_error))
+
+    def health_check(self):
+        """ Probe every node with eth_blockNumber, nodes lagging behind the best block are down """
+
+        probes = list()
+        for node in self.nodes:
+            start = time.monotonic()
+            try:
+                response = node.provider.make_request('eth_blockNumber', [])
+                block_number = int(response['result'], 16)
+            except Exception as e:
+                probes.append((node, None, e))
+                continue
+            node.block_number = block_number
+            probes.append((node, time.monotonic() - start, None))
+
+        best_block = max([node.block_number for node, elapsed, error in probes if error is None], default=0)
+
+        for node, elapsed, error in probes:
+            if error is not None:
+                self.mark_failure(node, error)
+            elif best_block - node.block_number > self.max_block_lag:
+                self.mark_failure(node, "Lagging {0} blocks behind".format(best_block - node.block_number))
+            else:
+                self.mark_success(node, elapsed)
+
+    def health_check_loop(self):
+
+        while True:
+            try:
+                self.health_check()
+            except Exception as e:
+                self.log.error("Node Pool :: Health check error! {0}".format(e))
+            time.sleep(self.health_check_interval)
+
+    def stats(self):
+
+        with self.lock:
+            return [node.stats() for node in self.nodes]
+
+    def hedge_metrics(self):
+        """ requests: hedged requests, fired: second node asked because the first was slow,
+        failover: the first failed before the delay, won: the answer came from the second node """
+
+        with self.lock:
+            return dict(requests=self.hedge_stats['requests'],
+                        fired=self.hedge_stats['fired'],
+                        failover=self.hedge_stats['failover'],
+                        won=self.hedge_stats['won'])
@@ -0,0 +1,149 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import collections
+import datetime
+import logging
+import threading
+
+from web3 import Web3
+
+from .gas import multiply_gas_price
+
+
+class ReplacementEngine(object):
+    """ Replace by fee: a transaction pending more than bump_after_blocks blocks is signed again
+    with the same nonce and the gas price bumped by bump_factor, up to max_bumps replacements
+    and max_gas_price_factor times the original gas price. The nodes only accept a replacement
+    paying min_bump_factor times the gas price of the replaced transaction """
+
+    log = logging.getLogger()
+
+    def __init__(self,
+                 connection_manager,
+                 bump_after_blocks=2,
+                 bump_factor=1.4,
+                 max_bumps=3,
+                 max_gas_price_factor=3,
+                 min_bump_factor=1.1):
+
+        self.connection_manager = connection_manager
+        self.bump_after_blocks = bump_after_blocks
+        self.bump_factor = bump_factor
+        self.max_bumps = max_bumps
+        self.max_gas_price_factor = max_gas_price_factor
+        self.min_bump_factor = min_bump_factor
+
+        self.lock = threading.Lock()
+        # last replacements of all the tasks
+        self.replacements = collections.deque(maxlen=500)
+        self.count = 0
+
+    @classmethod
+    def from_config(cls, connection_manager, config):
+
+        settings = config.get('replacement', dict())
+        if not settings.get('enabled', False):
+            return None
+
+        return cls(connection_manager,
+                   bump_after_blocks=settings.get('bump_after_blocks', 2),
+                   bump_factor=settings.get('bump_factor', 1.4),
+                   max_bumps=settings.get('max_bumps', 3),
+                   max_gas_price_factor=settings.get('max_gas_price_factor', 3),
+                   min_bump_factor=settings.get('min_bump_factor', 1.1))
+
+    def bumped_gas_price(self, tx):
+        """ Next gas price of the curve, at least the current price and never over the cap.
+        None if the cap was reached """
+
+        original = tx.get('original_gas_price', tx['gas_price'])
+        cap = multiply_gas_price(original, self.max_gas_price_factor)
+        if multiply_gas_price(tx['gas_price'], self.min_bump_factor) > cap:
+            # the node would reject the replacement as underpriced
+            return None
+
+        gas_price = max(multiply_gas_price(tx['gas_price'], self.bump_factor),
+                        multiply_gas_price(tx['gas_price'], self.min_bump_factor))
+
+        oracle = self.connection_manager.gas_price_oracle
+        if oracle:
+            gas_price = max(gas_price, oracle.gas_price())
+
+        return min(gas_price, cap)
+
+    def check(self, task_name, tx):
+        """ Called with every pending (not mined) transaction of the tasks. Replace it if it is
+        stuck, the tx dict is updated with the new hash. Return the old hash if replaced """
+
+        block_number = self.connection_manager.web3.eth.block_number
+
+        if 'block' not in tx:
+            # start counting blocks from the first time seen pending
+            tx['block'] = block_number
+            return None
+
+        if block_number - tx['block'] < self.bump_after_blocks:
+            return None
+
+        if len(tx.get('replacements', list())) >= self.max_bumps:
+            return None
+
+        old_hash = tx['hash']
+        if not self.connection_manager.is_sent_transaction(old_hash):
+            # ex. recovered from the journal of a removed account, it can not be signed again
+            if not tx.get('not_replaceable'):
+                tx['not_replaceable'] = True
+                self.log.warning("Task :: {0} :: TX not sent by this connection, not replaced. Hash: [{1}]".format(
+                    task_name, Web3.to_hex(old_hash)))
+            return None
+
+        gas_price = self.bumped_gas_price(tx)
+        if gas_price is None:
+            return None
+
+        try:
+            tx_hash = self.connection_manager.replace_transaction(old_hash, gas_price)
+        except Exception as e:
+            self.log.error("Task :: {0} :: Error replacing transaction! [{1}] {2}".format(
+                task_name, Web3.to_hex(old_hash), e))
+            return None
+
+        replacement = dict(task_name=task_name,
+                           nonce=tx['nonce'],
+                           replaced_hash=old_hash,
+                           hash=tx_hash,
+                           old_gas_price=tx['gas_price'],
+                           gas_price=gas_price,
+                           block=block_number,
+                           timestamp=datetime.datetime.now())
+
+        tx.setdefault('original_gas_price', tx['gas_price'])
+        tx.setdefault('replacements', list()).append(replacement)
+        tx['hash'] = tx_hash
+        tx['gas_price'] = gas_price
+        tx['block'] = block_number
+
+        with self.lock:
+            self.replacements.append(replacement)
+            self.count += 1
+
+        self.log.info("Task :: {0} :: TX Replaced. Hash: [{1}] Replaced: [{2}] Nonce: [{3}] "
+                      "Gas Price: [{4}] -> [{5}]".format(task_name,
+                                                         Web3.to_hex(tx_hash),
+                                                         Web3.to_hex(old_hash),
+                                                         tx['nonce'],
+                                                         replacement['old_gas_price'],
+                                                         gas_price))
+
+        return old_hash
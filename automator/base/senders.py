@@ -0,0 +1,86 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import itertools
+import logging
+import threading
+
+
+class SenderPool(object):
+    """ Choose the account (index in connection_manager.accounts) to send a transaction.
+
+    Policies:
+        single: every task sends from the first account, as with one account
+        pinned: every task gets its own account the first time (in turns) and keeps it
+        round_robin: every transaction goes to the next account
+        least_pending: the account with less nonces in flight
+
+    A task with "account" in its settings always use that account.
+    """
+
+    log = logging.getLogger()
+
+    policies = ('single', 'pinned', 'round_robin', 'least_pending')
+
+    def __init__(self, connection_manager, policy='single'):
+
+        if policy not in self.policies:
+            raise Exception("Not valid sender policy: {0}".format(policy))
+
+        self.connection_manager = connection_manager
+        self.policy = policy
+
+        self.lock = threading.Lock()
+        self.turns = itertools.count()
+        self.pinned = dict()
+
+    @classmethod
+    def from_config(cls, connection_manager, config):
+
+        settings = config.get('senders', dict())
+
+        return cls(connection_manager, policy=settings.get('policy', 'single'))
+
+    def accounts_count(self):
+
+        return max(len(self.connection_manager.accounts or list()), 1)
+
+    def least_pending(self):
+
+        in_flight = self.connection_manager.nonce_manager.in_flight
+        accounts = self.connection_manager.accounts
+
+        return min(range(self.accounts_count()),
+                   key=lambda index: (len(in_flight.get(accounts[index].address, ())), index))
+
+    def select(self, task_name, task_settings=None):
+        """ Index of the account to send the transaction of the task """
+
+        if task_settings and task_settings.get('account') is not None:
+            return task_settings['account']
+
+        if self.policy == 'single':
+            return 0
+
+        with self.lock:
+            if self.policy == 'round_robin':
+                return next(self.turns) % self.accounts_count()
+
+            if self.policy == 'least_pending':
+                return self.least_pending()
+
+            if task_name not in self.pinned:
+                self.pinned[task_name] = next(self.turns) % self.accounts_count()
+                self.log.info("Senders :: {0} :: Pinned to account {1}".format(task_name, self.pinned[task_name]))
+
+            return self.pinned[task_name]
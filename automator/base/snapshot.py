@@ -0,0 +1,79 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+
+
+class AddressesSnapshot(object):
+    """ Local json file with the contract addresses discovered, keyed by chain id and
+    main contract address, a warm restart loads them without asking the node """
+
+    log = logging.getLogger()
+
+    def __init__(self, path):
+
+        self.path = path
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+
+        settings = config.get('addresses_snapshot', dict())
+        if not settings.get('enabled', False):
+            return None
+
+        return cls(settings.get('path', 'addresses_snapshot.json'))
+
+    @staticmethod
+    def key(chain_id, main_address):
+
+        return "{0}:{1}".format(chain_id, main_address.lower())
+
+    def read(self):
+
+        if not os.path.isfile(self.path):
+            return dict()
+
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError as e:
+            self.log.error("Addresses Snapshot :: {0} :: Not valid, ignoring it. {1}".format(self.path, e))
+            return dict()
+
+    def load(self, chain_id, main_address):
+        """ Addresses of the snapshot, None if there is no snapshot for the key """
+
+        with self.lock:
+            entry = self.read().get(self.key(chain_id, main_address))
+
+        if entry is None:
+            return None
+
+        return entry['addresses']
+
+    def save(self, chain_id, main_address, addresses):
+
+        with self.lock:
+            content = self.read()
+            content[self.key(chain_id, main_address)] = dict(addresses=addresses,
+                                                             saved_at=datetime.datetime.now().isoformat())
+            # write and rename, a crash never leaves a half written file
+            tmp_path = "{0}.tmp".format(self.path)
+            with open(tmp_path, 'w') as f:
+                json.dump(content, f, indent=2)
+            os.replace(tmp_path, self.path)
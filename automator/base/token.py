@@ -25,7 +25,7 @@ class ERC20Token(Contract):
     log = logging.getLogger()
     precision = 10 ** 18
 
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/ERC20Token.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
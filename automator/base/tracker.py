@@ -0,0 +1,125 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import logging
+import threading
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+
+# fields of the receipt formatted as web3.eth.get_transaction_receipt does (web3.types.TxReceipt),
+# the others (logs) are kept as the node sent them
+RECEIPT_QUANTITIES = ('blockNumber', 'cumulativeGasUsed', 'effectiveGasPrice', 'gasUsed', 'status',
+                      'transactionIndex', 'type')
+RECEIPT_BYTES = ('blockHash', 'logsBloom', 'transactionHash')
+RECEIPT_ADDRESSES = ('contractAddress', 'from', 'to')
+
+
+def format_receipt(receipt):
+    """ JSON-RPC receipt with the quantities as int, hashes as bytes and checksum addresses """
+
+    formatted = dict(receipt)
+    for key in RECEIPT_QUANTITIES:
+        if formatted.get(key) is not None:
+            formatted[key] = int(formatted[key], 16)
+    for key in RECEIPT_BYTES:
+        if formatted.get(key) is not None:
+            formatted[key] = HexBytes(formatted[key])
+    for key in RECEIPT_ADDRESSES:
+        if formatted.get(key):
+            formatted[key] = Web3.to_checksum_address(formatted[key])
+
+    return AttributeDict.recursive(formatted)
+
+
+class PendingTransactionsTracker(object):
+    """ Status of the pending transactions of all the tasks. All the hashes (collect()) and
+    the nonces of the accounts are resolved in one JSON-RPC batch, once per block """
+
+    log = logging.getLogger()
+
+    def __init__(self, connection_manager, collect):
+
+        self.connection_manager = connection_manager
+        # callable returning the hashes (hex) pending of all the tasks
+        self.collect = collect
+
+        self.lock = threading.Lock()
+        self.block_number = None
+        self.transactions = dict()
+        self.nonces = dict()
+
+        # counters
+        self.batches = 0
+        self.requests = 0
+
+    def refresh(self, block_number, tx_hashes, addresses):
+        """ One batch: transaction count of the addresses, transaction and receipt of the hashes """
+
+        batch = [('eth_getTransactionCount', [address, 'latest']) for address in addresses]
+        for tx_hash in tx_hashes:
+            batch.append(('eth_getTransactionByHash', [tx_hash]))
+            batch.append(('eth_getTransactionReceipt', [tx_hash]))
+
+        responses = self.connection_manager.web3.provider.make_batch_request(batch)
+        if not isinstance(responses, list):
+            raise Exception("Batch request error! {0}".format(responses.get('error', responses)))
+
+        self.batches += 1
+        self.requests += len(batch)
+
+        for response in responses:
+            if 'error' in response:
+                raise Exception("Batch request error! {0}".format(response['error']))
+
+        results = iter([response['result'] for response in responses])
+
+        nonces = dict()
+        for address in addresses:
+            nonces[address] = int(next(results), 16)
+
+        transactions = dict()
+        for tx_hash in tx_hashes:
+            tx = next(results)
+            tx_rcp = next(results)
+            if tx_rcp is not None:
+                tx_rcp = format_receipt(tx_rcp)
+            transactions[tx_hash] = (tx is not None, tx_rcp)
+
+        self.block_number = block_number
+        self.nonces = nonces
+        self.transactions = transactions
+
+    def lookup(self, tx_hashes, address):
+        """ Return the last nonce used by the address and (transaction found, receipt or None)
+        of every hash. Ask the node only on a new block or a hash not seen before """
+
+        with self.lock:
+            block_number = self.connection_manager.web3.eth.block_number
+
+            missing = address not in self.nonces or any(tx_hash not in self.transactions for tx_hash in tx_hashes)
+            if block_number != self.block_number or missing:
+                all_hashes = sorted(set(self.collect()) | set(tx_hashes))
+                addresses = sorted(set(self.nonces) | {address})
+                self.refresh(block_number, all_hashes, addresses)
+
+            return self.nonces[address], [self.transactions[tx_hash] for tx_hash in tx_hashes]
+
+    def stats(self):
+
+        return dict(block_number=self.block_number,
+                    batches=self.batches,
+                    requests=self.requests,
+                    tracked=len(self.transactions))
@@ -0,0 +1,121 @@
+"""
+                    GNU AFFERO GENERAL PUBLIC LICENSE
+                       Version 3, 19 November 2007
+
+ Copyright (C) 2007 Free Software Foundation, Inc. <https://fsf.org/>
+ Everyone is permitted to copy and distribute verbatim copies
+ of this license document, but changing it is not allowed.
+
+ THIS IS A PART OF MONEY ON CHAIN PACKAGE
+ by Martin Mulone (martin.mulone@moneyonchain.com)
+
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from web3 import AsyncWeb3, WebSocketProvider
+
+
+class BlockWatcher(object):
+    """ One watcher of the block head for all the tasks. Polls eth_blockNumber (or subscribe to
+    newHeads over websocket if websocket_uri) and call the subscribers once per new block """
+
+    log = logging.getLogger()
+
+    def __init__(self, connection_manager, poll_interval=1.0, websocket_uri=None):
+
+        self.connection_manager = connection_manager
+        self.poll_interval = poll_interval
+        self.websocket_uri = websocket_uri
+
+        self.block_number = None
+        self.block_seen_at = None
+        self.subscribers = list()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def subscribe(self, callback):
+        """ callback(block_number) is called from the watcher thread on every new block """
+
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def start(self):
+
+        if self.thread is not None:
+            return
+
+        self.thread = threading.Thread(target=self.run, name='BlockWatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.stop_event.set()
+
+    def on_block_number(self, block_number):
+        """ Fan out the block to the subscribers, older or repeated heads are ignored """
+
+        with self.lock:
+            if self.block_number is not None and block_number <= self.block_number:
+                return
+            self.block_number = block_number
+            self.block_seen_at = time.monotonic()
+            subscribers = list(self.subscribers)
+
+        # the head is free for the read cache
+        read_cache = self.connection_manager.read_cache
+        if read_cache:
+            read_cache.set_head(block_number)
+
+        self.log.debug("Block Watcher :: New block {0}".format(block_number))
+
+        for callback in subscribers:
+            try:
+                callback(block_number)
+            except Exception as e:
+                self.log.error("Block Watcher :: Subscriber error! {0}".format(e))
+
+    def poll(self):
+        """ eth_blockNumber straight to the provider, the middlewares (read cache) are skipped """
+
+        response = self.connection_manager.web3.provider.make_request('eth_blockNumber', [])
+        if 'error' in response:
+            raise Exception(response['error'])
+
+        return int(response['result'], 16)
+
+    def run_polling(self):
+
+        while not self.stop_event.is_set():
+            try:
+                self.on_block_number(self.poll())
+            except Exception as e:
+                self.log.error("Block Watcher :: Error polling block number! {0}".format(e))
+            self.stop_event.wait(self.poll_interval)
+
+    async def run_websocket(self):
+
+        async with AsyncWeb3(WebSocketProvider(self.websocket_uri)) as web3:
+            await web3.eth.subscribe('newHeads')
+            self.log.info("Block Watcher :: Subscribed to new heads on {0}".format(self.websocket_uri))
+            async for message in web3.socket.process_subscriptions():
+                if self.stop_event.is_set():
+                    break
+                block_number = message['result']['number']
+                if isinstance(block_number, str):
+                    block_number = int(block_number, 16)
+                self.on_block_number(block_number)
+
+    def run(self):
+
+        if self.websocket_uri:
+            try:
+                asyncio.run(self.run_websocket())
+            except Exception as e:
+                self.log.error("Block Watcher :: Websocket error, falling back to polling! {0}".format(e))
+
+        self.run_polling()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from .logger import log
+
+
+class TaskConditions:
+    """ Predicates of all the tasks resolved in one Multicall2 batch.
+
+    The batch is evaluated once per block head seen by the block watcher (on_new_block) and
+    shared by every task, so all the decisions of a cycle come from the same block. Without
+    a block watcher it is fresh for max_age seconds.
+    """
+
+    def __init__(self, multicall, max_age=1):
+        self.multicall = multicall
+        self.max_age = max_age
+
+        # name -> (contract_address, function, input_parameters, format output)
+        self.calls = dict()
+
+        self.lock = threading.Lock()
+        self.block_number = None
+        self.results = dict()
+        self.evaluated_at = None
+
+        # last head of the block watcher and head of the last evaluation
+        self.head = None
+        self.evaluated_head = None
+
+    def add(self, name, contract_address, function, input_parameters=None, format_result=None):
+        """ Add the predicate to the batch """
+
+        self.calls[name] = (contract_address, function, input_parameters, format_result)
+
+    def on_new_block(self, block_number):
+        """ Block watcher subscriber: the next result evaluates the batch again. No lock, the
+        watcher must not wait an evaluation in progress """
+
+        if self.head is None or block_number > self.head:
+            self.head = block_number
+
+    def evaluate(self):
+        """ Resolve all the predicates in one call """
+
+        evaluated_head = self.head
+        names = list(self.calls.keys())
+        block_number, decoded_results, d_validity = self.multicall.aggregate_multiple(
+            [self.calls[name] for name in names])
+
+        self.results = dict()
+        for name, decoded_result, valid in zip(names, decoded_results, d_validity['results']):
+            if valid:
+                self.results[name] = decoded_result
+
+        self.block_number = block_number
+        self.evaluated_at = time.monotonic()
+        # a batch of a block newer than the head of the watcher is fresh until the watcher sees it
+        self.evaluated_head = max(evaluated_head or 0, block_number)
+
+    def is_fresh(self):
+
+        if self.evaluated_at is None:
+            return False
+
+        if self.head is not None:
+            # one evaluation per block head
+            return self.evaluated_head is not None and self.head <= self.evaluated_head
+
+        return time.monotonic() - self.evaluated_at < self.max_age
+
+    def result(self, name, min_block=None):
+        """ Result of the predicate, raise KeyError if the predicate is not in the batch or its call failed.
+        With min_block a batch of an older block is evaluated again """
+
+        if name not in self.calls:
+            raise KeyError(name)
+
+        with self.lock:
+            outdated = min_block is not None and (self.block_number is None or self.block_number < min_block)
+            if outdated or not self.is_fresh():
+                try:
+                    self.evaluate()
+                except Exception as e:
+                    # direct calls of the tasks are used instead until the next evaluation
+                    log.error("Conditions :: Error evaluating Multicall2 batch! {0}".format(e))
+                    self.results = dict()
+                    self.evaluated_at = time.monotonic()
+                    self.evaluated_head = self.head
+
+            return self.results[name]
@@ -15,9 +15,10 @@ import os
 import logging
 from web3.types import BlockIdentifier
 from web3 import Web3
+from eth_utils.abi import get_abi_input_types, get_abi_output_types
 
 
-from .base.contracts import Contract
+from .base.contracts import Contract, function_selector
 
 
 class Multicall2(Contract):
@@ -26,7 +27,7 @@ class Multicall2(Contract):
     precision = 10 ** 18
 
     contract_name = 'Multicall2'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/Multicall2.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -39,6 +40,23 @@ class Multicall2(Contract):
         # finally load the contract
         self.load_contract()
 
+    @staticmethod
+    def encode_call(function, input_parameters=None):
+        """ Calldata of the contract function, ex.: moc.sc.functions.isSettlementEnabled """
+
+        input_types = get_abi_input_types(function.abi)
+        arguments = input_parameters if input_parameters else []
+        return function_selector(function.abi) + function.w3.codec.encode(input_types, arguments)
+
+    @staticmethod
+    def decode_call(function, return_data):
+        """ Decode the return data of the contract function, one output is returned as value like .call() """
+
+        decoded = function.w3.codec.decode(get_abi_output_types(function.abi), return_data)
+        if len(decoded) == 1:
+            return decoded[0]
+        return decoded
+
     def aggregate_multiple(self, call_list, require_success=False, block_identifier: BlockIdentifier = 'latest'):
 
         list_aggregate = list()
@@ -53,14 +71,13 @@ class Multicall2(Contract):
             if len(aggregate_tuple) != 4:
                 raise Exception("The list must contains tuple or list of parameters: "
                                 "(contract_address, function, input_parameters, format output). "
-                                "Example: (moc_state_address, moc_state.sc.getBitcoinPrice, None, None)")
+                                "Example: (moc_state_address, moc_state.sc.functions.getBitcoinPrice, None, None)")
 
-            if aggregate_tuple[2]:
-                list_aggregate.append((aggregate_tuple[0], aggregate_tuple[1].encode_input(*aggregate_tuple[2])))
-            else:
-                list_aggregate.append((aggregate_tuple[0], aggregate_tuple[1].encode_input()))
+            list_aggregate.append((Web3.to_checksum_address(aggregate_tuple[0]),
+                                   self.encode_call(aggregate_tuple[1], aggregate_tuple[2])))
 
-        results = self.sc.tryBlockAndAggregate(require_success, list_aggregate, block_identifier=block_identifier)
+        results = self.sc.functions.tryBlockAndAggregate(
+            require_success, list_aggregate).call(block_identifier=block_identifier)
 
         # decode results
         count = 0
@@ -71,9 +88,13 @@ class Multicall2(Contract):
         for result in results[2]:
             fn = call_list[count][1]
             format_result = call_list[count][3]
-            decoded_result = fn.decode_output(result[1])
-            if format_result:
-                decoded_result = format_result(decoded_result)
+            if result[0]:
+                decoded_result = self.decode_call(fn, result[1])
+                if format_result:
+                    decoded_result = format_result(decoded_result)
+            else:
+                # reverted call, nothing to decode
+                decoded_result = None
 
             decoded_results.append(decoded_result)
 
@@ -101,7 +122,7 @@ class ERC20Token(Contract):
     log = logging.getLogger()
     precision = 10 ** 18
 
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/ERC20Token.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -146,7 +167,7 @@ class MoC(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoC'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/MoC.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -218,7 +239,7 @@ class MoCConnector(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoCConnector'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/MoCConnector.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -238,7 +259,7 @@ class MoCState(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoCState'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/MoCState.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -271,7 +292,7 @@ class MoCInrate(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoCInrate'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/MoCInrate.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -291,7 +312,7 @@ class CommissionSplitter(Contract):
     precision = 10 ** 18
 
     contract_name = 'CommissionSplitter'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/CommissionSplitter.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -324,7 +345,7 @@ class MoCMedianizer(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoCMedianizer'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/moc/MoCMedianizer.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -357,7 +378,7 @@ class MoCRRC20(MoC):
     precision = 10 ** 18
 
     contract_name = 'MoC'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/MoC.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -390,7 +411,7 @@ class MoCConnectorRRC20(MoCConnector):
     precision = 10 ** 18
 
     contract_name = 'MoCConnector'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/MoCConnector.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -410,7 +431,7 @@ class MoCStateRRC20(MoCState):
     precision = 10 ** 18
 
     contract_name = 'MoCState'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/MoCState.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -443,7 +464,7 @@ class MoCInrateRRC20(Contract):
     precision = 10 ** 18
 
     contract_name = 'MoCInrate'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/MoCInrate.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -463,7 +484,7 @@ class CommissionSplitterRRC20(CommissionSplitter):
     precision = 10 ** 18
 
     contract_name = 'CommissionSplitter'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/CommissionSplitter.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
@@ -483,7 +504,7 @@ class MoCMedianizerRRC20(MoCMedianizer):
     precision = 10 ** 18
 
     contract_name = 'MoCMedianizer'
-    contract_abi = Contract.content_abi_file(
+    contract_abi = Contract.lazy_abi_file(
         os.path.join(os.path.dirname(os.path.realpath(__file__)), 'abi/rrc20/MoCMedianizer.abi'))
 
     def __init__(self, connection_manager, contract_address=None, contract_abi=None, contract_bin=None):
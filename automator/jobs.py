@@ -0,0 +1,420 @@
+from web3 import Web3
+
+from .contracts import Multicall2, \
+    MoC, \
+    MoCConnector, \
+    MoCState, \
+    CommissionSplitter,\
+    MoCMedianizer,\
+    MoCRRC20, \
+    MoCConnectorRRC20, \
+    MoCStateRRC20,\
+    MoCMedianizerRRC20,\
+    MoCInrate,\
+    MoCInrateRRC20, \
+    ERC20Token
+
+from .logger import log, Lazy
+from .utils import aws_put_metric_heart_beat
+
+
+class Read:
+    """ Call of a contract function, ex.: Read('isSettlementEnabled', moc.sc.functions.isSettlementEnabled).
+    name: predicate in the Multicall2 batch of the conditions, None if it is not a condition.
+    min_block: the result must be of this block or newer """
+
+    def __init__(self, name, function, *args, min_block=None):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.min_block = min_block
+
+
+class Send:
+    """ Transaction of the task, same arguments of send_task_transaction() """
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+class BlockNumber:
+    """ Last block number of the node """
+
+
+class AutomatorJobs:
+    """ Bodies of the tasks shared by the thread and the asyncio engines.
+
+    A job is a generator: it yields what it needs from the node (Read, a list of Read, Send or
+    BlockNumber) and the engine sends back the result, run_job() of the engine resolves them with
+    direct calls or awaiting them. The decisions of the tasks are written only once here.
+    """
+
+    steps_controllers = None
+
+    def partial_execution_steps(self, settings_key):
+        """ Steps from the adaptive controller of the task or fixed from config """
+
+        if self.steps_controllers and settings_key in self.steps_controllers:
+            return self.steps_controllers[settings_key].steps()
+
+        return self.config['tasks'][settings_key]['partial_execution_steps']
+
+    def load_main_contracts(self):
+        """ Main contract and Multicall2, the addresses of the others come from them """
+
+        connection_manager = self.connection_helper.connection_manager
+
+        if self.config['app_mode'] == 'MoC':
+            self.contracts_loaded["MoC"] = MoC(
+                connection_manager,
+                contract_address=self.config['addresses']['MoC'])
+        else:
+            self.contracts_loaded["MoC"] = MoCRRC20(
+                connection_manager,
+                contract_address=self.config['addresses']['MoC'])
+        self.contracts_addresses['MoC'] = self.contracts_loaded["MoC"].address().lower()
+
+        # Multicall
+        self.contracts_loaded["Multicall2"] = Multicall2(
+            connection_manager,
+            contract_address=self.config['addresses']['Multicall2'])
+
+    def discover_addresses_job(self):
+        """ Addresses of the protocol contracts from the main contract in 3 round trips:
+        connector, the 4 contracts of the connector together and the price provider """
+
+        connection_manager = self.connection_helper.connection_manager
+        moc = self.contracts_loaded["MoC"]
+
+        addresses = dict()
+        addresses['MoCConnector'] = yield Read(None, moc.sc.functions.connector)
+
+        connector_class = MoCConnector if self.config['app_mode'] == 'MoC' else MoCConnectorRRC20
+        connector = connector_class(connection_manager, contract_address=addresses['MoCConnector'])
+
+        names = ['MoCState', 'MoCSettlement', 'MoCExchange', 'MoCInrate']
+        results = yield [Read(None, connector.sc.functions.mocState),
+                         Read(None, connector.sc.functions.mocSettlement),
+                         Read(None, connector.sc.functions.mocExchange),
+                         Read(None, connector.sc.functions.mocInrate)]
+        addresses.update(zip(names, results))
+
+        if self.config['app_mode'] == 'MoC':
+            moc_state = MoCState(connection_manager, contract_address=addresses['MoCState'])
+            addresses['PriceProvider'] = yield Read(None, moc_state.sc.functions.getBtcPriceProvider)
+        else:
+            moc_state = MoCStateRRC20(connection_manager, contract_address=addresses['MoCState'])
+            addresses['PriceProvider'] = yield Read(None, moc_state.sc.functions.getPriceProvider)
+
+        return addresses
+
+    def load_protocol_contracts(self, addresses):
+        """ Contracts of the discovered addresses and of the commission splitters """
+
+        connection_manager = self.connection_helper.connection_manager
+
+        if self.config['app_mode'] == 'MoC':
+            # MoC
+            self.contracts_loaded["MoCConnector"] = MoCConnector(
+                connection_manager,
+                contract_address=addresses['MoCConnector'])
+            self.contracts_loaded["MoCState"] = MoCState(
+                connection_manager,
+                contract_address=addresses['MoCState'])
+            self.contracts_loaded["MoCInrate"] = MoCInrate(
+                connection_manager,
+                contract_address=addresses['MoCInrate'])
+            self.contracts_loaded["PriceProvider"] = MoCMedianizer(
+                connection_manager,
+                contract_address=addresses['PriceProvider'])
+        else:
+            # RRC20
+            self.contracts_loaded["MoCConnector"] = MoCConnectorRRC20(
+                connection_manager,
+                contract_address=addresses['MoCConnector'])
+            self.contracts_loaded["MoCState"] = MoCStateRRC20(
+                connection_manager,
+                contract_address=addresses['MoCState'])
+            self.contracts_loaded["MoCInrate"] = MoCInrateRRC20(
+                connection_manager,
+                contract_address=addresses['MoCInrate'])
+            self.contracts_loaded["PriceProvider"] = MoCMedianizerRRC20(
+                connection_manager,
+                contract_address=addresses['PriceProvider'])
+
+        self.contracts_addresses['MoCConnector'] = self.contracts_loaded["MoCConnector"].address().lower()
+        self.contracts_addresses['MoCSettlement'] = addresses['MoCSettlement']
+        self.contracts_addresses['MoCExchange'] = addresses['MoCExchange']
+        self.contracts_addresses['MoCInrate'] = addresses['MoCInrate']
+        self.contracts_addresses['MoCState'] = addresses['MoCState']
+        self.contracts_addresses['PriceProvider'] = addresses['PriceProvider']
+
+        # Commission splitters
+        if 'commission_splitters' in self.config['tasks']:
+            count = 0
+            for setting_commission in self.config['tasks']['commission_splitters']:
+                self.contracts_loaded["CommissionSplitter_{0}".format(count)] = CommissionSplitter(
+                    connection_manager,
+                    contract_address=setting_commission['address'])
+                self.contracts_addresses["CommissionSplitter_{0}".format(count)] = self.contracts_loaded[
+                    "CommissionSplitter_{0}".format(count)].address().lower()
+
+                # Token Collateral only with rrc20 collateral support
+                # on coinbase this have to be empty
+                if setting_commission['ac_token']:
+                    self.contracts_loaded["CommissionSplitter_Token_{0}".format(count)] = ERC20Token(
+                        connection_manager,
+                        contract_address=setting_commission['ac_token'])
+                    self.contracts_addresses["CommissionSplitter_Token_{0}".format(count)] = self.contracts_loaded[
+                        "CommissionSplitter_Token_{0}".format(count)].address().lower()
+
+                # Fee Token
+                if setting_commission['fee_token']:
+                    self.contracts_loaded["CommissionSplitter_FeeToken_{0}".format(count)] = ERC20Token(
+                        connection_manager,
+                        contract_address=setting_commission['fee_token'])
+                    self.contracts_addresses["CommissionSplitter_FeeToken_{0}".format(count)] = \
+                        self.contracts_loaded["CommissionSplitter_FeeToken_{0}".format(count)].address().lower()
+
+                count += 1
+
+    def calculate_ema_job(self, task, global_manager, task_result):
+
+        should_calculate_ema = yield Read(
+            'shouldCalculateEma',
+            self.contracts_loaded["MoCState"].sc.functions.shouldCalculateEma)
+
+        if should_calculate_ema:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["MoCState"].calculate_moving_average,
+                task_settings=self.config['tasks']['calculate_bma'])
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def daily_inrate_payment_job(self, task, global_manager, task_result):
+
+        is_daily_enabled = yield Read(
+            'isDailyEnabled',
+            self.contracts_loaded["MoC"].sc.functions.isDailyEnabled)
+
+        if is_daily_enabled:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["MoC"].daily_inrate_payment,
+                task_settings=self.config['tasks']['daily_inrate_payment'])
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def run_settlement_job(self, task, global_manager, task_result):
+
+        partial_execution_steps = self.partial_execution_steps('run_settlement')
+
+        # a step just mined changed the settlement, the state read must include it
+        is_settlement_enabled = yield Read(
+            'isSettlementEnabled',
+            self.contracts_loaded["MoC"].sc.functions.isSettlementEnabled,
+            min_block=task.last_receipt_block)
+
+        if is_settlement_enabled:
+
+            # pipeline: up to depth steps in flight with consecutive nonces, 1 waits every step
+            pipeline_depth = self.config['tasks']['run_settlement'].get('pipeline', dict()).get('depth', 1)
+            pending_txs = task_result.get('pending_transactions', None) or list()
+
+            # return if the pipeline is full
+            if len(pending_txs) >= pipeline_depth:
+                return task_result
+
+            transactions = 1
+            if pipeline_depth > 1:
+                # the redeem queue is work the settlement still has to do (a lower bound, one step
+                # per request): more steps than that in flight would revert once it finishes
+                redeem_queue_size = yield Read(
+                    'redeemQueueSize',
+                    self.contracts_loaded["MoC"].sc.functions.redeemQueueSize,
+                    min_block=task.last_receipt_block)
+                transactions = min(pipeline_depth,
+                                   max(1, -(-redeem_queue_size // partial_execution_steps)))
+                if len(pending_txs) >= transactions:
+                    return task_result
+
+            for _ in range(transactions - len(pending_txs)):
+                tx_hash = yield Send(
+                    task,
+                    task_result,
+                    self.contracts_loaded["MoC"].run_settlement,
+                    partial_execution_steps,
+                    task_settings=self.config['tasks']['run_settlement'],
+                    extra=dict(steps=partial_execution_steps, steps_key='run_settlement'))
+                if tx_hash is None:
+                    break
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def contract_liquidation_job(self, task, global_manager, task_result):
+
+        is_liquidation_reached = yield Read(
+            'isLiquidationReached',
+            self.contracts_loaded["MoCState"].sc.functions.isLiquidationReached)
+
+        if is_liquidation_reached:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            # evalLiquidation() takes no steps
+            yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["MoC"].eval_liquidation,
+                task_settings=self.config['tasks']['liquidation'])
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def pay_bitpro_holders_job(self, task, global_manager, task_result):
+
+        app_mode = self.config['app_mode']
+
+        if app_mode == 'MoC':
+            is_bitpro_interest_enabled = yield Read(
+                'isBitProInterestEnabled',
+                self.contracts_loaded["MoC"].sc.functions.isBitProInterestEnabled)
+        else:
+            is_bitpro_interest_enabled = yield Read(
+                'isRiskProInterestEnabled',
+                self.contracts_loaded["MoC"].sc.functions.isRiskProInterestEnabled)
+
+        if is_bitpro_interest_enabled:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            tx_hash = yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["MoC"].pay_bitpro_holders_interest_payment,
+                task_settings=self.config['tasks']['pay_bitpro_holders'])
+
+            if tx_hash:
+                block_number = yield BlockNumber()
+                global_manager['pay_bitpro_holders_confirm_block'] = block_number + 2
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def oracle_poke_job(self, task, global_manager, task_result):
+
+        peek, compute = yield [
+            Read('peek', self.contracts_loaded["PriceProvider"].sc.functions.peek),
+            Read('compute', self.contracts_loaded["PriceProvider"].sc.functions.compute)]
+
+        price_validity = peek[1]
+        compute_validity = compute[1]
+
+        if not compute_validity and price_validity:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            tx_hash = yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["PriceProvider"].poke,
+                task_settings=self.config['tasks']['oracle_poke'])
+
+            if tx_hash is None:
+                return task_result
+
+            log.error("Task :: {0} :: Not valid price! Disabling Price!".format(task.task_name))
+            aws_put_metric_heart_beat(self.config['tasks']['oracle_poke']['cloudwatch'], 1)
+
+        else:
+            # if no valid price in oracle please send alarm
+            if not price_validity:
+                log.error("Task :: {0} :: No valid price in oracle!".format(task.task_name))
+                aws_put_metric_heart_beat(self.config['tasks']['oracle_poke']['cloudwatch'], 1)
+
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
+
+    def commission_splitter_job(self, index, task, global_manager, task_result):
+
+        commission_setting = self.config['tasks']['commission_splitters'][index]
+        splitter_address = Web3.to_checksum_address(commission_setting['address'])
+
+        # If AC Token or Coinbase collateral
+        if commission_setting["ac_token"]:
+            balances = [Read(
+                "CommissionSplitter_Balance_{0}".format(index),
+                self.contracts_loaded["CommissionSplitter_Token_{0}".format(index)].sc.functions.balanceOf,
+                splitter_address)]
+        else:
+            balances = [Read(
+                "CommissionSplitter_Balance_{0}".format(index),
+                self.contracts_loaded["Multicall2"].sc.functions.getEthBalance,
+                splitter_address)]
+
+        if commission_setting["fee_token"]:
+            balances.append(Read(
+                "CommissionSplitter_FeeTokenBalance_{0}".format(index),
+                self.contracts_loaded["CommissionSplitter_FeeToken_{0}".format(index)].sc.functions.balanceOf,
+                splitter_address))
+
+        coin_balance, *fee_token_balance = yield balances
+        fee_token_balance = fee_token_balance[0] if fee_token_balance else 0
+
+        if coin_balance > commission_setting["min_balance"] or \
+                fee_token_balance > commission_setting["min_balance_fee_token"]:
+
+            # return if there are pending transactions
+            if task_result.get('pending_transactions', None):
+                return task_result
+
+            log.info(
+                "Task :: {0} :: Commission Splitter has balance!. Balances: -AC Token: {1}. -Fee Token: {2}.  ",
+                task.task_name,
+                Lazy(Web3.from_wei, coin_balance, 'ether'),
+                Lazy(Web3.from_wei, fee_token_balance, 'ether'))
+
+            yield Send(
+                task,
+                task_result,
+                self.contracts_loaded["CommissionSplitter_{0}".format(index)].split,
+                task_settings=commission_setting)
+
+        else:
+            log.info("Task :: {0} :: No!", task.task_name)
+
+        return task_result
@@ -1,9 +1,234 @@
+import atexit
+import datetime
+import json
 import logging
 import logging.config
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from web3 import Web3
 
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S')
 
-log = logging.getLogger('default')
+
+class Lazy(object):
+    """ Value computed only if the line is written, ex. Lazy(Web3.from_wei, balance, 'ether') """
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+    def __format__(self, format_spec):
+        return format(self.func(*self.args), format_spec)
+
+
+class BraceMessage(object):
+    """ Message formatted with str.format only when it is written. Bytes (tx hashes) are
+    written as hex """
+
+    __slots__ = ('fmt', 'args')
+
+    def __init__(self, fmt, args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        args = [Web3.to_hex(arg) if isinstance(arg, (bytes, bytearray)) else arg for arg in self.args]
+        return self.fmt.format(*args)
+
+
+class BraceLogger(logging.LoggerAdapter):
+    """ log.info("Task :: {0} :: No!", task_name): the arguments are kept in the record and
+    formatted by the handler, nothing is formatted if the level is disabled """
+
+    def __init__(self, logger):
+        super().__init__(logger, dict())
+
+    def log(self, level, msg, *args, **kwargs):
+
+        if self.isEnabledFor(level):
+            if args:
+                msg = BraceMessage(msg, args)
+            self.logger._log(level, msg, (), **kwargs)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    warn = warning
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, exc_info=True, **kwargs):
+        self.log(logging.ERROR, msg, *args, exc_info=exc_info, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
+
+
+class JsonFormatter(logging.Formatter):
+    """ One json object per line """
+
+    # attributes of every record, the others come from extra=
+    reserved = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+    def format(self, record):
+
+        data = dict(time=datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                    level=record.levelname,
+                    logger=record.name,
+                    thread=record.threadName,
+                    message=record.getMessage())
+        for key, value in record.__dict__.items():
+            if key not in self.reserved:
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
+class DedupFilter(logging.Filter):
+    """ Rate limit of repeated lines: the same message is written once every interval seconds,
+    then with the count of the lines suppressed """
+
+    # forget messages not seen for a while when there are more than max_keys
+    max_keys = 1000
+
+    def __init__(self, interval=60):
+        super().__init__()
+        self.interval = interval
+        self.seen = dict()
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+
+        # rendered once, the formatter reuses it
+        message = record.getMessage()
+        record.msg = message
+        record.args = ()
+        if record.exc_info:
+            return True
+
+        key = (record.levelno, message)
+        now = time.monotonic()
+
+        with self.lock:
+            last, suppressed = self.seen.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self.seen[key] = (last, suppressed + 1)
+                return False
+
+            self.seen[key] = (now, 0)
+            if len(self.seen) > self.max_keys:
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.interval}
+
+        if suppressed:
+            record.msg = '{0} [repeated {1} times]'.format(message, suppressed)
+
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ Put the record in the queue as is (formatting is done by the listener thread),
+    if the queue is full the line is dropped instead of blocking the task """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.reported = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped > self.reported:
+            dropped = self.dropped - self.reported
+            self.reported = self.dropped
+            try:
+                self.queue.put_nowait(logging.makeLogRecord(dict(
+                    name=record.name, levelno=logging.WARNING, levelname='WARNING',
+                    msg='Logging :: {0} lines dropped, queue full!'.format(dropped))))
+            except queue.Full:
+                pass
+
+
+log_listener = None
+
+
+def configure_logging(settings):
+    """ Logging from the settings of config.json:
+    mode: sync (default) or queue, format: text or json, dedup_interval: seconds (0 disabled),
+    level and max_queue """
+
+    global log_listener
+
+    root = logging.getLogger()
+    root.setLevel(settings.get('level', 'INFO'))
+
+    handler = logging.StreamHandler(sys.stderr)
+    if settings.get('format', 'text') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
+                                               datefmt='%Y-%m-%d %H:%M:%S'))
+
+    if settings.get('dedup_interval', 0):
+        handler.addFilter(DedupFilter(interval=settings['dedup_interval']))
+
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    stop_logging()
+
+    if settings.get('mode', 'sync') != 'queue':
+        root.addHandler(handler)
+        return
+
+    # the tasks only enqueue the record, one thread formats and writes
+    log_queue = queue.Queue(maxsize=settings.get('max_queue', 10000))
+    root.addHandler(DroppingQueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    log_listener.start()
+
+
+def stop_logging():
+    """ Write the lines still in the queue """
+
+    global log_listener
+
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+atexit.register(stop_logging)
+
+
+log = BraceLogger(logging.getLogger('default'))
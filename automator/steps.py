@@ -0,0 +1,119 @@
+import collections
+import threading
+
+from .base.metrics import metrics
+from .logger import log
+
+
+class StepsController:
+    """ Adaptive partial_execution_steps of the settlement (runSettlement(steps)).
+
+    Learns the gas used per step from the receipts of the transactions and picks the
+    largest number of steps that fits in gas_limit minus the safety margin. The gas per
+    step is the max of the last receipts: a run that processed less items than the steps
+    asked uses less gas, and must not make the next choice too optimistic.
+    """
+
+    def __init__(self,
+                 task_name,
+                 gas_limit,
+                 initial_steps,
+                 min_steps=1,
+                 max_steps=None,
+                 safety_margin=0.2,
+                 window=20):
+        self.task_name = task_name
+        self.gas_limit = gas_limit
+        self.initial_steps = initial_steps
+        self.min_steps = min_steps
+        self.max_steps = max_steps
+        self.safety_margin = safety_margin
+
+        self.lock = threading.Lock()
+        # last (steps, gas used, status) from the receipts
+        self.samples = collections.deque(maxlen=window)
+        self.last_steps = None
+        self.choices = 0
+        self.out_of_gas = 0
+
+    @classmethod
+    def from_settings(cls, task_name, task_settings):
+        """ None if adaptive_steps is not enabled in the settings of the task """
+
+        settings = task_settings.get('adaptive_steps', dict())
+        if not settings.get('enabled', False):
+            return None
+
+        return cls(task_name,
+                   gas_limit=task_settings['gas_limit'],
+                   initial_steps=task_settings['partial_execution_steps'],
+                   min_steps=settings.get('min_steps', 1),
+                   max_steps=settings.get('max_steps'),
+                   safety_margin=settings.get('safety_margin', 0.2),
+                   window=settings.get('window', 20))
+
+    def gas_per_step(self):
+        """ Conservative estimation from the receipts, None without receipts """
+
+        if not self.samples:
+            return None
+
+        return max(gas_used / steps for steps, gas_used, status in self.samples)
+
+    def steps(self):
+        """ Steps to ask in the next transaction """
+
+        with self.lock:
+            gas_per_step = self.gas_per_step()
+            if gas_per_step is None:
+                steps = self.initial_steps
+            else:
+                budget = self.gas_limit * (1 - self.safety_margin)
+                steps = int(budget // gas_per_step)
+
+            steps = max(steps, self.min_steps)
+            if self.max_steps:
+                steps = min(steps, self.max_steps)
+
+            if steps != self.last_steps:
+                log.info("Steps :: {0} :: Steps: [{1}] Gas per step: [{2}]".format(
+                    self.task_name, steps, None if gas_per_step is None else int(gas_per_step)))
+
+            self.last_steps = steps
+            self.choices += 1
+
+        metrics.steps_chosen_event(self.task_name, steps)
+
+        return steps
+
+    def observe(self, steps, gas_used, status):
+        """ Learn from the receipt of a transaction sent with steps """
+
+        if not steps:
+            return
+
+        out_of_gas = not status and gas_used >= self.gas_limit * 0.95
+        with self.lock:
+            if out_of_gas:
+                # out of gas: the steps did not fit, count the whole limit for them
+                self.out_of_gas += 1
+                gas_used = self.gas_limit
+            self.samples.append((steps, gas_used, status))
+
+        metrics.steps_receipt(self.task_name, gas_used, out_of_gas=out_of_gas)
+
+        log.info("Steps :: {0} :: Receipt Steps: [{1}] Gas used: [{2}] Status: [{3}]".format(
+            self.task_name, steps, gas_used, status))
+
+    def stats(self):
+        """ Choices and gas used, the same exported to Prometheus as automator_steps_* """
+
+        with self.lock:
+            gas_per_step = self.gas_per_step()
+            return dict(task_name=self.task_name,
+                        steps=self.last_steps,
+                        gas_per_step=None if gas_per_step is None else int(gas_per_step),
+                        gas_limit=self.gas_limit,
+                        choices=self.choices,
+                        out_of_gas=self.out_of_gas,
+                        last_gas_used=self.samples[-1][1] if self.samples else None)
@@ -1,25 +1,16 @@
-import decimal
 from web3 import Web3
 import datetime
-
-from .contracts import Multicall2, \
-    MoC, \
-    MoCConnector, \
-    MoCState, \
-    CommissionSplitter,\
-    MoCMedianizer,\
-    MoCRRC20, \
-    MoCConnectorRRC20, \
-    MoCStateRRC20,\
-    MoCMedianizerRRC20,\
-    MoCInrate,\
-    MoCInrateRRC20, \
-    ERC20Token
+import threading
 
 from .base.main import ConnectionHelperBase
+from .base.watcher import BlockWatcher
+from .base.snapshot import AddressesSnapshot
+from .base.metrics import metrics
+from .conditions import TaskConditions
+from .jobs import AutomatorJobs, Read, Send, BlockNumber
+from .steps import StepsController
 from .tasks_manager import PendingTransactionsTasksManager, on_pending_transactions
 from .logger import log
-from .utils import aws_put_metric_heart_beat
 
 
 __VERSION__ = '3.0.3'
@@ -28,7 +19,10 @@ __VERSION__ = '3.0.3'
 log.info("Starting Stable Protocol Automator version {0}".format(__VERSION__))
 
 
-class Automator(PendingTransactionsTasksManager):
+class Automator(AutomatorJobs, PendingTransactionsTasksManager):
+
+    # predicates of the tasks in one Multicall2 batch
+    conditions = None
 
     def __init__(self,
                  config,
@@ -44,572 +38,422 @@ class Automator(PendingTransactionsTasksManager):
                          self.connection_helper,
                          self.contracts_loaded)
 
-    @on_pending_transactions
-    def calculate_ema(self, task=None, global_manager=None, task_result=None):
-
-        if self.contracts_loaded["MoCState"].sc.functions.shouldCalculateEma().call():
-
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
-
-            web3 = self.connection_helper.connection_manager.web3
-
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
-
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
-
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
+    def condition(self, name, call_function, min_block=None):
+        """ Result of the predicate from the Multicall2 batch, direct call_function() if it is not available.
+        min_block: the batch must be of this block or newer (ex.: block of the last receipt of the task) """
 
+        if self.conditions:
             try:
-                tx_hash = self.contracts_loaded["MoCState"].calculate_moving_average(
-                    gas_limit=self.config['tasks']['calculate_bma']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['calculate_bma']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
+                return self.conditions.result(name, min_block=min_block)
+            except KeyError:
+                pass
+
+        return call_function()
+
+    def on_transaction_receipt(self, task, tx, tx_rcp):
+        """ The adaptive steps learn the gas used per step from the receipts """
+
+        if self.steps_controllers and tx.get('steps_key') in self.steps_controllers:
+            self.steps_controllers[tx['steps_key']].observe(tx['steps'], tx_rcp['gasUsed'], tx_rcp['status'])
+
+    def send_task_transaction(self, task, task_result, tx_function, *tx_args, task_settings=None, extra=None):
+        """ Send the transaction and add it to the pending transactions of the task,
+        extra fields are kept with the pending transaction """
+
+        connection_manager = self.connection_helper.connection_manager
+
+        # precomputed gas price (node price x factor), shared by all the tasks
+        gas_price = connection_manager.gas_price_oracle.gas_price()
+
+        # consecutive nonces (pipeline): same account of the transactions in flight, if it is
+        # still in the pool (a transaction of the journal may come from a key removed since),
+        # else the account from the sender pool. The nonce comes from the local allocator of the account
+        account_index = None
+        pending_txs = task_result.get('pending_transactions', None)
+        if pending_txs and 'account' in pending_txs[-1]:
+            addresses = [account.address.lower() for account in connection_manager.accounts]
+            pending_account = str(pending_txs[-1]['account']).lower()
+            if pending_account in addresses:
+                account_index = addresses.index(pending_account)
+        if account_index is None:
+            account_index = connection_manager.sender_pool.select(task.task_name, task_settings)
+            if pending_txs and 'account' in pending_txs[-1]:
+                log.warning("Task :: {0} :: Account [{1}] of the pending transactions is not in the "
+                            "sender pool, using [{2}]", task.task_name, pending_txs[-1]['account'],
+                            connection_manager.accounts[account_index].address)
+        account_address = connection_manager.accounts[account_index].address
+        nonce = connection_manager.nonce_manager.allocate(account_address)
+
+        tx_hash = None
+        try:
+            tx_hash = tx_function(
+                *tx_args,
+                gas_limit=task_settings['gas_limit'],
+                gas_price=gas_price,
+                nonce=nonce,
+                default_account=account_index
+            )
+        except ValueError as err:
+            log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
+            return None
+        finally:
+            # any error (simulation, build, sign, node) or nothing sent: the nonce is not used,
+            # a nonce left in flight would stop the next transactions of the account
+            if not tx_hash:
+                connection_manager.nonce_manager.release(account_address, nonce)
+
+        if tx_hash:
+            new_tx = dict()
+            new_tx['hash'] = tx_hash
+            new_tx['timestamp'] = datetime.datetime.now()
+            new_tx['gas_price'] = gas_price
+            new_tx['nonce'] = nonce
+            new_tx['account'] = account_address
+            new_tx['timeout'] = task_settings['wait_timeout']
+            if extra:
+                new_tx.update(extra)
+            task_result['pending_transactions'].append(new_tx)
+            self.journal_record(task, 'sent', new_tx)
+            metrics.transaction_event(task.task_name, 'sent')
+            self.submit_transaction(task, account_address, new_tx)
+
+            log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Account: [{2}] Nonce: [{3}] Gas Price: [{4}]",
+                     task.task_name, new_tx['hash'], account_address, new_tx['nonce'], gas_price)
+
+        return tx_hash
+
+    def run_job(self, job):
+        """ Run the shared body of the task (see AutomatorJobs) resolving its requests on this thread """
+
+        try:
+            request = next(job)
+            while True:
+                request = job.send(self.job_request(request))
+        except StopIteration as stop:
+            return stop.value
+
+    def job_request(self, request):
+        """ Reads from the Multicall2 batch of the conditions (direct call if it is not there),
+        reads that are not conditions together in one Multicall2 call """
+
+        if isinstance(request, list):
+            if len(request) > 1 and all(read.name is None for read in request):
+                _, results, _ = self.contracts_loaded["Multicall2"].aggregate_multiple(
+                    [(read.function.address, read.function, list(read.args), None) for read in request],
+                    require_success=True)
+                return results
+            return [self.job_request(read) for read in request]
+
+        if isinstance(request, Read):
+            return self.condition(request.name,
+                                  lambda: request.function(*request.args).call(),
+                                  min_block=request.min_block)
+
+        if isinstance(request, Send):
+            return self.send_task_transaction(*request.args, **request.kwargs)
+
+        if isinstance(request, BlockNumber):
+            return self.connection_helper.connection_manager.block_number
+
+        raise Exception("Not valid request of the job: {0}".format(request))
 
     @on_pending_transactions
-    def daily_inrate_payment(self, task=None, global_manager=None, task_result=None):
-
-        if self.contracts_loaded["MoC"].sc.functions.isDailyEnabled().call():
-
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
-
-            web3 = self.connection_helper.connection_manager.web3
-
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
+    def calculate_ema(self, task=None, global_manager=None, task_result=None):
 
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
+        return self.run_job(self.calculate_ema_job(task, global_manager, task_result))
 
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
+    @on_pending_transactions
+    def daily_inrate_payment(self, task=None, global_manager=None, task_result=None):
 
-            try:
-                tx_hash = self.contracts_loaded["MoC"].daily_inrate_payment(
-                    gas_limit=self.config['tasks']['daily_inrate_payment']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['daily_inrate_payment']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
+        return self.run_job(self.daily_inrate_payment_job(task, global_manager, task_result))
 
     @on_pending_transactions
     def run_settlement(self, task=None, global_manager=None, task_result=None):
 
-        partial_execution_steps = self.config['tasks']['run_settlement']['partial_execution_steps']
-
-        if self.contracts_loaded["MoC"].sc.functions.isSettlementEnabled().call():
-
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
-
-            web3 = self.connection_helper.connection_manager.web3
-
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
-
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
-
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
-
-            try:
-                tx_hash = self.contracts_loaded["MoC"].run_settlement(
-                    partial_execution_steps,
-                    gas_limit=self.config['tasks']['run_settlement']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['run_settlement']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
+        return self.run_job(self.run_settlement_job(task, global_manager, task_result))
 
     @on_pending_transactions
     def contract_liquidation(self, task=None, global_manager=None, task_result=None):
 
-        partial_execution_steps = self.config['tasks']['liquidation']['partial_execution_steps']
-
-        if self.contracts_loaded["MoCState"].sc.functions.isLiquidationReached().call():
-
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
-
-            web3 = self.connection_helper.connection_manager.web3
-
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
-
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
-
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
-
-            try:
-                tx_hash = self.contracts_loaded["MoC"].eval_liquidation(
-                    partial_execution_steps,
-                    gas_limit=self.config['tasks']['liquidation']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['liquidation']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
+        # seconds matter: reads and send are hedged to a second node if the first is slow
+        with self.connection_helper.connection_manager.hedging(
+                self.config['tasks']['liquidation'].get('hedge', False)):
+            return self.run_job(self.contract_liquidation_job(task, global_manager, task_result))
 
     @on_pending_transactions
     def pay_bitpro_holders(self, task=None, global_manager=None, task_result=None):
 
-        app_mode = self.config['app_mode']
-
-        if app_mode == 'MoC':
-            is_bitpro_interest_enabled = self.contracts_loaded["MoC"].sc.functions.isBitProInterestEnabled().call()
-        else:
-            is_bitpro_interest_enabled = self.contracts_loaded["MoC"].sc.functions.isRiskProInterestEnabled().call()
-
-        if is_bitpro_interest_enabled:
+        return self.run_job(self.pay_bitpro_holders_job(task, global_manager, task_result))
 
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
-
-            web3 = self.connection_helper.connection_manager.web3
+    @on_pending_transactions
+    def oracle_poke(self, task=None, global_manager=None, task_result=None):
 
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
+        return self.run_job(self.oracle_poke_job(task, global_manager, task_result))
 
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
+    @on_pending_transactions
+    def commission_splitter(self, index, task=None, global_manager=None, task_result=None):
 
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
+        return self.run_job(self.commission_splitter_job(index, task, global_manager, task_result))
 
-            try:
-                tx_hash = self.contracts_loaded["MoC"].pay_bitpro_holders_interest_payment(
-                    gas_limit=self.config['tasks']['pay_bitpro_holders']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['pay_bitpro_holders']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-                global_manager['pay_bitpro_holders_confirm_block'] = self.connection_helper.connection_manager.block_number + 2
-
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
 
-    @on_pending_transactions
-    def oracle_poke(self, task=None, global_manager=None, task_result=None):
+class AutomatorTasks(Automator):
 
-        price_validity = self.contracts_loaded["PriceProvider"].sc.functions.peek().call()[1]
-        if not self.contracts_loaded["PriceProvider"].sc.functions.compute().call()[1] and price_validity:
+    def __init__(self, config):
 
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
+        self.config = config
+        self.app_mode = self.config['app_mode']
+        self.connection_helper = ConnectionHelperBase(config)
 
-            web3 = self.connection_helper.connection_manager.web3
+        self.contracts_loaded = dict()
+        self.contracts_addresses = dict()
 
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
+        # contract addresses
+        self.load_contracts()
 
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
+        # local nonces of the accounts start in sync with the node
+        for account in self.connection_helper.connection_manager.accounts:
+            self.connection_helper.connection_manager.nonce_manager.sync(account.address)
 
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
+        # init automator
+        super().__init__(self.config,
+                         self.connection_helper,
+                         self.contracts_loaded)
 
-            try:
-                tx_hash = self.contracts_loaded["PriceProvider"].poke(
-                    gas_limit=self.config['tasks']['oracle_poke']['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
-
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = self.config['tasks']['oracle_poke']['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
-
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
-
-            log.error("Task :: {0} :: Not valid price! Disabling Price!".format(task.task_name))
-            aws_put_metric_heart_beat(self.config['tasks']['oracle_poke']['cloudwatch'], 1)
-
-        else:
-            # if no valid price in oracle please send alarm
-            if not price_validity:
-                log.error("Task :: {0} :: No valid price in oracle!".format(task.task_name))
-                aws_put_metric_heart_beat(self.config['tasks']['oracle_poke']['cloudwatch'], 1)
-
-            log.info("Task :: {0} :: No!".format(task.task_name))
-
-        return task_result
+        # adaptive partial execution steps, only runSettlement(steps) takes steps
+        self.steps_controllers = dict()
+        if 'run_settlement' in self.config['tasks']:
+            controller = StepsController.from_settings('2. Run Settlement', self.config['tasks']['run_settlement'])
+            if controller:
+                self.steps_controllers['run_settlement'] = controller
 
-    @on_pending_transactions
-    def commission_splitter(self, index, task=None, global_manager=None, task_result=None):
+        # Add tasks
+        self.schedule_tasks()
 
-        commission_setting = self.config['tasks']['commission_splitters'][index]
-        web3 = self.connection_helper.connection_manager.web3
+        # transactions sent before a restart
+        self.recover_pending_transactions()
 
-        # If AC Token or Coinbase collateral
-        if commission_setting["ac_token"]:
-            coin_balance = self.contracts_loaded[
-                "CommissionSplitter_Token_{0}".format(index)].sc.functions.balanceOf(commission_setting["address"]).call()
-        else:
-            coin_balance = web3.eth.get_balance(Web3.to_checksum_address(commission_setting['address']))
+    def discover_addresses(self):
+        """ Addresses of the protocol contracts from the main contract in 3 round trips:
+        connector, the 4 contracts of the connector in one Multicall2 batch and the price provider """
 
-        fee_token_balance = 0
-        if commission_setting["fee_token"]:
-            fee_token_balance = self.contracts_loaded[
-                "CommissionSplitter_FeeToken_{0}".format(index)].sc.functions.balanceOf(
-                commission_setting["address"]).call()
+        return self.run_job(self.discover_addresses_job())
 
-        if coin_balance > commission_setting["min_balance"] or \
-                fee_token_balance > commission_setting["min_balance_fee_token"]:
+    def verify_addresses_snapshot(self, addresses):
+        """ Background check of the addresses loaded from the snapshot """
 
-            # return if there are pending transactions
-            if task_result.get('pending_transactions', None):
-                return task_result
+        try:
+            discovered = self.discover_addresses()
+        except Exception as e:
+            log.error("Addresses Snapshot :: Error verifying the snapshot! {0}".format(e))
+            return
 
-            log.info(
-                "Task :: {0} :: Commission Splitter has balance!. Balances: -AC Token: {1}. -Fee Token: {2}.  ".format(
-                    task.task_name,
-                    Web3.from_wei(coin_balance, 'ether'),
-                    Web3.from_wei(fee_token_balance, 'ether')))
+        if {k: v.lower() for k, v in discovered.items()} == {k: v.lower() for k, v in addresses.items()}:
+            log.info("Addresses Snapshot :: Verified")
+            return
 
-            web3 = self.connection_helper.connection_manager.web3
+        log.error("Addresses Snapshot :: The addresses changed! Saving the new ones, restart to use them. "
+                  "Snapshot: {0} Node: {1}".format(addresses, discovered))
+        self.addresses_snapshot.save(self.config['chain_id'], self.config['addresses']['MoC'], discovered)
 
-            nonce = web3.eth.get_transaction_count(
-                self.connection_helper.connection_manager.accounts[0].address, "pending")
+    def load_addresses(self):
+        """ Addresses from the snapshot (verified in background) or discovered from the node """
 
-            # get gas price from node
-            node_gas_price = decimal.Decimal(Web3.from_wei(web3.eth.gas_price, 'ether'))
+        self.addresses_snapshot = AddressesSnapshot.from_config(self.config)
+        if self.addresses_snapshot:
+            addresses = self.addresses_snapshot.load(self.config['chain_id'], self.config['addresses']['MoC'])
+            if addresses:
+                log.info("Addresses Snapshot :: Loaded from {0}".format(self.addresses_snapshot.path))
+                threading.Thread(target=self.verify_addresses_snapshot, args=(addresses,),
+                                 name='AddressesSnapshot', daemon=True).start()
+                return addresses
 
-            # Multiply factor of the using gas price
-            calculated_gas_price = node_gas_price * decimal.Decimal(self.config['gas_price_multiply_factor'])
+        addresses = self.discover_addresses()
+        if self.addresses_snapshot:
+            self.addresses_snapshot.save(self.config['chain_id'], self.config['addresses']['MoC'], addresses)
 
-            try:
-                tx_hash = self.contracts_loaded["CommissionSplitter_{0}".format(index)].split(
-                    gas_limit=commission_setting['gas_limit'],
-                    gas_price=int(calculated_gas_price * 10 ** 18),
-                    nonce=nonce
-                )
-            except ValueError as err:
-                log.error("Task :: {0} :: Error sending transaction! \n {1}".format(task.task_name, err))
-                return task_result
+        return addresses
 
-            if tx_hash:
-                new_tx = dict()
-                new_tx['hash'] = tx_hash
-                new_tx['timestamp'] = datetime.datetime.now()
-                new_tx['gas_price'] = calculated_gas_price
-                new_tx['nonce'] = nonce
-                new_tx['timeout'] = commission_setting['wait_timeout']
-                task_result['pending_transactions'].append(new_tx)
+    def load_contracts(self):
+        """ Get contract address to use later """
 
-                log.info("Task :: {0} :: Sending TX :: Hash: [{1}] Nonce: [{2}] Gas Price: [{3}]".format(
-                    task.task_name, Web3.to_hex(new_tx['hash']), new_tx['nonce'], int(calculated_gas_price * 10 ** 18)))
+        log.info("Getting addresses from Main Contract...")
 
-        else:
-            log.info("Task :: {0} :: No!".format(task.task_name))
+        self.load_main_contracts()
 
-        return task_result
+        self.load_protocol_contracts(self.load_addresses())
 
+        # predicates of the tasks in one batch
+        self.load_conditions()
 
-class AutomatorTasks(Automator):
+    def load_conditions(self):
+        """ Add the predicates of the configured tasks to the Multicall2 batch """
 
-    def __init__(self, config):
+        if not self.config.get('multicall_conditions', True):
+            return
 
-        self.config = config
-        self.app_mode = self.config['app_mode']
-        self.connection_helper = ConnectionHelperBase(config)
+        self.conditions = TaskConditions(self.contracts_loaded["Multicall2"],
+                                         max_age=self.config.get('conditions_max_age', 1))
 
-        self.contracts_loaded = dict()
-        self.contracts_addresses = dict()
+        moc = self.contracts_loaded["MoC"]
+        moc_state = self.contracts_loaded["MoCState"]
+        price_provider = self.contracts_loaded["PriceProvider"]
 
-        # contract addresses
-        self.load_contracts()
+        if 'run_settlement' in self.config['tasks']:
+            self.conditions.add('isSettlementEnabled', moc.address(), moc.sc.functions.isSettlementEnabled)
+            if self.config['tasks']['run_settlement'].get('pipeline', dict()).get('depth', 1) > 1:
+                self.conditions.add('redeemQueueSize', moc.address(), moc.sc.functions.redeemQueueSize)
 
-        # init automator
-        super().__init__(self.config,
-                         self.connection_helper,
-                         self.contracts_loaded)
+        if 'liquidation' in self.config['tasks']:
+            self.conditions.add('isLiquidationReached', moc_state.address(), moc_state.sc.functions.isLiquidationReached)
 
-        # Add tasks
-        self.schedule_tasks()
+        if 'daily_inrate_payment' in self.config['tasks']:
+            self.conditions.add('isDailyEnabled', moc.address(), moc.sc.functions.isDailyEnabled)
 
-    def load_contracts(self):
-        """ Get contract address to use later """
+        if 'pay_bitpro_holders' in self.config['tasks']:
+            if self.config['app_mode'] == 'MoC':
+                self.conditions.add('isBitProInterestEnabled', moc.address(), moc.sc.functions.isBitProInterestEnabled)
+            else:
+                self.conditions.add('isRiskProInterestEnabled', moc.address(),
+                                    moc.sc.functions.isRiskProInterestEnabled)
 
-        log.info("Getting addresses from Main Contract...")
+        if 'calculate_bma' in self.config['tasks']:
+            self.conditions.add('shouldCalculateEma', moc_state.address(), moc_state.sc.functions.shouldCalculateEma)
 
-        if self.config['app_mode'] == 'MoC':
-            self.contracts_loaded["MoC"] = MoC(
-                self.connection_helper.connection_manager,
-                contract_address=self.config['addresses']['MoC'])
-            self.contracts_addresses['MoC'] = self.contracts_loaded["MoC"].address().lower()
-        else:
-            self.contracts_loaded["MoC"] = MoCRRC20(
-                self.connection_helper.connection_manager,
-                contract_address=self.config['addresses']['MoC'])
-            self.contracts_addresses['MoC'] = self.contracts_loaded["MoC"].address().lower()
-
-        self.contracts_addresses['MoCConnector'] = self.contracts_loaded["MoC"].sc.functions.connector().call()
-
-        if self.config['app_mode'] == 'MoC':
-            self.contracts_loaded["MoCConnector"] = MoCConnector(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCConnector'])
-            self.contracts_addresses['MoCConnector'] = self.contracts_loaded["MoCConnector"].address().lower()
-        else:
-            self.contracts_loaded["MoCConnector"] = MoCConnectorRRC20(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCConnector'])
-            self.contracts_addresses['MoCConnector'] = self.contracts_loaded["MoCConnector"].address().lower()
-
-        # get address fom moc connector
-        self.contracts_addresses['MoCState'] = self.contracts_loaded["MoCConnector"].sc.functions.mocState().call()
-        self.contracts_addresses['MoCSettlement'] = self.contracts_loaded[
-            "MoCConnector"].sc.functions.mocSettlement().call()
-        self.contracts_addresses['MoCExchange'] = self.contracts_loaded[
-            "MoCConnector"].sc.functions.mocExchange().call()
-        self.contracts_addresses['MoCInrate'] = self.contracts_loaded[
-            "MoCConnector"].sc.functions.mocInrate().call()
-
-        # Get oracle address from moc_state
-        if self.config['app_mode'] == 'MoC':
-            # MoC
-            self.contracts_loaded["MoCState"] = MoCState(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCState'])
-            self.contracts_loaded["MoCInrate"] = MoCInrate(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCInrate'])
-            self.contracts_addresses['PriceProvider'] = self.contracts_loaded[
-                "MoCState"].sc.functions.getBtcPriceProvider().call()
-            self.contracts_loaded["PriceProvider"] = MoCMedianizer(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['PriceProvider'])
-        else:
-            # RRC20
-            self.contracts_loaded["MoCState"] = MoCStateRRC20(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCState'])
-            self.contracts_loaded["MoCInrate"] = MoCInrateRRC20(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['MoCInrate'])
-            self.contracts_addresses['PriceProvider'] = self.contracts_loaded[
-                "MoCState"].sc.functions.getPriceProvider().call()
-            self.contracts_loaded["PriceProvider"] = MoCMedianizerRRC20(
-                self.connection_helper.connection_manager,
-                contract_address=self.contracts_addresses['PriceProvider'])
+        if 'oracle_poke' in self.config['tasks']:
+            self.conditions.add('peek', price_provider.address(), price_provider.sc.functions.peek)
+            self.conditions.add('compute', price_provider.address(), price_provider.sc.functions.compute)
 
-        # Commission splitters
         if 'commission_splitters' in self.config['tasks']:
+            multicall = self.contracts_loaded["Multicall2"]
             count = 0
             for setting_commission in self.config['tasks']['commission_splitters']:
-                self.contracts_loaded["CommissionSplitter_{0}".format(count)] = CommissionSplitter(
-                    self.connection_helper.connection_manager,
-                    contract_address=setting_commission['address'])
-                self.contracts_addresses["CommissionSplitter_{0}".format(count)] = self.contracts_loaded[
-                    "CommissionSplitter_{0}".format(count)].address().lower()
-
-                # Token Collateral only with rrc20 collateral support
-                # on coinbase this have to be empty
+                splitter_address = Web3.to_checksum_address(setting_commission['address'])
                 if setting_commission['ac_token']:
-                    self.contracts_loaded["CommissionSplitter_Token_{0}".format(count)] = ERC20Token(
-                        self.connection_helper.connection_manager,
-                        contract_address=setting_commission['ac_token'])
-                    self.contracts_addresses["CommissionSplitter_Token_{0}".format(count)] = self.contracts_loaded[
-                        "CommissionSplitter_Token_{0}".format(count)].address().lower()
-
-                # Fee Token
+                    token = self.contracts_loaded["CommissionSplitter_Token_{0}".format(count)]
+                    self.conditions.add("CommissionSplitter_Balance_{0}".format(count),
+                                        token.address(), token.sc.functions.balanceOf, [splitter_address])
+                else:
+                    self.conditions.add("CommissionSplitter_Balance_{0}".format(count),
+                                        multicall.address(), multicall.sc.functions.getEthBalance,
+                                        [splitter_address])
                 if setting_commission['fee_token']:
-                    self.contracts_loaded["CommissionSplitter_FeeToken_{0}".format(count)] = ERC20Token(
-                        self.connection_helper.connection_manager,
-                        contract_address=setting_commission['fee_token'])
-                    self.contracts_addresses["CommissionSplitter_FeeToken_{0}".format(count)] = \
-                    self.contracts_loaded[
-                        "CommissionSplitter_FeeToken_{0}".format(count)].address().lower()
-
+                    fee_token = self.contracts_loaded["CommissionSplitter_FeeToken_{0}".format(count)]
+                    self.conditions.add("CommissionSplitter_FeeTokenBalance_{0}".format(count),
+                                        fee_token.address(), fee_token.sc.functions.balanceOf, [splitter_address])
                 count += 1
 
-        # Multicall
-        self.contracts_loaded["Multicall2"] = Multicall2(
-            self.connection_helper.connection_manager,
-            contract_address=self.config['addresses']['Multicall2'])
-
     def schedule_tasks(self):
 
         log.info("Starting adding tasks...")
 
-        # set max workers
-        self.max_workers = 1
+        # set max workers, tasks run in parallel up to this size of the pool
+        self.max_workers = self.config.get('max_workers', 1)
+
+        # limit of running tasks by concurrency group
+        for group, limit in self.config.get('concurrency_groups', dict()).items():
+            self.set_group_limit(group, limit)
+
+        # tasks with on_block run once per new block instead of every interval
+        block_watcher_settings = self.config.get('block_watcher', dict())
+        if block_watcher_settings.get('enabled', False):
+            self.block_fallback_wait = block_watcher_settings.get('fallback_interval', 60)
+            self.block_watcher = BlockWatcher(self.connection_helper.connection_manager,
+                                              poll_interval=block_watcher_settings.get('poll_interval', 1),
+                                              websocket_uri=block_watcher_settings.get('websocket_uri'))
+            # the conditions batch is evaluated again for the new block before the tasks run
+            if self.conditions:
+                self.block_watcher.subscribe(self.conditions.on_new_block)
+            self.block_watcher.subscribe(self.on_new_block)
+            if self.confirmation_service:
+                self.block_watcher.subscribe(self.confirmation_service.on_new_block)
+            self.block_watcher.start()
+
+        if self.confirmation_service:
+            self.confirmation_service.start()
 
         # run_settlement
         if 'run_settlement' in self.config['tasks']:
             log.info("Jobs add: 2. Run Settlement")
             interval = self.config['tasks']['run_settlement']['interval']
+            group = self.config['tasks']['run_settlement'].get('concurrency_group')
+            on_block = self.config['tasks']['run_settlement'].get('on_block', False)
             self.add_task(self.run_settlement,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='2. Run Settlement')
+                          task_name='2. Run Settlement',
+                          group=group,
+                          on_block=on_block)
 
         # liquidation
         if 'liquidation' in self.config['tasks']:
             log.info("Jobs add: 1. Liquidation")
             interval = self.config['tasks']['liquidation']['interval']
+            group = self.config['tasks']['liquidation'].get('concurrency_group')
+            on_block = self.config['tasks']['liquidation'].get('on_block', False)
             self.add_task(self.contract_liquidation,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='1. Liquidation')
+                          task_name='1. Liquidation',
+                          group=group,
+                          on_block=on_block)
 
         # Daily inrate payment
         if 'daily_inrate_payment' in self.config['tasks']:
             log.info("Jobs add: 3. Daily Inrate Payment")
             interval = self.config['tasks']['daily_inrate_payment']['interval']
+            group = self.config['tasks']['daily_inrate_payment'].get('concurrency_group')
+            on_block = self.config['tasks']['daily_inrate_payment'].get('on_block', False)
             self.add_task(self.daily_inrate_payment,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='3. Daily Inrate Payment')
+                          task_name='3. Daily Inrate Payment',
+                          group=group,
+                          on_block=on_block)
 
         # pay bitpro holders
         if 'pay_bitpro_holders' in self.config['tasks']:
             log.info("Jobs add: 4. Pay Bitpro Holders")
             interval = self.config['tasks']['pay_bitpro_holders']['interval']
+            group = self.config['tasks']['pay_bitpro_holders'].get('concurrency_group')
+            on_block = self.config['tasks']['pay_bitpro_holders'].get('on_block', False)
             self.add_task(self.pay_bitpro_holders,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='4. Pay Bitpro Holders')
+                          task_name='4. Pay Bitpro Holders',
+                          group=group,
+                          on_block=on_block)
 
         # calculate EMA
         if 'calculate_bma' in self.config['tasks']:
             log.info("Jobs add: 5. Calculate EMA")
             interval = self.config['tasks']['calculate_bma']['interval']
+            group = self.config['tasks']['calculate_bma'].get('concurrency_group')
+            on_block = self.config['tasks']['calculate_bma'].get('on_block', False)
             self.add_task(self.calculate_ema,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='5. Calculate EMA')
+                          task_name='5. Calculate EMA',
+                          group=group,
+                          on_block=on_block)
 
         # Oracle Poke
         if 'oracle_poke' in self.config['tasks']:
             log.info("Jobs add: 6. Oracle Compute")
             interval = self.config['tasks']['oracle_poke']['interval']
+            group = self.config['tasks']['oracle_poke'].get('concurrency_group')
+            on_block = self.config['tasks']['oracle_poke'].get('on_block', False)
             self.add_task(self.oracle_poke,
                           args=[],
                           wait=interval,
                           timeout=180,
-                          task_name='6. Oracle Compute')
+                          task_name='6. Oracle Compute',
+                          group=group,
+                          on_block=on_block)
 
         # Commission splitters
         if 'commission_splitters' in self.config['tasks']:
@@ -617,12 +461,13 @@ class AutomatorTasks(Automator):
             for setting_commission in self.config['tasks']['commission_splitters']:
                 log.info("Jobs add: 7. Commission Splitter: {0}".format(setting_commission['address']))
                 interval = setting_commission['interval']
+                group = setting_commission.get('concurrency_group')
+                on_block = setting_commission.get('on_block', False)
                 self.add_task(self.commission_splitter,
                               args=[count],
                               wait=interval,
                               timeout=180,
-                              task_name="7. Commission Splitter: {0}".format(setting_commission['address']))
+                              task_name="7. Commission Splitter: {0}".format(setting_commission['address']),
+                              group=group,
+                              on_block=on_block)
                 count += 1
-
-        # Set max workers
-        self.max_tasks = len(self.tasks)
@@ -1,14 +1,24 @@
 from time import sleep
+import time
+import heapq
+import itertools
+import threading
 import signal
 import functools
 import uuid
+import collections
 from concurrent.futures import TimeoutError
 import datetime
 from multiprocessing import Manager
-from web3 import Web3, exceptions
+from web3 import Web3
 from functools import wraps
 from pebble import sighandler, ProcessExpired, ThreadPool
 
+from .base.tracker import PendingTransactionsTracker
+from .base.confirmations import ConfirmationService
+from .base.replacement import ReplacementEngine
+from .base.journal import TransactionJournal
+from .base.metrics import metrics
 from .logger import log
 from .utils import aws_put_metric_heart_beat
 
@@ -27,7 +37,8 @@ def signal_handler(signum, frame):
 
 
 class Task:
-    def __init__(self, func, args=None, kwargs=None, wait=1, timeout=180, task_name='Task N'):
+    def __init__(self, func, args=None, kwargs=None, wait=1, timeout=180, task_name='Task N', group=None,
+                 on_block=False):
         self.func = func
         if args:
             self.args = args
@@ -43,10 +54,33 @@ class Task:
         self.result = None
         self.shutdown = False
         self.last_run = datetime.datetime.now()
+        # monotonic deadline of the next run and delay from deadline to start of the last run
+        self.next_run = time.monotonic() + wait
+        self.last_delay = 0.0
         #self.tx_receipt = None
         #self.tx_receipt_timestamp = None
         self.pending_transactions = None
         self.task_name = task_name
+        # concurrency group, tasks of the same group share a limit of running tasks
+        self.group = group
+        # run once per new block, wait is only the fallback if no block arrives
+        self.on_block = on_block
+        self.last_block = None
+        # block of the last receipt of its transactions, the next decisions must see the state after it
+        self.last_receipt_block = None
+
+
+def run_timed_task(func, *args, **kwargs):
+    """ Run the task function recording its queue delay and duration """
+
+    task = kwargs['task']
+    start = time.monotonic()
+    # from the due time to the start in a worker of the pool
+    task.last_delay = start - task.next_run
+    try:
+        return func(*args, **kwargs)
+    finally:
+        metrics.observe_task(task.task_name, time.monotonic() - start, task.last_delay)
 
 
 class TransactionsTasksManager:
@@ -54,18 +88,110 @@ class TransactionsTasksManager:
     def __init__(self):
         self.tasks = dict()
         self.max_workers = 1
-        self.max_tasks = 1
+        # tasks per worker thread before pebble recycles it, 0 never recycle (recycling stalls the pool)
+        self.max_tasks = 0
         self.timeout = 180
+        # max seconds to sleep without checking the signals
+        self.max_idle_wait = 1.0
+
+        # priority queue of (next_run, sequence, tid) and the condition to wake up the loop
+        self.schedule_queue = list()
+        self.schedule_sequence = itertools.count()
+        self.schedule_condition = threading.Condition()
 
-    def add_task(self, func, args=None, kwargs=None, wait=1, timeout=180, tid=None, task_name='Task N'):
+        # max running tasks by concurrency group, tasks due while the group is full wait its turn.
+        # A task is only queued again when its run finish, so it never overlaps itself
+        self.group_limits = dict()
+        self.group_running = collections.Counter()
+        self.group_waiting = collections.defaultdict(collections.deque)
+
+        # last block head seen by the block watcher, tasks triggered by block wait at least
+        # block_fallback_wait seconds between runs if no new block arrives
+        self.current_block = None
+        self.block_fallback_wait = 60
+        self.block_watcher = None
+
+    def add_task(self, func, args=None, kwargs=None, wait=1, timeout=180, tid=None, task_name='Task N', group=None,
+                 on_block=False):
 
         if not tid:
             tid = uuid.uuid4()
 
-        task = Task(func, args=args, kwargs=kwargs, wait=wait, timeout=timeout, task_name=task_name)
+        task = Task(func, args=args, kwargs=kwargs, wait=wait, timeout=timeout, task_name=task_name, group=group,
+                    on_block=on_block)
         self.tasks[tid] = task
+        self.push_task(tid, task.next_run)
+
+    def on_new_block(self, block_number):
+        """ Block watcher subscriber: the tasks triggered by block run now, a task running
+        when the block arrives runs again as soon as it finish """
+
+        with self.schedule_condition:
+            self.current_block = block_number
+            now = time.monotonic()
+            for tid, task in self.tasks.items():
+                # waiting the fallback deadline, not running or already due
+                if task.on_block and not task.running and task.next_run > now:
+                    self.push_task(tid, now)
+
+    def set_group_limit(self, group, limit):
+        """ Max tasks of the group running at the same time """
+
+        self.group_limits[group] = limit
+
+    def acquire_group(self, task, tid):
+        """ Take a slot of the group of the task, if the group is full the task wait its turn """
+
+        if task.group is None or task.group not in self.group_limits:
+            return True
+
+        with self.schedule_condition:
+            if self.group_running[task.group] >= self.group_limits[task.group]:
+                self.group_waiting[task.group].append(tid)
+                return False
+            self.group_running[task.group] += 1
+
+        return True
 
-    def on_task_done(self, future, task=None):
+    def release_group(self, task):
+        """ Free the slot of the group and wake up the next waiting task of the group """
+
+        if task.group is None or task.group not in self.group_limits:
+            return
+
+        with self.schedule_condition:
+            self.group_running[task.group] -= 1
+            waiting = self.group_waiting[task.group]
+            if waiting:
+                self.push_task(waiting.popleft(), time.monotonic())
+
+    def push_task(self, tid, next_run):
+        """ Queue the task to run at next_run (monotonic) and wake up the loop """
+
+        with self.schedule_condition:
+            self.tasks[tid].next_run = next_run
+            heapq.heappush(self.schedule_queue, (next_run, next(self.schedule_sequence), tid))
+            self.schedule_condition.notify()
+
+    def pop_due_task(self):
+        """ Sleep until the earliest deadline or a new task is queued, return the tid due """
+
+        with self.schedule_condition:
+            while True:
+                now = time.monotonic()
+                if self.schedule_queue and self.schedule_queue[0][0] <= now:
+                    next_run, _, tid = heapq.heappop(self.schedule_queue)
+                    if next_run != self.tasks[tid].next_run:
+                        # stale entry, the task was queued again with other deadline
+                        continue
+                    return tid
+
+                wait_time = self.max_idle_wait
+                if self.schedule_queue:
+                    wait_time = min(wait_time, self.schedule_queue[0][0] - now)
+                self.schedule_condition.wait(wait_time)
+
+    def on_task_done(self, future, task=None, tid=None):
 
         try:
             task.result = future.result()  # blocks until results are ready
@@ -77,34 +203,50 @@ class TransactionsTasksManager:
                     task.pending_transactions = task.result['pending_transactions']
         except TimeoutError as e:
             log.info("Function took longer than %d seconds. Task going to cancel!" % e.args[1])
+            metrics.task_error(task.task_name)
             #aws_put_metric_heart_beat(1)
             future.cancel()
         except ProcessExpired as e:
             log.info("%s. Exit code: %d" % (e, e.exitcode))
+            metrics.task_error(task.task_name)
             #aws_put_metric_heart_beat(1)
             future.cancel()
         except Exception as e:
             log.info("Function raised %s" % e)
             log.info(e, exc_info=True)
+            metrics.task_error(task.task_name)
             #aws_put_metric_heart_beat(1)
             future.cancel()
 
         task.last_run = datetime.datetime.now()
         task.running = False
+        self.release_group(task)
+
+        # queue the next run, on shutdown request wake up the loop right now
+        with self.schedule_condition:
+            next_run = time.monotonic()
+            # a task triggered by block runs again right now if a new block arrived while running
+            new_block = task.on_block and task.last_block != self.current_block
+            if not task.shutdown and not new_block:
+                if task.on_block and self.current_block is not None:
+                    next_run += max(task.wait, self.block_fallback_wait)
+                else:
+                    next_run += task.wait
+            self.push_task(tid, next_run)
 
-    def schedule_task(self, pool, task, global_manager=None):
+    def schedule_task(self, pool, task, global_manager=None, tid=None):
 
         if not task.running:
             # shutdown task manager!
             if task.shutdown:
                 raise TerminateSignal
-            if task.last_run + datetime.timedelta(seconds=task.wait) <= datetime.datetime.now():
-                task.running = True
-                # pass task object as vars to run funtion
-                task.kwargs["task"] = task
-                task.kwargs["global_manager"] = global_manager
-                future = pool.schedule(task.func, args=task.args, kwargs=task.kwargs)
-                future.add_done_callback(functools.partial(self.on_task_done, task=task))
+            task.running = True
+            task.last_block = self.current_block
+            # pass task object as vars to run funtion
+            task.kwargs["task"] = task
+            task.kwargs["global_manager"] = global_manager
+            future = pool.schedule(run_timed_task, args=[task.func] + list(task.args), kwargs=task.kwargs)
+            future.add_done_callback(functools.partial(self.on_task_done, task=task, tid=tid))
 
     def start_loop(self):
 
@@ -114,9 +256,10 @@ class TransactionsTasksManager:
         with ThreadPool(max_workers=self.max_workers, max_tasks=self.max_tasks) as pool:
             try:
                 while True:
-                    if self.tasks:
-                        for key in self.tasks:
-                            self.schedule_task(pool, self.tasks[key], global_manager=global_manager)
+                    tid = self.pop_due_task()
+                    if not self.acquire_group(self.tasks[tid], tid):
+                        continue
+                    self.schedule_task(pool, self.tasks[tid], global_manager=global_manager, tid=tid)
             except TerminateSignal:
                 log.info("Terminal Signal received... Going to shutdown... stop pooling now!")
                 #pool.stop()
@@ -154,149 +297,337 @@ class PendingTransactionsTasksManager(TransactionsTasksManager):
         self.connection_helper = connection_helper
         self.contracts_loaded = contracts_loaded
 
+        self.transactions_tracker = PendingTransactionsTracker(connection_helper.connection_manager,
+                                                               self.pending_hashes)
+
+        # background service following the sent transactions, the tasks only read their status
+        self.confirmation_service = None
+        confirmations = config.get('confirmations', dict())
+        if confirmations.get('enabled', False):
+            self.confirmation_service = ConfirmationService(
+                connection_helper.connection_manager,
+                depth=confirmations.get('depth', 1),
+                poll_interval=confirmations.get('poll_interval', 1),
+                max_poll_interval=confirmations.get('max_poll_interval', 8),
+                drop_after=confirmations.get('drop_after', 2))
+            self.confirmation_service.subscribe(self.on_transaction_event)
+            self.confirmation_service.subscribe(metrics.on_confirmation_event)
+
+        # replace by fee of the stuck transactions
+        self.replacement_engine = ReplacementEngine.from_config(connection_helper.connection_manager, config)
+
+        # journal of the transactions sent, to recover the pending ones on restart
+        self.journal = TransactionJournal.from_config(config)
+
+    def journal_record(self, task, event, tx):
+
+        if not self.journal:
+            return
+
+        try:
+            self.journal.record(task.task_name, event, tx)
+        except Exception as e:
+            log.error("Task :: {0} :: Error writing the journal! {1}".format(task.task_name, e))
+
+    def journal_finished(self, task, pending_before, tx_lookups):
+        """ Final status of the transactions that left the pending queue """
+
+        if not self.journal:
+            return
+
+        status = dict()
+        for tx, tx_found, tx_rcp in tx_lookups:
+            if tx_rcp is not None:
+                status[id(tx)] = 'confirmed' if tx_rcp['status'] > 0 else 'reverted'
+            elif not tx_found:
+                status[id(tx)] = 'dropped'
+
+        for tx in pending_before:
+            if not any(tx is pending_tx for pending_tx in task.pending_transactions):
+                self.journal_record(task, status.get(id(tx), 'cleared'), tx)
+
+    def recover_pending_transactions(self):
+        """ Pending transactions of the tasks from the journal, after a restart """
+
+        if not self.journal:
+            return
+
+        connection_manager = self.connection_helper.connection_manager
+        pending = self.journal.pending()
+        for task in self.tasks.values():
+            if task.task_name in pending:
+                task.pending_transactions = pending[task.task_name]
+                log.info("Task :: {0} :: Recovered {1} pending transactions from the journal".format(
+                    task.task_name, len(task.pending_transactions)))
+
+                # signed again from the node copy if they have to be replaced
+                for tx in task.pending_transactions:
+                    try:
+                        connection_manager.recover_transaction(tx['hash'])
+                    except Exception as e:
+                        # mined or dropped meanwhile, the lookup of the task resolves it
+                        log.debug("Task :: {0} :: Not recovered from the node [{1}] {2}".format(
+                            task.task_name, Web3.to_hex(tx['hash']), e))
+
+    def pending_hashes(self):
+        """ Hashes of the pending transactions of all the tasks """
+
+        tx_hashes = list()
+        for task in list(self.tasks.values()):
+            for tx in task.pending_transactions or list():
+                tx_hashes.append(Web3.to_hex(tx['hash']))
+
+        return tx_hashes
+
+    def on_transaction_event(self, event, tracked):
+        """ A dropped transaction leave a gap in the nonces of the account """
+
+        if event == 'dropped':
+            self.connection_helper.connection_manager.nonce_manager.reset(tracked.address)
+
+    def submit_transaction(self, task, address, tx):
+        """ Sent transaction of the task, followed by the confirmation service """
+
+        if self.confirmation_service:
+            self.confirmation_service.submit(task.task_name, address, tx)
+
+    def on_transaction_receipt(self, task, tx, tx_rcp):
+        """ Receipt of a transaction of the task (confirmed or reverted), to override """
+        pass
+
+    def observe_receipts(self, task, tx_lookups):
+
+        for tx, tx_found, tx_rcp in tx_lookups:
+            if tx_rcp is not None:
+                task.last_receipt_block = max(task.last_receipt_block or 0, tx_rcp['blockNumber'])
+                self.on_transaction_receipt(task, tx, tx_rcp)
+
+    def replace_stuck_transactions(self, task, account_address, tx_lookups):
+        """ Bump the gas price of the transactions found but not mined """
+
+        if not self.replacement_engine:
+            return
+
+        for tx, tx_found, tx_rcp in tx_lookups:
+            if not tx_found or tx_rcp is not None:
+                continue
+            old_hash = self.replacement_engine.check(task.task_name, tx)
+            if old_hash is None:
+                continue
+            self.journal_record(task, 'replaced', tx)
+            metrics.transaction_event(task.task_name, 'replaced')
+            if self.confirmation_service:
+                self.confirmation_service.replace(old_hash, task.task_name, tx.get('account', account_address), tx)
+
+    def service_lookups(self, task, account_address):
+        """ Status of the pending transactions of the task from the confirmation service,
+        without asking the node """
+
+        service = self.confirmation_service
+
+        last_used_nonce = service.nonce(account_address)
+        if last_used_nonce is not None:
+            self.connection_helper.connection_manager.nonce_manager.check(account_address, last_used_nonce)
+
+        tx_lookups = list()
+        for tx in task.pending_transactions:
+            tracked = service.status(Web3.to_hex(tx['hash']))
+            if tracked is None:
+                # not followed yet (sent before the service started)
+                service.submit(task.task_name, tx.get('account', account_address), tx)
+                tx_lookups.append((tx, True, None))
+            elif tracked.status == 'dropped':
+                tx_lookups.append((tx, False, None))
+            elif tracked.status in ('confirmed', 'reverted'):
+                tx_lookups.append((tx, True, tracked.receipt))
+            else:
+                # pending or timeout (the timeout is checked again with the elapsed time)
+                tx_lookups.append((tx, True, None))
+
+        self.observe_receipts(task, tx_lookups)
+        self.replace_stuck_transactions(task, account_address, tx_lookups)
+
+        # the service confirm by depth, the nonce alone do not clear the pending list
+        pending_before = list(task.pending_transactions)
+        pending_txs, confirmed_txs = update_pending_transactions(task, None, tx_lookups)
+        self.journal_finished(task, pending_before, tx_lookups)
+
+        return pending_txs, confirmed_txs
+
     def pending_transactions(self, task, account_index=0):
         """ Iterate on pending list and change status if need it """
 
-        web3 = self.connection_helper.connection_manager.web3
+        connection_manager = self.connection_helper.connection_manager
+
+        if not task.pending_transactions:
+            # nothing to check, no need to ask the node
+            return update_pending_transactions(task, None, list())
 
-        # get index account, default first index 0
-        account_address = self.connection_helper.connection_manager.accounts[account_index].address
+        # account of the pending transactions (a task waits its transaction before sending another),
+        # default first index 0
+        account_address = task.pending_transactions[-1].get(
+            'account', connection_manager.accounts[account_index].address)
 
-        # get the last nonce
-        last_used_nonce = web3.eth.get_transaction_count(account_address)
-        confirmed_txs = list()
+        if self.confirmation_service:
+            return self.service_lookups(task, account_address)
 
-        if not task.pending_transactions:
-            task.pending_transactions = list()
-        else:
+        # last nonce and status of the transactions, one batch per block shared by all the tasks
+        tx_hashes = [Web3.to_hex(tx['hash']) for tx in task.pending_transactions]
+        last_used_nonce, tx_status = self.transactions_tracker.lookup(tx_hashes, account_address)
+        connection_manager.nonce_manager.check(account_address, last_used_nonce)
 
-            # semaphore to clear the queue of pending transactions
-            clear = False
+        tx_lookups = list()
+        for tx, (tx_found, tx_rcp) in zip(task.pending_transactions, tx_status):
+            if not tx_found:
+                if not tx.get('dropped'):
+                    # dropped transaction leave a gap in the nonces, reset once when it is first seen
+                    tx['dropped'] = True
+                    connection_manager.nonce_manager.reset(account_address)
+            else:
+                # found again (ex.: another node of the pool)
+                tx.pop('dropped', None)
+            tx_lookups.append((tx, tx_found, tx_rcp))
 
-            # iterate over the pending transaction and update status in the queue
-            for tx in task.pending_transactions:
+        self.observe_receipts(task, tx_lookups)
+        self.replace_stuck_transactions(task, account_address, tx_lookups)
 
-                try:
-                    web3.eth.get_transaction(tx['hash'])
-                except exceptions.TransactionNotFound:
+        pending_before = list(task.pending_transactions)
+        pending_txs, confirmed_txs = update_pending_transactions(task, last_used_nonce, tx_lookups)
+        self.journal_finished(task, pending_before, tx_lookups)
 
-                    # 4. STATUS: Dropped Tx
+        return pending_txs, confirmed_txs
 
-                    # Transaction not exist anymore or dropped, permit to send new tx
-                    elapsed = datetime.datetime.now() - tx['timestamp']
 
-                    action_label = 'Task :: {0} :: TX Dropped.'.format(task.task_name)
+def update_pending_transactions(task, last_used_nonce, tx_lookups):
+    """ Change status of the pending list of the task from the node lookups.
+    tx_lookups is a list of (tx, transaction found, transaction receipt or None) """
 
-                    log.info(
-                        "{0}"
-                        " Hash: [{1}] "                        
-                        " Gas Price: [{2}] "
-                        " Nonce: [{3}] "
-                        " Elapsed: [{4}]".format(
-                            action_label,
-                            Web3.to_hex(tx['hash']),
-                            Web3.from_wei(tx['gas_price'], 'gwei'),
-                            tx['nonce'],
-                            elapsed.seconds
-                        )
-                    )
+    confirmed_txs = list()
 
-                    continue
+    if not task.pending_transactions:
+        task.pending_transactions = list()
+    else:
 
-                try:
-                    tx_rcp = web3.eth.get_transaction_receipt(tx['hash'])
-                except exceptions.TransactionNotFound:
+        # semaphore to clear the queue of pending transactions
+        clear = False
 
-                    # 1. STATUS: Pending tx
+        # mined transactions leave the queue, the others of a pipeline keep pending
+        mined = list()
 
-                    # timeout and permit to send again transaction
-                    elapsed = datetime.datetime.now() - tx['timestamp']
-                    timeout_waiting = tx['timeout']
-                    timeout = datetime.timedelta(seconds=timeout_waiting)
+        # iterate over the pending transaction and update status in the queue
+        for tx, tx_found, tx_rcp in tx_lookups:
 
-                    if elapsed > timeout:
+            if not tx_found:
 
-                        label_timeout = 'Timeout TX!'
+                # 4. STATUS: Dropped Tx
 
-                        # timeout pending transactions
-                        log.error("Task :: {0} :: {1} [{2}]".format(
-                            task.task_name, label_timeout, Web3.from_wei(tx['hash'], 'gwei')))
+                # Transaction not exist anymore or dropped, permit to send new tx
+                elapsed = datetime.datetime.now() - tx['timestamp']
 
-                        clear = True
+                log.info(
+                    "Task :: {0} :: TX Dropped."
+                    " Hash: [{1}] "                        
+                    " Gas Price: [{2}] "
+                    " Nonce: [{3}] "
+                    " Elapsed: [{4}]",
+                    task.task_name,
+                    tx['hash'],
+                    tx['gas_price'],
+                    tx['nonce'],
+                    elapsed.seconds
+                )
 
-                    else:
+                continue
 
-                        action_label = 'Task :: {0} :: TX Pending.'.format(task.task_name)
+            if tx_rcp is None:
 
-                        log.info(
-                            "{0}"
-                            " Hash: [{1}] "                            
-                            " Gas Price: [{2}] "
-                            " Nonce: [{3}] "
-                            " Elapsed: [{4}]".format(
-                                action_label,
-                                Web3.to_hex(tx['hash']),
-                                Web3.to_wei(tx['gas_price'], 'ether'),
-                                tx['nonce'],
-                                elapsed.seconds
-                            )
-                        )
+                # 1. STATUS: Pending tx
 
-                    continue
+                # timeout and permit to send again transaction
+                elapsed = datetime.datetime.now() - tx['timestamp']
+                timeout_waiting = tx['timeout']
+                timeout = datetime.timedelta(seconds=timeout_waiting)
 
-                # 2. STATUS: Confirmed status
-                if tx_rcp['status'] > 0:
+                if elapsed > timeout:
 
-                    elapsed = datetime.datetime.now() - tx['timestamp']
+                    label_timeout = 'Timeout TX!'
 
-                    action_label = 'Task :: {0} :: TX Confirmed.'.format(task.task_name)
+                    # timeout pending transactions
+                    log.error("Task :: {0} :: {1} [{2}]", task.task_name, label_timeout, tx['hash'])
+
+                    clear = True
+
+                else:
 
                     log.info(
-                        "{0}"
-                        " Hash: [{1}] "                        
+                        "Task :: {0} :: TX Pending."
+                        " Hash: [{1}] "                            
                         " Gas Price: [{2}] "
                         " Nonce: [{3}] "
-                        " Elapsed: [{4}]".format(
-                            action_label,
-                            Web3.to_hex(tx['hash']),
-                            Web3.to_wei(tx['gas_price'], 'ether'),
-                            tx['nonce'],
-                            elapsed.seconds
-                        )
+                        " Elapsed: [{4}]",
+                        task.task_name,
+                        tx['hash'],
+                        tx['gas_price'],
+                        tx['nonce'],
+                        elapsed.seconds
                     )
 
-                    confirmed_txs.append((tx['hash'], tx_rcp['blockNumber']))
+                continue
 
-                    clear = True
+            # 2. STATUS: Confirmed status
+            if tx_rcp['status'] > 0:
 
-                # 3. STATUS: Reverted status
-                else:
+                elapsed = datetime.datetime.now() - tx['timestamp']
 
-                    elapsed = datetime.datetime.now() - tx['timestamp']
-                    label_timeout = 'Reverted TX!'
+                log.info(
+                    "Task :: {0} :: TX Confirmed."
+                    " Hash: [{1}] "                        
+                    " Gas Price: [{2}] "
+                    " Nonce: [{3}] "
+                    " Elapsed: [{4}]",
+                    task.task_name,
+                    tx['hash'],
+                    tx['gas_price'],
+                    tx['nonce'],
+                    elapsed.seconds
+                )
 
-                    log.error("Task :: {0} :: {1} [{2}] Elapsed: [{3}]".format(
-                        task.task_name, label_timeout, Web3.to_hex(tx['hash']), elapsed.seconds))
+                confirmed_txs.append((tx['hash'], tx_rcp['blockNumber']))
 
-                    clear = True
+                mined.append(tx)
 
-            # end for
+            # 3. STATUS: Reverted status
+            else:
 
-            # Clear if change nonce
-            last_pending_nonce = task.pending_transactions[-1]['nonce']
-            if not clear and last_used_nonce > last_pending_nonce:
-                # if last transaction pending nonce are ready in the blockchain account nonce
-                # clear the pending tx
-                clear = True
-                log.warn("Task :: {0} :: Pending nonce is not sync with blockchain address. "
-                         "Clearing now!. Pending Nonce: [{1}] Nonce: [{2}]".format(task.task_name,
-                                                                                   last_pending_nonce,
-                                                                                   last_used_nonce))
+                elapsed = datetime.datetime.now() - tx['timestamp']
+                label_timeout = 'Reverted TX!'
 
-            if clear:
-                task.pending_transactions = []
+                log.error("Task :: {0} :: {1} [{2}] Elapsed: [{3}]",
+                          task.task_name, label_timeout, tx['hash'], elapsed.seconds)
+
+                mined.append(tx)
+
+        # end for
+
+        remaining = [tx for tx in task.pending_transactions if not any(tx is m for m in mined)]
+
+        # Clear if change nonce
+        if not clear and remaining and last_used_nonce is not None \
+                and last_used_nonce > remaining[-1]['nonce']:
+            # if last transaction pending nonce are ready in the blockchain account nonce
+            # clear the pending tx
+            clear = True
+            log.warn("Task :: {0} :: Pending nonce is not sync with blockchain address. "
+                     "Clearing now!. Pending Nonce: [{1}] Nonce: [{2}]".format(task.task_name,
+                                                                               remaining[-1]['nonce'],
+                                                                               last_used_nonce))
+
+        if clear:
+            task.pending_transactions = []
+        else:
+            task.pending_transactions = remaining
 
-        return task.pending_transactions, confirmed_txs
+    return task.pending_transactions, confirmed_txs
 
 
 def test_task_1(task_id):
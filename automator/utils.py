@@ -1,29 +1,180 @@
-import boto3
+import atexit
+import logging
 import os
+import queue
+import threading
+import time
+
+import boto3
+
+
+class MetricsPublisher(object):
+    """ CloudWatch metrics published in background.
+
+    put() never blocks the task: the datum goes to a bounded queue (dropped if full). A thread
+    with one client aggregates the data of the same metric in statistic sets and flush them
+    every flush_interval seconds, up to max_batch metrics per put_metric_data call.
+    endpoint_url points the client to a local stub.
+    """
+
+    log = logging.getLogger()
+
+    # metrics per put_metric_data call
+    max_batch = 1000
+
+    def __init__(self, flush_interval=10, max_queue=10000, endpoint_url=None, region_name=None):
+
+        self.flush_interval = flush_interval
+        self.endpoint_url = endpoint_url or None
+        self.region_name = region_name
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.client = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        # counters
+        self.dropped = 0
+        self.published = 0
+        self.requests = 0
+        self.errors = 0
+
+    def enabled(self):
+
+        return bool(self.endpoint_url) or 'AWS_ACCESS_KEY_ID' in os.environ
+
+    def put(self, namespace, metric_name, dimensions, value, unit='None'):
+        """ Queue the datum, dimensions is a list of (name, value) """
+
+        if not self.enabled():
+            return
+
+        try:
+            self.queue.put_nowait((namespace, metric_name, tuple(dimensions), unit, value))
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        self.start()
+
+    def start(self):
+
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='MetricsPublisher', daemon=True)
+            self.thread.start()
+
+        atexit.register(self.stop)
+
+    def stop(self):
+
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 5)
+
+    def get_client(self):
+
+        if self.client is None:
+            self.client = boto3.client('cloudwatch',
+                                       endpoint_url=self.endpoint_url,
+                                       region_name=self.region_name)
+        return self.client
+
+    @staticmethod
+    def aggregate(statistics, datum):
+
+        namespace, metric_name, dimensions, unit, value = datum
+        key = (namespace, metric_name, dimensions, unit)
+        if key not in statistics:
+            statistics[key] = dict(SampleCount=0, Sum=0.0, Minimum=value, Maximum=value)
+        statistic = statistics[key]
+        statistic['SampleCount'] += 1
+        statistic['Sum'] += value
+        statistic['Minimum'] = min(statistic['Minimum'], value)
+        statistic['Maximum'] = max(statistic['Maximum'], value)
+
+    def flush(self, statistics):
+        """ put_metric_data of the statistic sets, by namespace in batches of max_batch """
+
+        by_namespace = dict()
+        for (namespace, metric_name, dimensions, unit), statistic in statistics.items():
+            by_namespace.setdefault(namespace, list()).append({
+                'MetricName': metric_name,
+                'Dimensions': [{'Name': name, 'Value': value} for name, value in dimensions],
+                'StatisticValues': statistic,
+                'Unit': unit
+            })
+
+        for namespace, metric_data in by_namespace.items():
+            for start in range(0, len(metric_data), self.max_batch):
+                batch = metric_data[start:start + self.max_batch]
+                try:
+                    self.get_client().put_metric_data(Namespace=namespace, MetricData=batch)
+                except Exception as e:
+                    self.errors += 1
+                    self.log.error("Metrics :: Error publishing {0} metrics to {1}! {2}".format(
+                        len(batch), namespace, e))
+                    continue
+                self.requests += 1
+                self.published += len(batch)
+
+    def run(self):
+
+        statistics = dict()
+        flush_at = time.monotonic() + self.flush_interval
+        while True:
+            stopping = self.stop_event.is_set()
+            if stopping:
+                # drain what is left before exit
+                while not self.queue.empty():
+                    self.aggregate(statistics, self.queue.get_nowait())
+
+            if stopping or time.monotonic() >= flush_at:
+                if statistics:
+                    self.flush(statistics)
+                    statistics = dict()
+                flush_at = time.monotonic() + self.flush_interval
+                if stopping:
+                    return
+
+            try:
+                datum = self.queue.get(timeout=max(0.0, min(flush_at - time.monotonic(), 1.0)))
+            except queue.Empty:
+                continue
+            self.aggregate(statistics, datum)
+
+    def stats(self):
+
+        return dict(queued=self.queue.qsize(),
+                    dropped=self.dropped,
+                    published=self.published,
+                    requests=self.requests,
+                    errors=self.errors)
+
+
+# one publisher for the process, configured from the cloudwatch settings of config.json
+metrics_publisher = MetricsPublisher()
+
+
+def configure_metrics_publisher(settings):
+    """ Replace the publisher with the settings (flush_interval, max_queue, endpoint_url) """
+
+    global metrics_publisher
+
+    metrics_publisher = MetricsPublisher(flush_interval=settings.get('flush_interval', 10),
+                                         max_queue=settings.get('max_queue', 10000),
+                                         endpoint_url=settings.get('endpoint_url'),
+                                         region_name=settings.get('region_name') or None)
+
+    return metrics_publisher
 
 
 def aws_put_metric_heart_beat(alarm_settings, value):
+    """ Queue the metric, never waits on AWS """
 
-    if 'AWS_ACCESS_KEY_ID' not in os.environ:
-        return
-
-    # Create CloudWatch client
-    cloudwatch = boto3.client('cloudwatch')
-
-    # Put custom metrics
-    cloudwatch.put_metric_data(
-        MetricData=[
-            {
-                'MetricName': alarm_settings['metric_name'],
-                'Dimensions': [
-                    {
-                        'Name': alarm_settings['dimensions_name'],
-                        'Value': alarm_settings['dimensions_value']
-                    },
-                ],
-                'Unit': 'None',
-                'Value': value
-            },
-        ],
-        Namespace=alarm_settings['namespace']
-    )
+    metrics_publisher.put(alarm_settings['namespace'],
+                          alarm_settings['metric_name'],
+                          [(alarm_settings['dimensions_name'], alarm_settings['dimensions_value'])],
+                          value)
@@ -0,0 +1,929 @@
+"""
+In-process mock of a RSK node for tests and benchmarks.
+
+A JSON-RPC server (single and batch requests) with the contracts of the protocol emulated
+from their abis: MoC, MoCConnector, MoCState, MoCInrate, Medianizer, CommissionSplitter,
+ERC20 and Multicall2, deployed at the addresses of the config. The automator runs against it
+unchanged, offline.
+
+ * State is scriptable per block: node.set('MoC', 'isSettlementEnabled', True, block=120)
+   or node.at_block(120, callback). Reads with a block identifier see the state of that block.
+ * Transactions are decoded, kept in a mempool and mined every block_time seconds (or with
+   node.mine()). The protocol transactions have their effect (runSettlement consumes steps of
+   the settlement and disables it at the end, evalLiquidation, poke, split...) and gas used.
+ * Latency, errors (HTTP 503), congestion (max_txs_per_block, min_gas_price) and dropped
+   transactions are configurable.
+ * node.stats() counts requests, calls by method and bytes in and out.
+
+Usage:
+
+    python -m benchmarks.mock_node --port 4444 --block-time 5 --write-config mock_config.json
+    APP_CONFIG="$(cat mock_config.json)" ACCOUNT_PK_SECRET=<printed key> python app_run_automator.py
+
+or in process:
+
+    node = MockNode.from_config(config, block_time=1)
+    uri = node.start()
+    config = node.automator_config(config)
+"""
+
+import argparse
+import bisect
+import collections
+import json
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import rlp
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from eth_utils.abi import function_abi_to_4byte_selector, get_abi_input_types, get_abi_output_types
+from hexbytes import HexBytes
+from web3 import Web3
+
+from automator.contracts import Multicall2, MoC, MoCConnector, MoCState, MoCInrate, MoCMedianizer, \
+    CommissionSplitter, ERC20Token, MoCRRC20, MoCConnectorRRC20, MoCStateRRC20, MoCInrateRRC20, \
+    MoCMedianizerRRC20
+
+
+# key of the account sending the transactions of the automator against the mock (not a real key)
+DEV_PRIVATE_KEY = '0x' + 'c0' * 31 + '01'
+
+ZERO_ADDRESS = '0x' + '00' * 20
+ZERO_HASH = '0x' + '00' * 32
+
+# RSK error of a reverted call
+VM_EXECUTION_ERROR = -32015
+
+
+def block_hash(number):
+
+    return Web3.to_hex(Web3.keccak(text='block {0}'.format(number)))
+
+
+def mock_address(index):
+
+    return Web3.to_checksum_address('0x{0:040x}'.format(0xc0de0000 + index))
+
+
+def default_value(abi_type):
+    """ Zero value of the abi type """
+
+    if abi_type.endswith(']'):
+        return []
+    if abi_type.startswith('('):
+        return tuple(default_value(t) for t in split_tuple(abi_type))
+    if abi_type == 'address':
+        return ZERO_ADDRESS
+    if abi_type == 'bool':
+        return False
+    if abi_type == 'string':
+        return ''
+    if abi_type == 'bytes':
+        return b''
+    if abi_type.startswith('bytes'):
+        return b'\x00' * int(abi_type[5:])
+    return 0
+
+
+def split_tuple(abi_type):
+    """ Types of a tuple type, ex.: (bool,bytes) """
+
+    types = list()
+    depth = 0
+    current = ''
+    for char in abi_type[1:-1]:
+        if char == ',' and depth == 0:
+            types.append(current)
+            current = ''
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        current += char
+    if current:
+        types.append(current)
+
+    return types
+
+
+class Revert(Exception):
+    """ The call or the transaction reverts with reason """
+
+
+class MockContract(object):
+    """ Contract emulated from its abi. Every function returns the value set for it at the block
+    (default zero values), a callable value is called with (node, args, block). Transactions call
+    the effect of the function: effect(node, contract, args, block, dry_run) -> gas used """
+
+    def __init__(self, name, address, abi):
+
+        self.name = name
+        self.address = Web3.to_checksum_address(address)
+        self.functions = dict()
+        for function in abi:
+            if function.get('type') != 'function':
+                continue
+            selector = bytes(function_abi_to_4byte_selector(function))
+            self.functions[selector] = (function['name'],
+                                        get_abi_input_types(function),
+                                        get_abi_output_types(function))
+        # name -> sorted list of (block, value)
+        self.history = dict()
+        self.effects = dict()
+        # name -> revert reason
+        self.reverts = dict()
+        self.base_gas = 50000
+
+    def set(self, name, value, block=0):
+
+        history = self.history.setdefault(name, list())
+        index = bisect.bisect_right([entry[0] for entry in history], block)
+        # a new value at the same block replaces the old one
+        if index and history[index - 1][0] == block:
+            history[index - 1] = (block, value)
+        else:
+            history.insert(index, (block, value))
+
+    def get(self, name, block, default=None):
+
+        history = self.history.get(name)
+        if not history:
+            return default
+        index = bisect.bisect_right([entry[0] for entry in history], block)
+        if not index:
+            return default
+        return history[index - 1][1]
+
+    def decode_input(self, data):
+
+        data = HexBytes(data)
+        if data[:4] not in self.functions:
+            raise Revert('Function not found')
+        name, input_types, output_types = self.functions[data[:4]]
+        args = abi_decode(input_types, bytes(data[4:])) if input_types else tuple()
+
+        return name, args, output_types
+
+    def call(self, node, data, block):
+
+        name, args, output_types = self.decode_input(data)
+        if name in self.reverts:
+            raise Revert(self.reverts[name])
+
+        value = self.get(name, block)
+        if callable(value):
+            value = value(node, args, block)
+        if value is None:
+            value = tuple(default_value(t) for t in output_types)
+            if len(output_types) == 1:
+                value = value[0]
+        if len(output_types) == 1:
+            value = (value, )
+
+        return abi_encode(output_types, value)
+
+    def execute(self, node, data, block, dry_run=False):
+        """ Gas used by the transaction, Revert if it fails """
+
+        name, args, _ = self.decode_input(data)
+        if name in self.reverts:
+            raise Revert(self.reverts[name])
+
+        effect = self.effects.get(name)
+        if effect is None:
+            return self.base_gas
+
+        return effect(node, self, args, block, dry_run)
+
+
+class MockMulticall2(MockContract):
+    """ Multicall2 run by the node: the calls of the batch are eth_call to the other contracts """
+
+    def call(self, node, data, block):
+
+        name, args, output_types = self.decode_input(data)
+
+        def run(calls, require_success):
+            results = list()
+            for target, call_data in calls:
+                try:
+                    results.append((True, node.call_contract(target, call_data, block)))
+                except Revert:
+                    if require_success:
+                        raise Revert('Multicall2 aggregate: call failed')
+                    results.append((False, b''))
+            return results
+
+        if name == 'aggregate':
+            value = (block, [result for _, result in run(args[0], True)])
+        elif name == 'tryAggregate':
+            value = (run(args[1], args[0]), )
+        elif name == 'tryBlockAndAggregate':
+            value = (block, HexBytes(block_hash(block)), run(args[1], args[0]))
+        elif name == 'blockAndAggregate':
+            value = (block, HexBytes(block_hash(block)), run(args[0], True))
+        elif name == 'getEthBalance':
+            value = (node.get_balance(args[0], block), )
+        elif name == 'getBlockNumber':
+            value = (block, )
+        elif name in ('getBlockHash', 'getLastBlockHash'):
+            value = (HexBytes(block_hash(args[0] if args else block - 1)), )
+        elif name == 'getCurrentBlockTimestamp':
+            value = (node.blocks[block]['timestamp'], )
+        else:
+            return super().call(node, data, block)
+
+        return abi_encode(output_types, value)
+
+
+def steps_effect(work, flag_contract, flag, gas_per_step, require_flag=False):
+    """ Partial execution (runSettlement(steps)): every step consumes one unit of
+    node.work[work], the flag is disabled when there is nothing left. With require_flag
+    the transaction reverts if the flag is disabled """
+
+    def effect(node, contract, args, block, dry_run):
+
+        if require_flag and not node.contracts[flag_contract].get(flag, block):
+            raise Revert('{0} not enabled'.format(work))
+        remaining = node.work.get(work, 0)
+        if args:
+            steps = min(args[0], remaining)
+            gas_used = contract.base_gas + gas_per_step() * steps
+        else:
+            # no steps in the abi (evalLiquidation()), all the work in one transaction
+            steps = remaining
+            gas_used = contract.base_gas + gas_per_step()
+        if not dry_run:
+            node.work[work] = remaining - steps
+            if node.work[work] <= 0:
+                node.contracts[flag_contract].set(flag, False, block)
+        return gas_used
+
+    return effect
+
+
+def flag_effect(flag_contract, flag, value=False, gas=100000):
+    """ The transaction sets the flag (ex.: dailyInratePayment disables isDailyEnabled) """
+
+    def effect(node, contract, args, block, dry_run):
+
+        if not dry_run:
+            node.contracts[flag_contract].set(flag, value, block)
+        return gas
+
+    return effect
+
+
+def split_effect(fee_token=None, ac_token=None, gas=150000):
+    """ The splitter sends all its balance """
+
+    def effect(node, contract, args, block, dry_run):
+
+        if not dry_run:
+            node.set_balance(contract.address, 0)
+            for token in (fee_token, ac_token):
+                if token:
+                    node.contracts[token].set_token_balance(contract.address, 0, block)
+        return gas
+
+    return effect
+
+
+class MockToken(MockContract):
+    """ ERC20 with balances by account """
+
+    def set_token_balance(self, account, amount, block=0):
+
+        balances = dict(self.get('balances', block, default=dict()))
+        balances[Web3.to_checksum_address(account)] = amount
+        self.set('balances', balances, block)
+
+    def call(self, node, data, block):
+
+        name, args, output_types = self.decode_input(data)
+        if name == 'balanceOf':
+            balances = self.get('balances', block, default=dict())
+            return abi_encode(output_types, (balances.get(Web3.to_checksum_address(args[0]), 0), ))
+
+        return super().call(node, data, block)
+
+
+class MockNode(object):
+    """ Chain state, mempool, mining and the JSON-RPC server """
+
+    def __init__(self, chain_id=31, block_time=0.0, gas_price=60000000, start_block=100):
+
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.gas_price = gas_price
+        self.block_number = start_block
+        self.blocks = {start_block: dict(timestamp=int(time.time()), transactions=list(), gas_used=0)}
+        self.block_gas_limit = 6800000
+
+        self.contracts = dict()
+        self.by_address = dict()
+        self.work = dict()
+        self.balances = dict()
+        self.nonces = collections.Counter()
+
+        self.mempool = list()
+        self.transactions = dict()
+        self.receipts = dict()
+        self.scheduled = collections.defaultdict(list)
+
+        # faults
+        self.latency = 0.0
+        self.method_latency = dict()
+        self.error_rate = 0.0
+        self.fail_next_requests = 0
+        self.max_txs_per_block = None
+        self.min_gas_price = 0
+        self.drop_next_transactions = 0
+        self.gas_per_step = 60000
+
+        self.lock = threading.RLock()
+        self.mined = threading.Condition(self.lock)
+        self.counters = collections.Counter()
+        self.method_counters = collections.Counter()
+
+        self.server = None
+        self.miner = None
+        self.stop_event = threading.Event()
+
+    # --- contracts
+
+    def deploy(self, contract):
+
+        self.contracts[contract.name] = contract
+        self.by_address[contract.address.lower()] = contract
+        return contract
+
+    def set(self, contract_name, function_name, value, block=None):
+        """ Value returned by the function from block (default the current one) """
+
+        with self.lock:
+            self.contracts[contract_name].set(function_name, value, self.block_number if block is None else block)
+
+    def at_block(self, block, callback):
+        """ callback(node) when the block is mined """
+
+        with self.lock:
+            self.scheduled[block].append(callback)
+
+    def enable_settlement(self, steps=100, block=None):
+
+        with self.lock:
+            self.work['settlement'] = steps
+            self.set('MoC', 'isSettlementEnabled', True, block)
+
+    def reach_liquidation(self, steps=100, block=None):
+
+        with self.lock:
+            self.work['liquidation'] = steps
+            self.set('MoCState', 'isLiquidationReached', True, block)
+
+    def set_balance(self, address, amount):
+
+        with self.lock:
+            self.balances[Web3.to_checksum_address(address)] = amount
+
+    def get_balance(self, address, block=None):
+
+        return self.balances.get(Web3.to_checksum_address(address), 0)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """ Protocol deployed at the addresses of the config, every task condition false """
+
+        node = cls(chain_id=config.get('chain_id', 31), **kwargs)
+
+        if config.get('app_mode', 'MoC') == 'MoC':
+            classes = (MoC, MoCConnector, MoCState, MoCInrate, MoCMedianizer)
+            interest, ema = 'payBitProHoldersInterestPayment', 'calculateBitcoinMovingAverage'
+            interest_flag, price_provider = 'isBitProInterestEnabled', 'getBtcPriceProvider'
+        else:
+            classes = (MoCRRC20, MoCConnectorRRC20, MoCStateRRC20, MoCInrateRRC20, MoCMedianizerRRC20)
+            interest, ema = 'payRiskProHoldersInterestPayment', 'calculateReserveTokenMovingAverage'
+            interest_flag, price_provider = 'isRiskProInterestEnabled', 'getPriceProvider'
+        moc_class, connector_class, state_class, inrate_class, medianizer_class = classes
+
+        multicall = node.deploy(MockMulticall2('Multicall2', config['addresses']['Multicall2'],
+                                               Multicall2.contract_abi))
+        moc = node.deploy(MockContract('MoC', config['addresses']['MoC'], moc_class.contract_abi))
+        connector = node.deploy(MockContract('MoCConnector', mock_address(1), connector_class.contract_abi))
+        state = node.deploy(MockContract('MoCState', mock_address(2), state_class.contract_abi))
+        inrate = node.deploy(MockContract('MoCInrate', mock_address(3), inrate_class.contract_abi))
+        medianizer = node.deploy(MockContract('PriceProvider', mock_address(4), medianizer_class.contract_abi))
+
+        moc.set('connector', connector.address)
+        connector.set('mocState', state.address)
+        connector.set('mocSettlement', mock_address(5))
+        connector.set('mocExchange', mock_address(6))
+        connector.set('mocInrate', inrate.address)
+        state.set(price_provider, medianizer.address)
+        price = (20000 * 10 ** 18).to_bytes(32, 'big')
+        medianizer.set('peek', (price, True))
+        medianizer.set('compute', (price, True))
+
+        gas_per_step = lambda: node.gas_per_step
+        # the steps left of the settlement are seen as its redeem queue
+        moc.set('redeemQueueSize', lambda node, args, block: node.work.get('settlement', 0))
+        moc.effects['runSettlement'] = steps_effect('settlement', 'MoC', 'isSettlementEnabled', gas_per_step,
+                                                    require_flag=True)
+        moc.effects['evalLiquidation'] = steps_effect('liquidation', 'MoCState', 'isLiquidationReached',
+                                                      gas_per_step)
+        moc.effects['dailyInratePayment'] = flag_effect('MoC', 'isDailyEnabled')
+        moc.effects[interest] = flag_effect('MoC', interest_flag)
+        state.effects[ema] = flag_effect('MoCState', 'shouldCalculateEma')
+        medianizer.effects['poke'] = flag_effect('PriceProvider', 'peek', (price, True))
+
+        for index, setting in enumerate(config.get('tasks', dict()).get('commission_splitters', list())):
+            for key in ('fee_token', 'ac_token'):
+                if setting[key] and setting[key].lower() not in node.by_address:
+                    node.deploy(MockToken('Token_{0}'.format(setting[key].lower()), setting[key],
+                                          ERC20Token.contract_abi))
+            splitter = node.deploy(MockContract('CommissionSplitter_{0}'.format(index), setting['address'],
+                                                CommissionSplitter.contract_abi))
+            splitter.effects['split'] = split_effect(
+                fee_token='Token_{0}'.format(setting['fee_token'].lower()) if setting['fee_token'] else None,
+                ac_token='Token_{0}'.format(setting['ac_token'].lower()) if setting['ac_token'] else None)
+
+        node.set_balance(Account.from_key(DEV_PRIVATE_KEY).address, 10 ** 20)
+
+        return node
+
+    def automator_config(self, config, uri=None):
+        """ The config pointing to this node, without side effects on disk or on the network """
+
+        config = json.loads(json.dumps(config))
+        config['uri'] = uri or self.uri
+        config['chain_id'] = self.chain_id
+        for key in ('journal', 'addresses_snapshot', 'prometheus'):
+            if key in config:
+                config[key]['enabled'] = False
+        config.pop('abi_cache', None)
+
+        return config
+
+    # --- calls and transactions
+
+    def resolve_block(self, block_identifier):
+
+        if block_identifier in (None, 'latest', 'pending', 'safe', 'finalized'):
+            return self.block_number
+        if block_identifier == 'earliest':
+            return 0
+        return min(int(block_identifier, 16), self.block_number)
+
+    def call_contract(self, address, data, block):
+
+        contract = self.by_address.get(Web3.to_checksum_address(address).lower())
+        if contract is None:
+            # no code, the call returns nothing
+            return b''
+
+        return contract.call(self, data, block)
+
+    def execute(self, tx, block, dry_run=False):
+        """ (status, gas used) of the transaction """
+
+        if not tx['to']:
+            return 1, 21000
+        contract = self.by_address.get(tx['to'].lower())
+        if contract is None or len(HexBytes(tx['input'])) < 4:
+            # transfer (ex.: cancel of a transaction)
+            return 1, 21000
+
+        try:
+            gas_used = contract.execute(self, tx['input'], block, dry_run=dry_run)
+        except Revert:
+            return 0, min(tx['gas'], contract.base_gas)
+
+        if gas_used > tx['gas']:
+            # out of gas, all the gas is used
+            return 0, tx['gas']
+
+        return 1, gas_used
+
+    @staticmethod
+    def decode_raw_transaction(raw):
+
+        raw = HexBytes(raw)
+        sender = Account.recover_transaction(raw)
+        if raw[0] > 0x7f:
+            nonce, gas_price, gas, to, value, data = rlp.decode(bytes(raw))[:6]
+            nonce, gas_price, gas, value = [int.from_bytes(field, 'big') for field in (nonce, gas_price, gas, value)]
+        else:
+            from eth_account.typed_transactions import TypedTransaction
+            fields = TypedTransaction.from_bytes(raw).as_dict()
+            nonce, gas, to, value, data = (fields['nonce'], fields['gas'], fields.get('to', b''),
+                                           fields.get('value', 0), fields.get('data', b''))
+            gas_price = fields.get('gasPrice') or fields['maxFeePerGas']
+
+        return dict(hash=Web3.to_hex(Web3.keccak(raw)),
+                    nonce=nonce,
+                    gasPrice=gas_price,
+                    gas=gas,
+                    to=Web3.to_checksum_address(to) if to else None,
+                    value=value,
+                    input=Web3.to_hex(data),
+                    **{'from': sender})
+
+    def pending_nonce(self, address):
+
+        nonce = self.nonces[address]
+        nonces = set(tx['nonce'] for tx in self.mempool if tx['from'] == address)
+        while nonce in nonces:
+            nonce += 1
+
+        return nonce
+
+    def send_raw_transaction(self, raw):
+
+        tx = self.decode_raw_transaction(raw)
+        if tx['nonce'] < self.nonces[tx['from']]:
+            raise RpcError(-32010, 'transaction nonce too low')
+
+        for index, pending in enumerate(self.mempool):
+            if pending['from'] == tx['from'] and pending['nonce'] == tx['nonce']:
+                if tx['gasPrice'] < pending['gasPrice'] * 1.1:
+                    raise RpcError(-32010, 'replacement transaction underpriced')
+                # replaced, the old one is not known anymore
+                del self.mempool[index]
+                del self.transactions[pending['hash']]
+                break
+
+        tx['received'] = time.monotonic()
+        if self.drop_next_transactions:
+            # accepted but never mined
+            self.drop_next_transactions -= 1
+            tx['dropped'] = True
+        self.mempool.append(tx)
+        self.transactions[tx['hash']] = tx
+        self.counters['transactions'] += 1
+
+        return tx['hash']
+
+    # --- mining
+
+    def mine(self, count=1):
+        """ Mine count blocks with the transactions of the mempool """
+
+        for _ in range(count):
+            with self.lock:
+                self.mine_block()
+                self.mined.notify_all()
+
+    def mine_block(self):
+
+        number = self.block_number + 1
+        self.block_number = number
+        block = dict(timestamp=max(int(time.time()), self.blocks[number - 1]['timestamp'] + 1),
+                     transactions=list(), gas_used=0)
+        self.blocks[number] = block
+
+        # the state changes scheduled for this block, before its transactions
+        for callback in self.scheduled.pop(number, list()):
+            callback(self)
+
+        # dropped transactions leave the mempool without receipt
+        for tx in [tx for tx in self.mempool if tx.get('dropped')]:
+            self.mempool.remove(tx)
+            del self.transactions[tx['hash']]
+
+        included = True
+        while included:
+            included = False
+            for tx in sorted(self.mempool, key=lambda t: -t['gasPrice']):
+                if self.max_txs_per_block is not None and len(block['transactions']) >= self.max_txs_per_block:
+                    break
+                if tx['gasPrice'] < self.min_gas_price or tx['nonce'] != self.nonces[tx['from']]:
+                    continue
+                if block['gas_used'] + tx['gas'] > self.block_gas_limit:
+                    continue
+                self.include(tx, number)
+                included = True
+
+        return number
+
+    def include(self, tx, number):
+
+        block = self.blocks[number]
+        status, gas_used = self.execute(tx, number)
+        self.mempool.remove(tx)
+        self.nonces[tx['from']] += 1
+        block['gas_used'] += gas_used
+
+        tx['blockNumber'] = number
+        tx['transactionIndex'] = len(block['transactions'])
+        tx['mined'] = time.monotonic()
+        block['transactions'].append(tx['hash'])
+        self.receipts[tx['hash']] = dict(
+            transactionHash=tx['hash'],
+            transactionIndex=hex(tx['transactionIndex']),
+            blockHash=block_hash(number),
+            blockNumber=hex(number),
+            cumulativeGasUsed=hex(block['gas_used']),
+            gasUsed=hex(gas_used),
+            effectiveGasPrice=hex(tx['gasPrice']),
+            contractAddress=None,
+            logs=list(),
+            logsBloom='0x' + '00' * 256,
+            status=hex(status),
+            to=tx['to'],
+            type='0x0',
+            **{'from': tx['from']})
+
+    def mine_loop(self):
+
+        while not self.stop_event.wait(self.block_time):
+            self.mine()
+
+    def wait_block(self, number, timeout=None):
+        """ Wait until the block is mined """
+
+        with self.lock:
+            return self.mined.wait_for(lambda: self.block_number >= number, timeout=timeout)
+
+    # --- json rpc
+
+    def format_transaction(self, tx):
+
+        number = tx.get('blockNumber')
+        return dict(hash=tx['hash'],
+                    nonce=hex(tx['nonce']),
+                    blockHash=block_hash(number) if number is not None else None,
+                    blockNumber=hex(number) if number is not None else None,
+                    transactionIndex=hex(tx['transactionIndex']) if number is not None else None,
+                    to=tx['to'],
+                    value=hex(tx['value']),
+                    gas=hex(tx['gas']),
+                    gasPrice=hex(tx['gasPrice']),
+                    input=tx['input'],
+                    v='0x1c', r=ZERO_HASH, s=ZERO_HASH,
+                    **{'from': tx['from']})
+
+    def format_block(self, number, full=False):
+
+        block = self.blocks.get(number)
+        if block is None:
+            return None
+        transactions = block['transactions']
+        if full:
+            transactions = [self.format_transaction(self.transactions[tx_hash]) for tx_hash in transactions
+                            if tx_hash in self.transactions]
+        return dict(number=hex(number),
+                    hash=block_hash(number),
+                    parentHash=block_hash(number - 1),
+                    nonce='0x0000000000000000',
+                    sha3Uncles=ZERO_HASH,
+                    logsBloom='0x' + '00' * 256,
+                    transactionsRoot=ZERO_HASH,
+                    stateRoot=ZERO_HASH,
+                    receiptsRoot=ZERO_HASH,
+                    miner=ZERO_ADDRESS,
+                    difficulty='0x1',
+                    totalDifficulty=hex(number),
+                    extraData='0x',
+                    size='0x3e8',
+                    gasLimit=hex(self.block_gas_limit),
+                    gasUsed=hex(block['gas_used']),
+                    timestamp=hex(block['timestamp']),
+                    minimumGasPrice=hex(self.min_gas_price),
+                    transactions=transactions,
+                    uncles=list())
+
+    def rpc(self, method, params):
+        """ Result of the method, RpcError for an error response """
+
+        self.method_counters[method] += 1
+
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_chainId':
+            return hex(self.chain_id)
+        if method == 'net_version':
+            return str(self.chain_id)
+        if method == 'web3_clientVersion':
+            return 'RskJ/mock'
+        if method == 'eth_gasPrice':
+            return hex(self.gas_price)
+        if method == 'eth_getBalance':
+            return hex(self.get_balance(params[0]))
+        if method == 'eth_getCode':
+            return '0x00' if params[0].lower() in self.by_address else '0x'
+        if method == 'eth_getTransactionCount':
+            address = Web3.to_checksum_address(params[0])
+            if len(params) > 1 and params[1] == 'pending':
+                return hex(self.pending_nonce(address))
+            return hex(self.nonces[address])
+        if method == 'eth_call':
+            call = params[0]
+            block = self.resolve_block(params[1] if len(params) > 1 else 'latest')
+            try:
+                return Web3.to_hex(self.call_contract(call['to'], call.get('data', call.get('input', '0x')), block))
+            except Revert as e:
+                raise RpcError(VM_EXECUTION_ERROR, 'VM execution error: {0}'.format(e),
+                               data=Web3.to_hex(Web3.keccak(text='Error(string)')[:4] + abi_encode(['string'], [str(e)])))
+        if method == 'eth_estimateGas':
+            call = params[0]
+            tx = dict(to=call.get('to'), input=call.get('data', call.get('input', '0x')),
+                      gas=self.block_gas_limit)
+            status, gas_used = self.execute(tx, self.block_number, dry_run=True)
+            if not status:
+                raise RpcError(VM_EXECUTION_ERROR, 'VM execution error: transaction reverted')
+            return hex(gas_used)
+        if method == 'eth_sendRawTransaction':
+            return self.send_raw_transaction(params[0])
+        if method == 'eth_getTransactionByHash':
+            tx = self.transactions.get(Web3.to_hex(HexBytes(params[0])))
+            return self.format_transaction(tx) if tx else None
+        if method == 'eth_getTransactionReceipt':
+            return self.receipts.get(Web3.to_hex(HexBytes(params[0])))
+        if method == 'eth_getBlockByNumber':
+            number = self.resolve_block(params[0])
+            return self.format_block(number, full=len(params) > 1 and params[1])
+        if method == 'eth_getBlockByHash':
+            for number in self.blocks:
+                if block_hash(number) == params[0]:
+                    return self.format_block(number, full=len(params) > 1 and params[1])
+            return None
+
+        raise RpcError(-32601, 'The method {0} does not exist/is not available'.format(method))
+
+    def handle(self, request):
+
+        try:
+            with self.lock:
+                result = self.rpc(request['method'], request.get('params') or list())
+        except RpcError as e:
+            return dict(jsonrpc='2.0', id=request.get('id'), error=e.response())
+        except Exception as e:
+            return dict(jsonrpc='2.0', id=request.get('id'), error=dict(code=-32603, message=str(e)))
+
+        return dict(jsonrpc='2.0', id=request.get('id'), result=result)
+
+    def request_latency(self, body):
+
+        methods = [request.get('method') for request in body] if isinstance(body, list) else [body.get('method')]
+        latency = max(self.method_latency.get(method, self.latency) for method in methods)
+        if isinstance(latency, (tuple, list)):
+            latency = random.uniform(*latency)
+
+        return latency
+
+    def stats(self):
+
+        with self.lock:
+            return dict(self.counters, methods=dict(self.method_counters), block_number=self.block_number,
+                        mempool=len(self.mempool))
+
+    def reset_stats(self):
+
+        with self.lock:
+            self.counters.clear()
+            self.method_counters.clear()
+
+    # --- server
+
+    def start(self, port=0, host='127.0.0.1'):
+        """ Serve in background, return the uri """
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+
+                data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with node.lock:
+                    node.counters['requests'] += 1
+                    node.counters['bytes_in'] += len(data)
+
+                body = json.loads(data)
+                latency = node.request_latency(body)
+                if latency:
+                    time.sleep(latency)
+
+                fail = False
+                with node.lock:
+                    if node.fail_next_requests:
+                        node.fail_next_requests -= 1
+                        fail = True
+                    elif node.error_rate and random.random() < node.error_rate:
+                        fail = True
+                if fail:
+                    with node.lock:
+                        node.counters['failed_requests'] += 1
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if isinstance(body, list):
+                    response = [node.handle(request) for request in body]
+                else:
+                    response = node.handle(body)
+
+                output = json.dumps(response).encode()
+                with node.lock:
+                    node.counters['batches'] += isinstance(body, list)
+                    node.counters['bytes_out'] += len(output)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(output)))
+                self.end_headers()
+                self.wfile.write(output)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='MockNode', daemon=True).start()
+
+        if self.block_time:
+            self.miner = threading.Thread(target=self.mine_loop, name='MockNodeMiner', daemon=True)
+            self.miner.start()
+
+        return self.uri
+
+    @property
+    def uri(self):
+
+        return 'http://{0}:{1}'.format(*self.server.server_address[:2])
+
+    def stop(self):
+
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class RpcError(Exception):
+
+    def __init__(self, code, message, data=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def response(self):
+
+        error = dict(code=self.code, message=self.message)
+        if self.data is not None:
+            error['data'] = self.data
+        return error
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Mock RSK node with the protocol contracts')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.realpath(__file__))), 'config.json'))
+    parser.add_argument('--port', type=int, default=4444)
+    parser.add_argument('--block-time', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests with 503')
+    parser.add_argument('--settlement-at', type=int, default=None, help='block enabling the settlement')
+    parser.add_argument('--liquidation-at', type=int, default=None, help='block reaching the liquidation')
+    parser.add_argument('--write-config', default=None, help='write the automator config for this node')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    node = MockNode.from_config(config, block_time=args.block_time)
+    node.latency = args.latency
+    node.error_rate = args.error_rate
+    if args.settlement_at is not None:
+        node.at_block(args.settlement_at, lambda n: n.enable_settlement())
+    if args.liquidation_at is not None:
+        node.at_block(args.liquidation_at, lambda n: n.reach_liquidation())
+
+    uri = node.start(port=args.port)
+    if args.write_config:
+        with open(args.write_config, 'w') as f:
+            json.dump(node.automator_config(config), f, indent=2)
+
+    print("Mock node on {0} chain id {1} block {2}".format(uri, node.chain_id, node.block_number))
+    print("Account: ACCOUNT_PK_SECRET={0}".format(DEV_PRIVATE_KEY))
+
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(node.stats()))
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
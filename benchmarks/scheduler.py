@@ -0,0 +1,87 @@
+"""
+Microbenchmark of the tasks manager scheduler.
+
+Registers hundreds of no-op tasks and reports:
+
+ * idle: CPU seconds used by the process while every task is waiting.
+ * jitter: delay between the due time of a task and the moment it starts.
+
+Usage: python -m benchmarks.scheduler --tasks 300 --seconds 10
+"""
+
+import argparse
+import json
+import random
+import time
+
+from automator.tasks_manager import TransactionsTasksManager
+
+
+def percentile(values, pct):
+    """ Nearest rank percentile """
+
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+def noop_task(delays, task=None, global_manager=None):
+    delays.append(time.monotonic() - task.next_run)
+
+
+def stop_task(task=None, global_manager=None):
+    return dict(shutdown=True)
+
+
+def run_scheduler(n_tasks, seconds, min_wait, max_wait, max_workers=1):
+    """ Run the loop for seconds and return (cpu seconds, list of start delays) """
+
+    delays = list()
+    manager = TransactionsTasksManager()
+    manager.max_workers = max_workers
+    for n in range(n_tasks):
+        manager.add_task(noop_task,
+                         args=[delays],
+                         wait=random.uniform(min_wait, max_wait),
+                         task_name='Bench {0}'.format(n))
+    manager.add_task(stop_task, wait=seconds, task_name='Stop')
+
+    cpu_start = time.process_time()
+    manager.start_loop()
+    cpu_used = time.process_time() - cpu_start
+
+    return cpu_used, delays
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Scheduler microbenchmark')
+    parser.add_argument('--tasks', type=int, default=300)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    # idle: every task sleeps longer than the run
+    idle_cpu, _ = run_scheduler(args.tasks, args.seconds, 3600, 3600, max_workers=args.workers)
+
+    # busy: tasks due every 1 to 5 seconds
+    busy_cpu, delays = run_scheduler(args.tasks, args.seconds, 1, 5, max_workers=args.workers)
+
+    result = dict(
+        tasks=args.tasks,
+        seconds=args.seconds,
+        idle_cpu_percent=round(100.0 * idle_cpu / args.seconds, 3),
+        busy_cpu_percent=round(100.0 * busy_cpu / args.seconds, 3),
+        runs=len(delays),
+        jitter_p50_ms=round(1000.0 * percentile(delays, 50), 3),
+        jitter_p99_ms=round(1000.0 * percentile(delays, 99), 3),
+        jitter_max_ms=round(1000.0 * max(delays or [0.0]), 3)
+    )
+
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Startup benchmark.
+
+Reports, each one in a fresh interpreter (median of --repeat runs):
+
+ * import: time to import automator.tasks.
+ * abi_eager: parse every abi file of the package, as the contract classes did on import.
+ * abi_lazy: abis of the contracts used by app_mode MoC, parsed on first use.
+ * abi_precompiled: the same from the precompiled cache (automator.base.abi_cache).
+ * first_check (with --config): import to the first task condition resolved against
+   the node of the config (ex.: the mock node of benchmarks.mock_node).
+
+Usage: python -m benchmarks.startup --repeat 5 [--config config.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import automator.tasks
+print(time.perf_counter() - start)
+"""
+
+ABI_EAGER = """
+import glob, json, os, time
+import automator.base.contracts as contracts
+start = time.perf_counter()
+for abi_file in glob.glob(os.path.join(contracts.package_dir, '**', '*.abi'), recursive=True):
+    with open(abi_file) as f:
+        json.load(f)
+print(time.perf_counter() - start)
+"""
+
+ABI_LAZY = """
+import sys, time
+from automator.base.contracts import install_abi_cache
+from automator.contracts import Multicall2, MoC, MoCConnector, MoCState, MoCInrate, MoCMedianizer, \\
+    CommissionSplitter, ERC20Token
+if len(sys.argv) > 1:
+    start = time.perf_counter()
+    install_abi_cache(sys.argv[1])
+else:
+    start = time.perf_counter()
+for contract_class in (Multicall2, MoC, MoCConnector, MoCState, MoCInrate, MoCMedianizer,
+                       CommissionSplitter, ERC20Token):
+    contract_class.contract_abi
+print(time.perf_counter() - start)
+"""
+
+FIRST_CHECK = """
+import sys, json, time
+start = time.perf_counter()
+from automator.tasks import AutomatorTasks
+from automator.base.contracts import install_abi_cache
+with open(sys.argv[1]) as f:
+    config = json.load(f)
+if len(sys.argv) > 2:
+    install_abi_cache(sys.argv[2])
+automator = AutomatorTasks(config)
+automator.condition('isSettlementEnabled',
+                    automator.contracts_loaded['MoC'].sc.functions.isSettlementEnabled().call)
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(code, *args):
+    """ Seconds printed by the code run in a fresh interpreter """
+
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code] + list(args),
+                            cwd=root, capture_output=True, text=True, check=True).stdout
+
+    return float(output.strip().splitlines()[-1])
+
+
+def median_ms(code, repeat, *args):
+
+    return round(1000.0 * statistics.median(run_python(code, *args) for _ in range(repeat)), 3)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Startup benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--config', default=None, help='config to measure import to first check')
+    args = parser.parse_args()
+
+    from automator.base.abi_cache import build
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'abi_cache.json')
+        build(cache_file)
+
+        result = dict(
+            repeat=args.repeat,
+            import_ms=median_ms(IMPORT, args.repeat),
+            abi_eager_ms=median_ms(ABI_EAGER, args.repeat),
+            abi_lazy_ms=median_ms(ABI_LAZY, args.repeat),
+            abi_precompiled_ms=median_ms(ABI_LAZY, args.repeat, cache_file)
+        )
+
+        if args.config:
+            result['first_check_ms'] = median_ms(FIRST_CHECK, args.repeat, os.path.realpath(args.config))
+            result['first_check_precompiled_ms'] = median_ms(FIRST_CHECK, args.repeat,
+                                                             os.path.realpath(args.config), cache_file)
+
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
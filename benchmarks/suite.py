@@ -0,0 +1,497 @@
+"""
+Benchmark suite of the automator against the mock node (benchmarks.mock_node).
+
+The automator (app_run_automator.py, unchanged) runs in a subprocess against a mock node
+of this process, and the suite reports as one json:
+
+ * startup: import time and import to the first condition checked against the mock
+   (benchmarks.startup).
+ * idle: with every condition false, requests and bytes to the node per block (one
+   scheduler cycle of the block triggered tasks) and CPU seconds per hour of the automator.
+ * reaction: the conditions of the tasks are made true at known blocks (isLiquidationReached,
+   isSettlementEnabled, isDailyEnabled, ..., balance of the splitters) and the latency to the
+   first successful transaction of the task mined is reported per task, in blocks and
+   seconds (p50, p95, max), with the requests and transactions of the phase.
+ * cycle (idle and reaction): p50/p99 of the duration and the queue delay of the task runs,
+   from the histograms of the automator /metrics (interpolated in the buckets like
+   histogram_quantile).
+ * throughput (idle and reaction): task runs and transactions sent per second.
+
+Options change the conditions of the run: --engine thread|asyncio and --workers (parallel
+execution), --latency and --error-rate of the node, --congestion (one transaction per block
+and a minimum gas price above the node price, the transactions need a gas price bump).
+With --baseline the relative change of every number against a previous result is added.
+--engine thread,asyncio runs the suite once per engine; the settings that only the thread
+engine implements are disabled for both (asyncio_config) so they do the same work.
+--workers 1,2,4 runs it once per max_workers and adds the throughput of every run.
+
+Usage: python -m benchmarks.suite --rounds 5 --output result.json [--baseline old.json]
+"""
+
+import argparse
+import copy
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from automator.async_tasks import unsupported_settings
+from benchmarks.mock_node import MockNode, DEV_PRIVATE_KEY
+from benchmarks.scheduler import percentile
+from benchmarks.startup import median_ms, IMPORT, FIRST_CHECK
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+TASK_DURATION = 'automator_task_duration_seconds'
+TASK_QUEUE_DELAY = 'automator_task_queue_delay_seconds'
+
+
+def triggers_from_config(config):
+    """ (task, contract, function, trigger(node)) of every task of the config: trigger makes
+    the condition of the task true, function is the transaction expected """
+
+    tasks = config.get('tasks', dict())
+    if config.get('app_mode', 'MoC') == 'MoC':
+        interest, ema = 'payBitProHoldersInterestPayment', 'calculateBitcoinMovingAverage'
+        interest_flag = 'isBitProInterestEnabled'
+    else:
+        interest, ema = 'payRiskProHoldersInterestPayment', 'calculateReserveTokenMovingAverage'
+        interest_flag = 'isRiskProInterestEnabled'
+
+    triggers = list()
+    if 'liquidation' in tasks:
+        triggers.append(('liquidation', 'MoC', 'evalLiquidation',
+                         lambda node: node.reach_liquidation(steps=10)))
+    if 'run_settlement' in tasks:
+        triggers.append(('run_settlement', 'MoC', 'runSettlement',
+                         lambda node: node.enable_settlement(steps=10)))
+    if 'daily_inrate_payment' in tasks:
+        triggers.append(('daily_inrate_payment', 'MoC', 'dailyInratePayment',
+                         lambda node: node.set('MoC', 'isDailyEnabled', True)))
+    if 'pay_bitpro_holders' in tasks:
+        triggers.append(('pay_bitpro_holders', 'MoC', interest,
+                         lambda node: node.set('MoC', interest_flag, True)))
+    if 'calculate_bma' in tasks:
+        triggers.append(('calculate_bma', 'MoCState', ema,
+                         lambda node: node.set('MoCState', 'shouldCalculateEma', True)))
+
+    for index, setting in enumerate(tasks.get('commission_splitters', list())):
+
+        def fund(node, setting=setting):
+            amount = setting['min_balance'] * 10
+            if setting['ac_token']:
+                node.contracts['Token_{0}'.format(setting['ac_token'].lower())].set_token_balance(
+                    setting['address'], amount, node.block_number)
+            else:
+                node.set_balance(setting['address'], amount)
+
+        triggers.append(('commission_splitter_{0}'.format(index), 'CommissionSplitter_{0}'.format(index),
+                         'split', fund))
+
+    return triggers
+
+
+def asyncio_config(config):
+    """ The config with the settings only implemented by the thread engine disabled """
+
+    config = copy.deepcopy(config)
+    for section in ('block_watcher', 'confirmations', 'replacement', 'simulation', 'journal', 'addresses_snapshot'):
+        if section in config:
+            config[section]['enabled'] = False
+    if isinstance(config['uri'], list):
+        config['uri'] = config['uri'][0]
+    config.pop('concurrency_groups', None)
+    config.get('gas_price', dict())['strategy'] = 'node'
+
+    for task_settings in config['tasks'].values():
+        for settings in task_settings if isinstance(task_settings, list) else [task_settings]:
+            for setting in ('on_block', 'hedge', 'account', 'concurrency_group'):
+                settings.pop(setting, None)
+            settings.get('adaptive_steps', dict())['enabled'] = False
+
+    return config
+
+
+def free_port():
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def metrics_up(port):
+
+    try:
+        with urllib.request.urlopen('http://127.0.0.1:{0}/metrics'.format(port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def scrape_histograms(port, names=(TASK_DURATION, TASK_QUEUE_DELAY)):
+    """ {name: {le: cumulative count}} of the histograms, summed over their labels """
+
+    with urllib.request.urlopen('http://127.0.0.1:{0}/metrics'.format(port), timeout=5) as response:
+        text = response.read().decode('utf-8')
+
+    histograms = dict((name, dict()) for name in names)
+    for family in text_string_to_metric_families(text):
+        if family.name not in histograms:
+            continue
+        for sample in family.samples:
+            if sample.name.endswith('_bucket'):
+                le = float(sample.labels['le'])
+                histograms[family.name][le] = histograms[family.name].get(le, 0) + sample.value
+
+    return histograms
+
+
+def histogram_quantile(buckets, quantile):
+    """ Linear interpolation in the bucket of the rank, as PromQL histogram_quantile """
+
+    bounds = sorted(buckets)
+    if not bounds or not buckets[bounds[-1]]:
+        return 0.0
+
+    rank = quantile * buckets[bounds[-1]]
+    lower, below = 0.0, 0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank and count > below:
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+
+    return lower
+
+
+def cycle_stats(start, end):
+    """ Task runs between two scrapes: count and p50/p99 of their duration and queue delay """
+
+    result = dict()
+    for key, name in (('duration', TASK_DURATION), ('queue_delay', TASK_QUEUE_DELAY)):
+        buckets = dict((le, count - start[name].get(le, 0)) for le, count in end[name].items())
+        result[key] = dict(p50=round(histogram_quantile(buckets, 0.5), 4),
+                           p99=round(histogram_quantile(buckets, 0.99), 4))
+    result['runs'] = int(sum(count - start[TASK_DURATION].get(le, 0)
+                             for le, count in end[TASK_DURATION].items() if le == float('inf')))
+
+    return result
+
+
+def throughput(cycle, transactions, seconds):
+
+    seconds = max(seconds, 1e-9)
+    return dict(tasks_per_second=round(cycle['runs'] / seconds, 3),
+                transactions_per_second=round(transactions / seconds, 3))
+
+
+def process_cpu(pid):
+    """ CPU seconds (user + system) of the process, None if /proc is not available """
+
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+    # utime and stime, fields 14 and 15 of proc(5)
+    return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+
+
+def wait_blocks(node, count, timeout_factor=4):
+
+    target = node.block_number + count
+    node.wait_block(target, timeout=count * node.block_time * timeout_factor + 10)
+    return target
+
+
+def latency_stats(values, ndigits=3):
+
+    return dict(p50=round(percentile(values, 50), ndigits),
+                p95=round(percentile(values, 95), ndigits),
+                max=round(max(values or [0]), ndigits))
+
+
+def reaction_results(node, events):
+    """ Per task: the first successful transaction of the function mined from the block of the
+    trigger on """
+
+    by_task = dict()
+    for task, contract_name, function, block, triggered_at in events:
+        contract = node.contracts[contract_name]
+        mined = None
+        for tx_hash, receipt in node.receipts.items():
+            tx = node.transactions.get(tx_hash)
+            if tx is None or int(receipt['status'], 16) != 1 or tx['blockNumber'] <= block:
+                continue
+            if (tx['to'] or '').lower() != contract.address.lower():
+                continue
+            try:
+                name = contract.decode_input(tx['input'])[0]
+            except Exception:
+                continue
+            if name == function and (mined is None or tx['blockNumber'] < mined['blockNumber']):
+                mined = tx
+
+        result = by_task.setdefault(task, dict(blocks=list(), seconds=list(), missed=0))
+        if mined is None:
+            result['missed'] += 1
+            continue
+        result['blocks'].append(mined['blockNumber'] - block)
+        result['seconds'].append(mined['mined'] - triggered_at)
+
+    return {task: dict(triggers=len(result['blocks']) + result['missed'],
+                       missed=result['missed'],
+                       blocks=latency_stats(result['blocks'], 1),
+                       seconds=latency_stats(result['seconds']))
+            for task, result in by_task.items()}
+
+
+def per_block(stats, blocks):
+
+    blocks = max(1, blocks)
+    return dict(blocks=blocks,
+                requests_per_block=round(stats.get('requests', 0) / float(blocks), 2),
+                bytes_in_per_block=round(stats.get('bytes_in', 0) / float(blocks), 1),
+                bytes_out_per_block=round(stats.get('bytes_out', 0) / float(blocks), 1),
+                methods_per_block={method: round(count / float(blocks), 2)
+                                   for method, count in sorted(stats.get('methods', dict()).items())})
+
+
+def flatten(value, prefix=''):
+
+    if isinstance(value, dict):
+        items = dict()
+        for key, item in value.items():
+            items.update(flatten(item, '{0}{1}.'.format(prefix, key)))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return dict()
+
+
+def compare(result, baseline):
+    """ Relative change of every number of the result against the baseline """
+
+    measured = dict((key, value) for key, value in result.items() if key not in ('params', 'change'))
+    old = flatten(baseline)
+    changes = dict()
+    for key, value in flatten(measured).items():
+        if old.get(key):
+            changes[key] = round((value - old[key]) / float(old[key]), 4)
+
+    return changes
+
+
+def git_version():
+
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(config, args):
+
+    node = MockNode.from_config(config, block_time=args.block_time)
+    node.latency = args.latency
+    node.error_rate = args.error_rate
+    node.start()
+
+    automator_config = node.automator_config(config)
+    automator_config.setdefault('logging', dict())['level'] = args.log_level
+    if args.engine:
+        automator_config['engine'] = args.engine
+    if args.workers:
+        automator_config['max_workers'] = args.workers
+    if automator_config.get('engine') == 'asyncio' and unsupported_settings(automator_config):
+        raise RuntimeError("Not supported by the asyncio engine: {0}".format(
+            ', '.join(unsupported_settings(automator_config))))
+
+    # the task histograms are read from /metrics
+    metrics_port = free_port()
+    automator_config['prometheus'] = dict(enabled=True, port=metrics_port, addr='127.0.0.1')
+
+    result = dict(version=git_version(),
+                  params=dict(engine=automator_config.get('engine', 'thread'),
+                              workers=automator_config.get('max_workers'),
+                              block_time=args.block_time,
+                              latency=args.latency,
+                              error_rate=args.error_rate,
+                              congestion=args.congestion,
+                              rounds=args.rounds))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = os.path.join(tmp, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(automator_config, f)
+
+        if args.startup_repeat:
+            result['startup'] = dict(import_ms=median_ms(IMPORT, args.startup_repeat),
+                                     first_check_ms=median_ms(FIRST_CHECK, args.startup_repeat, config_file))
+
+        env = dict(os.environ, APP_CONFIG=json.dumps(automator_config), ACCOUNT_PK_SECRET=DEV_PRIVATE_KEY)
+        env.pop('APP_CONNECTION_URI', None)
+        log_file = open(args.log or os.devnull, 'w')
+        # the startup benchmark already read the conditions from this node
+        node.reset_stats()
+        automator = subprocess.Popen([sys.executable, 'app_run_automator.py'], cwd=ROOT, env=env,
+                                     stdout=log_file, stderr=subprocess.STDOUT)
+
+        try:
+            # started: the first condition is read and /metrics answers
+            deadline = time.monotonic() + args.startup_timeout
+            while not (node.stats()['methods'].get('eth_call') and metrics_up(metrics_port)):
+                if automator.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The automator did not start, see --log")
+                time.sleep(0.1)
+            wait_blocks(node, 2)
+            histograms = scrape_histograms(metrics_port)
+
+            # idle: every condition false
+            node.reset_stats()
+            start_block, start_time, start_cpu = node.block_number, time.monotonic(), process_cpu(automator.pid)
+            wait_blocks(node, args.idle_blocks)
+            elapsed, cpu = time.monotonic() - start_time, process_cpu(automator.pid)
+            result['idle'] = per_block(node.stats(), node.block_number - start_block)
+            result['idle']['seconds'] = round(elapsed, 1)
+            idle_histograms = scrape_histograms(metrics_port)
+            result['idle']['cycle'] = cycle_stats(histograms, idle_histograms)
+            result['idle']['throughput'] = throughput(result['idle']['cycle'],
+                                                      node.stats().get('transactions', 0), elapsed)
+            if cpu is not None and start_cpu is not None:
+                result['idle']['cpu_seconds_per_hour'] = round((cpu - start_cpu) / elapsed * 3600, 1)
+
+            # reaction: every round makes all the conditions true in the same block
+            if args.congestion:
+                node.max_txs_per_block = 1
+                node.min_gas_price = int(node.gas_price * 1.3)
+            node.reset_stats()
+            events = list()
+            triggers = triggers_from_config(config)
+            first_block = node.block_number + 2
+            for index in range(args.rounds):
+
+                def trigger(node, index=index):
+                    for task, contract_name, function, fire in triggers:
+                        fire(node)
+                        events.append((task, contract_name, function, node.block_number, time.monotonic()))
+
+                node.at_block(first_block + index * args.round_blocks, trigger)
+
+            start_block, start_time, start_cpu = node.block_number, time.monotonic(), process_cpu(automator.pid)
+            histograms = scrape_histograms(metrics_port)
+            node.wait_block(first_block + args.rounds * args.round_blocks,
+                            timeout=(args.rounds * args.round_blocks + 2) * args.block_time * 4 + 10)
+            # late transactions (congestion) are still waited for a few blocks
+            for _ in range(args.drain_blocks):
+                with node.lock:
+                    tasks = reaction_results(node, events)
+                if not sum(task['missed'] for task in tasks.values()):
+                    break
+                wait_blocks(node, 1)
+            with node.lock:
+                result['reaction'] = dict(per_block(node.stats(), node.block_number - start_block),
+                                          transactions=node.stats().get('transactions', 0),
+                                          reverted=sum(1 for receipt in node.receipts.values()
+                                                       if int(receipt['blockNumber'], 16) > start_block and
+                                                       int(receipt['status'], 16) == 0),
+                                          tasks=reaction_results(node, events))
+            result['reaction']['cycle'] = cycle_stats(histograms, scrape_histograms(metrics_port))
+            result['reaction']['throughput'] = throughput(result['reaction']['cycle'],
+                                                          result['reaction']['transactions'],
+                                                          time.monotonic() - start_time)
+            cpu = process_cpu(automator.pid)
+            if cpu is not None and start_cpu is not None:
+                result['reaction']['cpu_seconds'] = round(cpu - start_cpu, 2)
+
+        finally:
+            automator.send_signal(signal.SIGTERM)
+            try:
+                automator.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                automator.kill()
+                automator.wait()
+            log_file.close()
+            node.stop()
+
+    return result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark suite against the mock node')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'config.json'))
+    parser.add_argument('--block-time', type=float, default=2.0)
+    parser.add_argument('--rounds', type=int, default=5, help='times every condition is made true')
+    parser.add_argument('--round-blocks', type=int, default=6, help='blocks between rounds')
+    parser.add_argument('--drain-blocks', type=int, default=10,
+                        help='max blocks to wait after the last round for the transactions missing')
+    parser.add_argument('--idle-blocks', type=int, default=10)
+    parser.add_argument('--startup-repeat', type=int, default=3, help='0 skips the startup benchmark')
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--engine', default=None,
+                        help='thread, asyncio or thread,asyncio to compare the engines')
+    parser.add_argument('--workers', default=None, help='max_workers, ex. 1,2,4 to compare the throughput')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request to the node')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests with 503')
+    parser.add_argument('--congestion', action='store_true')
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--log', default=None, help='file with the output of the automator')
+    parser.add_argument('--output', default=None, help='also write the result to this file')
+    parser.add_argument('--baseline', default=None, help='previous result to compare with')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    engines = args.engine.split(',') if args.engine else [None]
+    for engine in engines:
+        if engine not in (None, 'thread', 'asyncio'):
+            parser.error("Not valid engine: {0}".format(engine))
+
+    workers = [int(count) for count in args.workers.split(',')] if args.workers else [None]
+
+    if len(engines) == 1 and len(workers) == 1:
+        args.workers = workers[0]
+        result = run_suite(config, args)
+    else:
+        # same work for every engine
+        if 'asyncio' in engines:
+            config = asyncio_config(config)
+        runs = dict()
+        for engine in engines:
+            for count in workers:
+                args.engine, args.workers = engine, count
+                name = '_'.join(part for part in (engine, count and 'workers_{0}'.format(count)) if part)
+                runs[name] = run_suite(config, args)
+        result = dict(runs)
+        result['cycle_p99'] = dict((name, dict(idle=run['idle']['cycle']['duration']['p99'],
+                                               reaction=run['reaction']['cycle']['duration']['p99']))
+                                   for name, run in runs.items())
+        result['throughput'] = dict((name, run['reaction']['throughput']) for name, run in runs.items())
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['change'] = compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from automator.base.main import ConnectionHelperBase
+from benchmarks.mock_node import MockNode, DEV_PRIVATE_KEY
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+@pytest.fixture
+def config():
+
+    with open(os.path.join(ROOT, 'config.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def node(config):
+    """ Mock node of the protocol in config.json, blocks are mined only with node.mine() """
+
+    node = MockNode.from_config(config)
+    node.start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture(autouse=True)
+def account(monkeypatch):
+    """ Only the funded account of the mock node sends """
+
+    monkeypatch.setenv('ACCOUNT_PK_SECRET', DEV_PRIVATE_KEY)
+    for numb in range(1, 10):
+        monkeypatch.delenv('ACCOUNT_PK_SECRET_{0}'.format(numb), raising=False)
+
+
+@pytest.fixture
+def automator_config(config, node):
+    """ config.json against the mock node, without background services and with every read
+    going to the node, so the tests see every block mined """
+
+    config = node.automator_config(config)
+    for key in ('block_watcher', 'confirmations', 'replacement', 'simulation'):
+        if key in config:
+            config[key]['enabled'] = False
+    config['read_cache'] = dict(enabled=False)
+    for task_settings in config['tasks'].values():
+        for settings in task_settings if isinstance(task_settings, list) else [task_settings]:
+            settings['on_block'] = False
+
+    return config
+
+
+@pytest.fixture
+def connection_helper(automator_config):
+
+    return ConnectionHelperBase(automator_config)
+
+
+@pytest.fixture
+def connection_manager(connection_helper):
+
+    return connection_helper.connection_manager
@@ -0,0 +1,26 @@
+import os
+
+from eth_utils.abi import abi_to_signature, function_abi_to_4byte_selector
+
+from automator.base import contracts
+from automator.base.abi_cache import build
+from automator.base.contracts import install_abi_cache, load_abi_file
+
+
+def test_precompiled_abis_and_selectors(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(contracts, 'precompiled_abis', dict())
+    monkeypatch.setattr(contracts, 'function_selectors', dict())
+    monkeypatch.setattr(contracts, 'abi_files', dict())
+
+    cache_file = os.path.join(tmp_path, 'abi_cache.json')
+    count_abis, count_selectors = build(cache_file)
+    content = install_abi_cache(cache_file)
+
+    assert len(content['abis']) == count_abis
+    abi_file, abi = next(iter(content['abis'].items()))
+    assert load_abi_file(os.path.join(contracts.package_dir, abi_file)) == abi
+
+    function_abi = next(item for item in abi if item.get('type') == 'function')
+    assert contracts.function_selectors[abi_to_signature(function_abi)] == \
+        function_abi_to_4byte_selector(function_abi)
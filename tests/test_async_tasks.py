@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from automator.async_tasks import AsyncAutomatorTasks
+from automator.tasks import AutomatorTasks
+from benchmarks.suite import asyncio_config
+
+
+SETTLEMENT = '2. Run Settlement'
+
+
+@pytest.fixture
+def async_config(automator_config):
+
+    config = asyncio_config(automator_config)
+    settings = config['tasks']['run_settlement']
+    settings['partial_execution_steps'] = 4
+    settings['pipeline'] = dict(depth=3)
+
+    return config
+
+
+async def run_task(automator, task_name):
+
+    task = next(task for task in automator.tasks.values() if task.task_name == task_name)
+    result = await task.func(*task.args, task=task, global_manager=dict())
+    task.pending_transactions = result['pending_transactions']
+
+    return task
+
+
+def settlement_steps(node):
+
+    moc = node.contracts['MoC']
+    return [(tx['nonce'], moc.decode_input(tx['input'])[1][0]) for tx in node.transactions.values()
+            if moc.decode_input(tx['input'])[0] == 'runSettlement']
+
+
+def test_same_addresses_as_the_thread_engine(node, async_config):
+
+    automator = AsyncAutomatorTasks(async_config)
+    asyncio.run(automator.load_contracts())
+
+    # the Multicall2 of the thread engine decodes the addresses lowercase
+    discovered = AutomatorTasks(async_config).contracts_addresses
+    assert {name: address.lower() for name, address in automator.contracts_addresses.items()} == \
+        {name: address.lower() for name, address in discovered.items()}
+
+
+def test_settlement_pipeline(node, async_config):
+
+    automator = AsyncAutomatorTasks(async_config)
+    node.enable_settlement(steps=10)
+    node.mine()
+
+    async def run():
+        await automator.load_contracts()
+        task = await run_task(automator, SETTLEMENT)
+        assert len(task.pending_transactions) == 3
+
+        node.mine()
+        return await run_task(automator, SETTLEMENT)
+
+    task = asyncio.run(run())
+
+    assert settlement_steps(node) == [(0, 4), (1, 4), (2, 4)]
+    assert task.pending_transactions == []
+    assert all(int(receipt['status'], 16) == 1 for receipt in node.receipts.values())
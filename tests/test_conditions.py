@@ -0,0 +1,53 @@
+import pytest
+
+from automator.conditions import TaskConditions
+from automator.contracts import Multicall2, MoC
+
+
+@pytest.fixture
+def conditions(connection_manager, automator_config):
+
+    moc = MoC(connection_manager, contract_address=automator_config['addresses']['MoC'])
+    multicall = Multicall2(connection_manager, contract_address=automator_config['addresses']['Multicall2'])
+
+    conditions = TaskConditions(multicall, max_age=60)
+    conditions.add('isSettlementEnabled', moc.address(), moc.sc.functions.isSettlementEnabled)
+    conditions.add('isDailyEnabled', moc.address(), moc.sc.functions.isDailyEnabled)
+
+    return conditions
+
+
+def test_one_batch_for_all_the_predicates(node, conditions):
+
+    node.reset_stats()
+
+    assert conditions.result('isSettlementEnabled') is False
+    assert conditions.result('isDailyEnabled') is False
+
+    assert node.stats()['methods']['eth_call'] == 1
+
+
+def test_evaluated_again_on_a_new_head(node, conditions):
+
+    conditions.on_new_block(node.block_number)
+    assert conditions.result('isSettlementEnabled') is False
+
+    node.enable_settlement()
+    node.mine()
+
+    # same head: the batch is still fresh
+    assert conditions.result('isSettlementEnabled') is False
+
+    conditions.on_new_block(node.block_number)
+    assert conditions.result('isSettlementEnabled') is True
+
+
+def test_min_block_evaluates_again(node, conditions):
+
+    assert conditions.result('isSettlementEnabled') is False
+
+    node.enable_settlement()
+    node.mine()
+
+    assert conditions.result('isSettlementEnabled') is False
+    assert conditions.result('isSettlementEnabled', min_block=node.block_number) is True
@@ -0,0 +1,119 @@
+import datetime
+
+import pytest
+from web3 import Web3
+
+from automator.base.confirmations import ConfirmationService
+from automator.base.replacement import ReplacementEngine
+from automator.contracts import MoC
+
+
+@pytest.fixture
+def stuck_tx(node, connection_manager, automator_config):
+    """ Sent with the node price, the node only mines over 10 times it """
+
+    node.enable_settlement(steps=1000)
+    node.min_gas_price = node.gas_price * 10
+    moc = MoC(connection_manager, contract_address=automator_config['addresses']['MoC'])
+    tx_hash = connection_manager.send_function_transaction(moc.sc.functions.runSettlement, 1, gas_limit=500000)
+
+    return dict(hash=tx_hash, timestamp=datetime.datetime.now(), nonce=0, timeout=240,
+                gas_price=node.transactions[Web3.to_hex(tx_hash)]['gasPrice'])
+
+
+def replace(node, connection_manager, tx):
+    """ Bump the gas price, the old hash leaves the node """
+
+    engine = ReplacementEngine(connection_manager, bump_after_blocks=1)
+    engine.check('Confirmations', tx)
+    node.mine()
+
+    return engine.check('Confirmations', tx)
+
+
+@pytest.fixture
+def service(connection_manager):
+
+    events = list()
+    service = ConfirmationService(connection_manager, drop_after=1)
+    service.subscribe(lambda event, tracked: events.append((event, tracked.tx_hash)))
+    service.events_seen = events
+
+    return service
+
+
+def test_mined_transaction_confirmed(node, connection_manager, service, stuck_tx):
+
+    address = connection_manager.accounts[0].address
+    service.submit('Confirmations', address, stuck_tx)
+
+    node.min_gas_price = 0
+    node.mine()
+    service.poll()
+
+    tx_hash = Web3.to_hex(stuck_tx['hash'])
+    assert service.events_seen == [('confirmed', tx_hash)]
+    assert service.status(tx_hash).receipt['status'] == 1
+
+
+def test_replaced_before_replace_is_called_not_dropped(node, connection_manager, service, stuck_tx):
+
+    address = connection_manager.accounts[0].address
+    service.submit('Confirmations', address, stuck_tx)
+    old_hash = replace(node, connection_manager, stuck_tx)
+    assert Web3.to_hex(old_hash) not in node.transactions
+
+    # the task did not call replace() yet
+    service.poll()
+    assert service.events_seen == []
+
+    service.replace(old_hash, 'Confirmations', address, stuck_tx)
+    service.poll()
+    assert service.status(Web3.to_hex(old_hash)).status == 'replaced'
+    assert service.status(Web3.to_hex(stuck_tx['hash'])).status == 'pending'
+
+
+def test_finished_status_not_overwritten(connection_manager, service, stuck_tx):
+
+    address = connection_manager.accounts[0].address
+    service.submit('Confirmations', address, stuck_tx)
+    tracked = service.status(Web3.to_hex(stuck_tx['hash']))
+
+    # a poll racing replace(): the transaction was replaced while it was polled
+    service.replace(stuck_tx['hash'], 'Confirmations', address, dict(stuck_tx, hash=b'\x01' * 32))
+    service.finish(tracked, 'dropped')
+
+    assert tracked.status == 'replaced'
+    assert service.events_seen == []
+
+
+def mine_the_original(node, original):
+    """ A miner that did not see the replacement includes the original transaction """
+
+    with node.lock:
+        for tx in [tx for tx in node.mempool if tx['nonce'] == original['nonce']]:
+            node.mempool.remove(tx)
+            del node.transactions[tx['hash']]
+        node.mempool.append(original)
+        node.transactions[original['hash']] = original
+    node.min_gas_price = 0
+    node.mine()
+
+
+def test_original_mined_after_replace(node, connection_manager, service, stuck_tx):
+
+    address = connection_manager.accounts[0].address
+    service.submit('Confirmations', address, stuck_tx)
+    original = node.transactions[Web3.to_hex(stuck_tx['hash'])]
+    old_hash = replace(node, connection_manager, stuck_tx)
+    service.replace(old_hash, 'Confirmations', address, stuck_tx)
+
+    mine_the_original(node, original)
+    service.poll()
+
+    tracked = service.status(Web3.to_hex(stuck_tx['hash']))
+    assert service.events_seen == [('confirmed', tracked.tx_hash)]
+    assert tracked.receipt['transactionHash'] == old_hash
+    # the whole nonce is settled with the same receipt
+    assert service.status(Web3.to_hex(old_hash)).status == 'confirmed'
+    assert service.pending_hashes() == []
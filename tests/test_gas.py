@@ -0,0 +1,33 @@
+from automator.base.gas import GasPriceOracle, multiply_gas_price
+
+
+def test_node_price_shared_until_ttl(node, connection_manager):
+
+    oracle = GasPriceOracle.from_config(connection_manager, dict(gas_price_multiply_factor=1.01,
+                                                                 gas_price=dict(strategy='node', ttl=60)))
+
+    node.reset_stats()
+    assert oracle.gas_price() == multiply_gas_price(node.gas_price, 1.01)
+    assert oracle.gas_price() == multiply_gas_price(node.gas_price, 1.01)
+    assert node.stats()['methods']['eth_gasPrice'] == 1
+
+    oracle.refreshed_at -= 60
+    node.gas_price *= 2
+    assert oracle.gas_price() == multiply_gas_price(node.gas_price, 1.01)
+
+
+def test_fee_history_falls_back_to_the_node_price(node, connection_manager):
+    """ The mock node, like RSK, has no eth_feeHistory """
+
+    oracle = GasPriceOracle.from_config(connection_manager, dict(gas_price_multiply_factor=1.01,
+                                                                 gas_price=dict(strategy='fee_history')))
+
+    node.reset_stats()
+    assert oracle.gas_price() == multiply_gas_price(node.gas_price, 1.01)
+    assert oracle.strategy.name == 'node'
+
+    # not asked again on the next refresh
+    oracle.refreshed_at -= oracle.ttl
+    oracle.gas_price()
+    assert node.stats()['methods']['eth_feeHistory'] == 1
+    assert node.stats()['methods']['eth_gasPrice'] == 2
@@ -0,0 +1,144 @@
+import datetime
+import os
+
+import pytest
+from eth_account import Account
+from hexbytes import HexBytes
+
+from automator.base.journal import TransactionJournal
+from automator.tasks import AutomatorTasks
+
+
+SETTLEMENT = '2. Run Settlement'
+
+
+def journal_tx(nonce, tx_hash):
+
+    return dict(hash=HexBytes(tx_hash), nonce=nonce, gas_price=60000000, timeout=240,
+                timestamp=datetime.datetime.now())
+
+
+def test_pending_is_the_last_state_without_final_event(tmp_path):
+
+    journal = TransactionJournal(os.path.join(tmp_path, 'journal.db'))
+
+    first = journal_tx(0, '0x' + '01' * 32)
+    second = journal_tx(1, '0x' + '02' * 32)
+    journal.record('Task', 'sent', first)
+    journal.record('Task', 'sent', second)
+
+    # replaced: same transaction (journal_id) with a new hash
+    second['hash'] = HexBytes('0x' + '03' * 32)
+    journal.record('Task', 'replaced', second)
+    journal.record('Task', 'confirmed', first)
+
+    pending = journal.pending()['Task']
+
+    assert [(tx['nonce'], tx['hash']) for tx in pending] == [(1, HexBytes('0x' + '03' * 32))]
+    assert isinstance(pending[0]['timestamp'], datetime.datetime)
+
+
+@pytest.fixture
+def journal_config(automator_config, tmp_path):
+
+    automator_config['journal'] = dict(enabled=True, path=os.path.join(tmp_path, 'journal.db'))
+    return automator_config
+
+
+def run_task(automator, task_name):
+
+    task = next(task for task in automator.tasks.values() if task.task_name == task_name)
+    result = task.func(*task.args, task=task, global_manager=dict())
+    task.pending_transactions = result['pending_transactions']
+
+    return task
+
+
+def test_restart_does_not_send_twice(node, journal_config):
+
+    node.enable_settlement(steps=100)
+    node.mine()
+    sent = run_task(AutomatorTasks(journal_config), SETTLEMENT).pending_transactions
+
+    # restart before the transaction is mined
+    automator = AutomatorTasks(journal_config)
+    task = next(task for task in automator.tasks.values() if task.task_name == SETTLEMENT)
+    assert [tx['hash'] for tx in task.pending_transactions] == [tx['hash'] for tx in sent]
+
+    run_task(automator, SETTLEMENT)
+    assert len(node.transactions) == 1
+
+    node.mine()
+    task = run_task(automator, SETTLEMENT)
+
+    # confirmed and the next step sent
+    assert len(node.transactions) == 2
+    assert [tx['hash'] for tx in automator.journal.pending()[SETTLEMENT]] == [tx['hash'] for tx in task.pending_transactions]
+
+
+def test_recovered_transaction_of_a_removed_account(node, journal_config, monkeypatch):
+
+    node.enable_settlement(steps=100)
+    node.mine()
+    run_task(AutomatorTasks(journal_config), SETTLEMENT)
+
+    # restart with another account
+    account = Account.create()
+    node.set_balance(account.address, 10 ** 20)
+    monkeypatch.setenv('ACCOUNT_PK_SECRET', account.key.hex())
+    automator = AutomatorTasks(journal_config)
+
+    # still waits the recovered transaction
+    run_task(automator, SETTLEMENT)
+    assert len(node.transactions) == 1
+
+    node.mine()
+    task = run_task(automator, SETTLEMENT)
+
+    assert [tx['account'] for tx in task.pending_transactions] == [account.address]
+    assert all(int(receipt['status'], 16) == 1 for receipt in node.receipts.values())
+
+
+@pytest.fixture
+def replacement_config(journal_config, node):
+    """ The node only mines over 10 times its gas price """
+
+    node.min_gas_price = node.gas_price * 10
+    journal_config['replacement'] = dict(enabled=True, bump_after_blocks=1, max_gas_price_factor=100)
+    return journal_config
+
+
+def test_recovered_transaction_is_replaced(node, replacement_config, caplog):
+
+    node.enable_settlement(steps=100)
+    node.mine()
+    sent = run_task(AutomatorTasks(replacement_config), SETTLEMENT).pending_transactions[0]
+
+    automator = AutomatorTasks(replacement_config)
+    run_task(automator, SETTLEMENT)
+    node.mine()
+    task = run_task(automator, SETTLEMENT)
+
+    replaced = task.pending_transactions[0]
+    assert replaced['hash'] != sent['hash']
+    assert node.transactions[replaced['hash'].to_0x_hex()]['nonce'] == sent['nonce']
+    assert 'Error replacing' not in caplog.text
+
+
+def test_recovered_transaction_of_a_removed_account_not_replaced(node, replacement_config, monkeypatch, caplog):
+
+    node.enable_settlement(steps=100)
+    node.mine()
+    sent = run_task(AutomatorTasks(replacement_config), SETTLEMENT).pending_transactions[0]
+
+    account = Account.create()
+    monkeypatch.setenv('ACCOUNT_PK_SECRET', account.key.hex())
+    automator = AutomatorTasks(replacement_config)
+    for _ in range(3):
+        run_task(automator, SETTLEMENT)
+        node.mine()
+
+    task = next(task for task in automator.tasks.values() if task.task_name == SETTLEMENT)
+    assert task.pending_transactions[0]['hash'] == sent['hash']
+    assert caplog.text.count('not sent by this connection') == 1
+    assert 'Error replacing' not in caplog.text
@@ -0,0 +1,70 @@
+import json
+import logging
+import queue
+
+from automator.logger import BraceLogger, DedupFilter, DroppingQueueHandler, JsonFormatter, Lazy
+
+
+def record(msg, level=logging.INFO, **extra):
+
+    return logging.makeLogRecord(dict(name='default', msg=msg, levelno=level,
+                                      levelname=logging.getLevelName(level), **extra))
+
+
+def test_arguments_formatted_only_if_written(caplog):
+
+    calls = list()
+
+    def balance():
+        calls.append(1)
+        return 10
+
+    log = BraceLogger(logging.getLogger('test_logger'))
+    with caplog.at_level(logging.INFO, logger='test_logger'):
+        log.debug("Balance: {0}", Lazy(balance))
+        assert calls == []
+
+        log.info("Task :: {0} :: Hash: [{1}] Balance: [{2}]", 'Settlement', b'\x01\x02', Lazy(balance))
+
+    assert caplog.messages == ['Task :: Settlement :: Hash: [0x0102] Balance: [10]']
+
+
+def test_json_lines():
+
+    line = JsonFormatter().format(record('Task :: Settlement :: No!', task='Settlement'))
+
+    data = json.loads(line)
+    assert data['message'] == 'Task :: Settlement :: No!'
+    assert data['level'] == 'INFO'
+    assert data['task'] == 'Settlement'
+
+
+def test_repeated_lines_written_once_per_interval():
+
+    dedup = DedupFilter(interval=60)
+
+    assert [dedup.filter(record('Task :: No!')) for _ in range(3)] == [True, False, False]
+    assert dedup.filter(record('Task :: Other'))
+
+    # the interval passed: written with the count of the lines suppressed
+    dedup.seen = {key: (last - 61, suppressed) for key, (last, suppressed) in dedup.seen.items()}
+    repeated = record('Task :: No!')
+    assert dedup.filter(repeated)
+    assert repeated.getMessage() == 'Task :: No! [repeated 2 times]'
+
+
+def test_full_queue_drops_and_reports():
+
+    log_queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(log_queue)
+
+    handler.emit(record('first'))
+    handler.emit(record('second'))
+    # never blocks the task
+    handler.emit(record('dropped'))
+    assert handler.dropped == 1
+
+    assert [log_queue.get_nowait().getMessage() for _ in range(2)] == ['first', 'second']
+    handler.emit(record('third'))
+    assert log_queue.get_nowait().getMessage() == 'third'
+    assert log_queue.get_nowait().getMessage() == 'Logging :: 1 lines dropped, queue full!'
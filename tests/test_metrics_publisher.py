@@ -0,0 +1,100 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+from automator import utils
+from automator.utils import MetricsPublisher, configure_metrics_publisher
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """ CloudWatch endpoint, answers the next status of the server """
+
+    def do_POST(self):
+
+        # json protocol of the cloudwatch client
+        self.server.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        content = b'{}' if status == 200 else b'{"__type": "InvalidParameterValue", "message": "stub error"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'stub')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'stub')
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requests = list()
+    server.statuses = list()
+    server.endpoint_url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def publisher(stub):
+
+    return MetricsPublisher(flush_interval=0.2, endpoint_url=stub.endpoint_url, region_name='us-east-1')
+
+
+def test_same_metric_published_as_a_statistic_set(stub):
+
+    metrics_publisher = publisher(stub)
+    for value in (1, 2, 3):
+        metrics_publisher.put('Automator', 'HeartBeat', [('Task', 'Settlement')], value)
+    metrics_publisher.stop()
+
+    assert len(stub.requests) == 1
+    request = stub.requests[0]
+    assert request['Namespace'] == 'Automator'
+    assert request['MetricData'] == [dict(MetricName='HeartBeat',
+                                          Dimensions=[dict(Name='Task', Value='Settlement')],
+                                          StatisticValues=dict(SampleCount=3, Sum=6.0, Minimum=1, Maximum=3),
+                                          Unit='None')]
+    assert metrics_publisher.stats()['published'] == 1
+
+
+def test_endpoint_error_does_not_stop_the_publisher(stub):
+
+    stub.statuses = [400]
+    metrics_publisher = publisher(stub)
+
+    start = time.monotonic()
+    metrics_publisher.put('Automator', 'HeartBeat', [('Task', 'Settlement')], 1)
+    # never waits on the endpoint
+    assert time.monotonic() - start < 0.1
+
+    deadline = time.monotonic() + 5
+    while not metrics_publisher.stats()['errors'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    metrics_publisher.put('Automator', 'HeartBeat', [('Task', 'Settlement')], 2)
+    metrics_publisher.stop()
+
+    assert metrics_publisher.stats()['errors'] == 1
+    assert metrics_publisher.stats()['published'] == 1
+    assert len(stub.requests) == 2
+
+
+def test_heart_beat_goes_to_the_configured_publisher(stub, monkeypatch):
+
+    monkeypatch.setattr(utils, 'metrics_publisher', utils.metrics_publisher)
+    configure_metrics_publisher(dict(flush_interval=0.2, endpoint_url=stub.endpoint_url, region_name='us-east-1'))
+
+    utils.aws_put_metric_heart_beat(dict(namespace='Automator', metric_name='HeartBeat',
+                                         dimensions_name='Task', dimensions_value='Settlement'), 1)
+    utils.metrics_publisher.stop()
+
+    assert [request['Namespace'] for request in stub.requests] == ['Automator']
@@ -0,0 +1,134 @@
+import concurrent.futures
+
+import pytest
+from web3.exceptions import ContractLogicError
+
+from automator.base.main import ConnectionHelperBase
+from automator.contracts import MoC
+from automator.tasks import AutomatorTasks
+from automator.tasks_manager import Task
+
+
+@pytest.fixture
+def moc(node, connection_manager, automator_config):
+
+    # the transactions are settlement steps, enough for all of them
+    node.enable_settlement(steps=1000)
+    return MoC(connection_manager, contract_address=automator_config['addresses']['MoC'])
+
+
+def send(connection_manager, moc, **kwargs):
+
+    return connection_manager.send_function_transaction(moc.sc.functions.runSettlement, 1,
+                                                        gas_limit=500000, **kwargs)
+
+
+def test_consecutive_nonces_without_asking_the_node(node, connection_manager):
+
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+
+    node.reset_stats()
+    nonces = [nonce_manager.allocate(address) for _ in range(3)]
+
+    assert nonces == [nonces[0], nonces[0] + 1, nonces[0] + 2]
+    assert node.stats()['methods']['eth_getTransactionCount'] == 1
+    assert nonce_manager.in_flight[address] == set(nonces)
+
+
+def test_release(connection_manager):
+
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+
+    first = nonce_manager.allocate(address)
+    second = nonce_manager.allocate(address)
+
+    # the last one is given back
+    nonce_manager.release(address, second)
+    assert nonce_manager.allocate(address) == second
+
+    # an older one would leave a gap: sync with the node
+    nonce_manager.release(address, first)
+    assert address not in nonce_manager.next_nonce
+    assert nonce_manager.allocate(address) == first
+
+
+def test_sent_transactions_use_consecutive_nonces(node, connection_manager, moc):
+
+    for _ in range(3):
+        send(connection_manager, moc)
+    node.mine()
+
+    nonces = sorted(tx['nonce'] for tx in node.transactions.values())
+    assert nonces == [0, 1, 2]
+    assert all(int(receipt['status'], 16) == 1 for receipt in node.receipts.values())
+
+
+def test_stale_nonce_after_transactions_sent_from_outside(node, automator_config, connection_manager, moc):
+
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+    nonce_manager.sync(address)
+
+    # another process with the same account
+    other = ConnectionHelperBase(automator_config).connection_manager
+    send(other, moc)
+    send(other, moc)
+    node.mine()
+
+    nonce_manager.check(address, connection_manager.web3.eth.get_transaction_count(address))
+
+    tx_hash = send(connection_manager, moc)
+    node.mine()
+
+    assert node.transactions[tx_hash.to_0x_hex()]['nonce'] == 2
+    assert int(node.receipts[tx_hash.to_0x_hex()]['status'], 16) == 1
+
+
+def test_gap_resets(node, connection_manager):
+
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+
+    nonce = nonce_manager.allocate(address)
+    nonce_manager.in_flight[address].discard(nonce)
+
+    # nothing in flight but the node is behind the local nonce
+    nonce_manager.check(address, nonce)
+
+    assert address not in nonce_manager.next_nonce
+    assert nonce_manager.allocate(address) == nonce
+
+
+def test_concurrent_allocations_after_reset(node, connection_manager):
+
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+    nonce_manager.reset(address)
+
+    # both threads find the address unknown while the node answers
+    node.method_latency['eth_getTransactionCount'] = 0.2
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        nonces = list(executor.map(lambda _: nonce_manager.allocate(address), range(2)))
+
+    assert sorted(nonces) == [0, 1]
+
+
+def test_failed_send_releases_the_nonce(node, automator_config):
+
+    automator = AutomatorTasks(automator_config)
+    nonce_manager = automator.connection_helper.connection_manager.nonce_manager
+    address = automator.connection_helper.connection_manager.accounts[0].address
+    task = Task(None, task_name='Failed Send')
+
+    def tx_function(*args, **kwargs):
+        # not a ValueError, ex. simulation reverted under web3 8
+        raise ContractLogicError('execution reverted')
+
+    with pytest.raises(ContractLogicError):
+        automator.send_task_transaction(task, dict(pending_transactions=list()), tx_function,
+                                        task_settings=automator_config['tasks']['run_settlement'])
+
+    assert nonce_manager.in_flight[address] == set()
+    assert nonce_manager.allocate(address) == 0
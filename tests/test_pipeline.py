@@ -0,0 +1,158 @@
+import datetime
+
+import pytest
+from eth_account import Account
+
+from automator.tasks import AutomatorTasks
+from automator.tasks_manager import Task, update_pending_transactions
+
+
+SETTLEMENT = '2. Run Settlement'
+
+
+def pending_tx(nonce, seconds_ago=0):
+
+    return dict(hash=(nonce + 1).to_bytes(32, 'big'), nonce=nonce, gas_price=1, timeout=240,
+                timestamp=datetime.datetime.now() - datetime.timedelta(seconds=seconds_ago))
+
+
+def pipeline_task(*txs):
+
+    task = Task(None, task_name='Pipeline')
+    task.pending_transactions = list(txs)
+    return task
+
+
+def test_mined_transactions_leave_the_pipeline():
+
+    first, second = pending_tx(1), pending_tx(2)
+    task = pipeline_task(first, second)
+
+    pending_txs, confirmed_txs = update_pending_transactions(
+        task, 1, [(first, True, dict(status=1, blockNumber=10)), (second, True, None)])
+
+    assert pending_txs == [second]
+    assert confirmed_txs == [(first['hash'], 10)]
+
+
+def test_reverted_transaction_leaves_the_pipeline():
+
+    first, second = pending_tx(1), pending_tx(2)
+    task = pipeline_task(first, second)
+
+    pending_txs, confirmed_txs = update_pending_transactions(
+        task, 1, [(first, True, dict(status=0, blockNumber=10)), (second, True, None)])
+
+    assert pending_txs == [second]
+    assert confirmed_txs == []
+
+
+def test_timeout_clears_the_pipeline():
+
+    first, second = pending_tx(1, seconds_ago=300), pending_tx(2)
+    task = pipeline_task(first, second)
+
+    pending_txs, confirmed_txs = update_pending_transactions(task, 1, [(first, True, None), (second, True, None)])
+
+    assert pending_txs == []
+
+
+def test_nonce_past_the_pipeline_clears_it():
+
+    first, second = pending_tx(1), pending_tx(2)
+    task = pipeline_task(first, second)
+
+    pending_txs, confirmed_txs = update_pending_transactions(task, 3, [(first, True, None), (second, True, None)])
+
+    assert pending_txs == []
+
+
+def test_dropped_transaction_keeps_pending():
+
+    first = pending_tx(1)
+    task = pipeline_task(first)
+
+    pending_txs, confirmed_txs = update_pending_transactions(task, 1, [(first, False, None)])
+
+    assert pending_txs == [first]
+
+
+@pytest.fixture
+def pipeline_config(automator_config):
+
+    settings = automator_config['tasks']['run_settlement']
+    settings['partial_execution_steps'] = 4
+    settings['pipeline'] = dict(depth=3)
+    settings.get('adaptive_steps', dict())['enabled'] = False
+
+    return automator_config
+
+
+def run_task(automator, task_name):
+
+    task = next(task for task in automator.tasks.values() if task.task_name == task_name)
+    result = task.func(*task.args, task=task, global_manager=dict())
+    task.pending_transactions = result['pending_transactions']
+
+    return task
+
+
+def settlement_steps(node):
+
+    moc = node.contracts['MoC']
+    return [(tx['nonce'], moc.decode_input(tx['input'])[1][0]) for tx in node.transactions.values()
+            if moc.decode_input(tx['input'])[0] == 'runSettlement']
+
+
+def test_steps_in_flight_bounded_by_the_work_left(node, pipeline_config):
+
+    automator = AutomatorTasks(pipeline_config)
+    node.enable_settlement(steps=10)
+    node.mine()
+
+    task = run_task(automator, SETTLEMENT)
+    assert settlement_steps(node) == [(0, 4), (1, 4), (2, 4)]
+    assert len(task.pending_transactions) == 3
+
+    # pipeline full, nothing else is sent
+    run_task(automator, SETTLEMENT)
+    assert len(node.transactions) == 3
+
+    node.mine()
+    task = run_task(automator, SETTLEMENT)
+
+    assert task.pending_transactions == []
+    assert all(int(receipt['status'], 16) == 1 for receipt in node.receipts.values())
+    assert len(node.transactions) == 3
+
+
+def test_one_step_for_a_short_queue(node, pipeline_config):
+
+    automator = AutomatorTasks(pipeline_config)
+    node.enable_settlement(steps=3)
+    node.mine()
+
+    run_task(automator, SETTLEMENT)
+    node.mine()
+    run_task(automator, SETTLEMENT)
+
+    assert settlement_steps(node) == [(0, 4)]
+    assert all(int(receipt['status'], 16) == 1 for receipt in node.receipts.values())
+
+
+def test_pending_account_not_in_the_sender_pool(node, pipeline_config):
+    """ Pending transactions of an account removed from ACCOUNT_PK_SECRET (ex. recovered from
+    the journal) do not stop the task, the next step goes from the sender pool """
+
+    automator = AutomatorTasks(pipeline_config)
+    node.enable_settlement(steps=10)
+    node.mine()
+
+    removed = Account.create().address
+    task = next(task for task in automator.tasks.values() if task.task_name == SETTLEMENT)
+    task.pending_transactions = [dict(pending_tx(0), account=removed)]
+
+    task = run_task(automator, SETTLEMENT)
+
+    sender = automator.connection_helper.connection_manager.accounts[0].address
+    assert [tx['account'] for tx in task.pending_transactions][1:] == [sender, sender]
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from web3 import Web3
+
+from automator.base.metrics import metrics
+from automator.base.provider import NodePoolProvider
+from benchmarks.mock_node import MockNode
+
+
+@pytest.fixture
+def second_node(config):
+
+    node = MockNode.from_config(config)
+    node.start()
+    yield node
+    node.stop()
+
+
+def test_failover_to_the_next_node(node, second_node):
+
+    pool = NodePoolProvider([node.uri, second_node.uri], health_check_interval=0, down_time=60)
+    web3 = Web3(pool)
+    second_node.mine(5)
+
+    # answers 503
+    node.fail_next_requests = 1
+    assert web3.eth.block_number == second_node.block_number
+    assert [status['healthy'] for status in pool.stats()] == [False, True]
+
+    # down for down_time, not asked again
+    node.reset_stats()
+    assert web3.eth.block_number == second_node.block_number
+    assert node.stats().get('requests', 0) == 0
+
+
+def test_down_node_is_readmitted(node, second_node):
+
+    pool = NodePoolProvider([node.uri, second_node.uri], health_check_interval=0, down_time=0)
+    web3 = Web3(pool)
+
+    node.fail_next_requests = 1
+    web3.eth.block_number
+    assert not pool.stats()[0]['healthy']
+
+    pool.health_check()
+    assert [status['healthy'] for status in pool.stats()] == [True, True]
+
+
+def test_lagging_node_is_out(node, second_node):
+
+    pool = NodePoolProvider([node.uri, second_node.uri], health_check_interval=0, max_block_lag=3)
+    web3 = Web3(pool)
+    second_node.mine(5)
+
+    pool.health_check()
+
+    assert [status['healthy'] for status in pool.stats()] == [False, True]
+    assert web3.eth.block_number == second_node.block_number
+
+
+def test_all_the_nodes_failed(node, second_node):
+
+    pool = NodePoolProvider([node.uri, second_node.uri], health_check_interval=0)
+    web3 = Web3(pool)
+    node.fail_next_requests = second_node.fail_next_requests = 1
+
+    with pytest.raises(ConnectionError):
+        web3.eth.block_number
+
+
+def hedge_counter(name, **labels):
+
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+
+def test_slow_node_is_hedged_and_the_fast_one_wins(node, second_node):
+
+    pool = NodePoolProvider([node.uri, second_node.uri], health_check_interval=0, hedge_max_delay=0.05)
+    web3 = Web3(pool)
+    second_node.mine(5)
+    sent = hedge_counter('automator_hedge_sent_total', method='eth_blockNumber', reason='slow')
+    won = hedge_counter('automator_hedge_won_total', method='eth_blockNumber')
+
+    node.method_latency['eth_blockNumber'] = 1.0
+    with pool.hedging():
+        start = time.monotonic()
+        assert web3.eth.block_number == second_node.block_number
+
+    assert time.monotonic() - start < 0.5
+    assert hedge_counter('automator_hedge_sent_total', method='eth_blockNumber', reason='slow') == sent + 1
+    assert hedge_counter('automator_hedge_won_total', method='eth_blockNumber') == won + 1
+    assert pool.hedge_metrics() == dict(requests=1, fired=1, failover=0, won=1)
@@ -0,0 +1,51 @@
+import pytest
+
+from automator.base.main import ConnectionHelperBase
+from automator.contracts import MoC
+
+
+@pytest.fixture
+def cached_connection(automator_config):
+    """ eth_blockNumber before every read: the head is always the one of the node """
+
+    automator_config['read_cache'] = dict(enabled=True, head_max_age=0)
+    return ConnectionHelperBase(automator_config).connection_manager
+
+
+def test_reads_cached_in_the_block(node, cached_connection):
+
+    address = cached_connection.accounts[0].address
+    web3 = cached_connection.web3
+
+    balance = web3.eth.get_balance(address)
+    node.set_balance(address, balance + 1)
+
+    node.reset_stats()
+    assert web3.eth.get_balance(address) == balance
+    assert 'eth_getBalance' not in node.stats()['methods']
+    assert cached_connection.read_cache.stats()['hits'] >= 1
+
+
+def test_new_head_drops_the_entries(node, cached_connection):
+
+    address = cached_connection.accounts[0].address
+    web3 = cached_connection.web3
+
+    balance = web3.eth.get_balance(address)
+    node.set_balance(address, balance + 1)
+    node.mine()
+
+    assert web3.eth.get_balance(address) == balance + 1
+    assert cached_connection.read_cache.stats()['invalidations'] == 1
+
+
+def test_sent_transaction_drops_the_pending_nonce(node, cached_connection, automator_config):
+
+    address = cached_connection.accounts[0].address
+    web3 = cached_connection.web3
+    moc = MoC(cached_connection, contract_address=automator_config['addresses']['MoC'])
+
+    nonce = web3.eth.get_transaction_count(address, 'pending')
+    cached_connection.send_function_transaction(moc.sc.functions.runSettlement, 10, gas_limit=500000)
+
+    assert web3.eth.get_transaction_count(address, 'pending') == nonce + 1
@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+from web3 import Web3
+
+from automator.base.gas import multiply_gas_price
+from automator.base.replacement import ReplacementEngine
+from automator.contracts import MoC
+
+
+@pytest.fixture
+def stuck_tx(node, connection_manager, automator_config):
+    """ Sent with the node price, the node only mines over 10 times it """
+
+    node.enable_settlement(steps=1000)
+    node.min_gas_price = node.gas_price * 10
+    moc = MoC(connection_manager, contract_address=automator_config['addresses']['MoC'])
+    tx_hash = connection_manager.send_function_transaction(moc.sc.functions.runSettlement, 1, gas_limit=500000)
+
+    return dict(hash=tx_hash, timestamp=datetime.datetime.now(), nonce=0, timeout=240,
+                gas_price=node.transactions[Web3.to_hex(tx_hash)]['gasPrice'])
+
+
+def pending_blocks(node, engine, tx, blocks):
+
+    node.mine(blocks)
+    return engine.check('Replacement', tx)
+
+
+def test_bump_after_blocks(node, connection_manager, stuck_tx):
+
+    engine = ReplacementEngine(connection_manager, bump_after_blocks=2, bump_factor=1.4)
+    original_hash, original_gas_price = stuck_tx['hash'], stuck_tx['gas_price']
+
+    # counting from the first time seen pending
+    assert engine.check('Replacement', stuck_tx) is None
+    assert pending_blocks(node, engine, stuck_tx, 1) is None
+
+    assert pending_blocks(node, engine, stuck_tx, 1) == original_hash
+    assert stuck_tx['gas_price'] == multiply_gas_price(original_gas_price, 1.4)
+    assert stuck_tx['original_gas_price'] == original_gas_price
+    assert Web3.to_hex(original_hash) not in node.transactions
+    assert node.transactions[Web3.to_hex(stuck_tx['hash'])]['nonce'] == stuck_tx['nonce']
+
+    node.min_gas_price = 0
+    node.mine()
+    assert int(node.receipts[Web3.to_hex(stuck_tx['hash'])]['status'], 16) == 1
+
+
+def test_max_bumps(node, connection_manager, stuck_tx):
+
+    engine = ReplacementEngine(connection_manager, bump_after_blocks=1, max_bumps=1)
+
+    engine.check('Replacement', stuck_tx)
+    assert pending_blocks(node, engine, stuck_tx, 1) is not None
+    assert pending_blocks(node, engine, stuck_tx, 1) is None
+    assert len(stuck_tx['replacements']) == engine.count == 1
+
+
+def test_gas_price_cap(node, connection_manager, stuck_tx):
+
+    engine = ReplacementEngine(connection_manager, bump_after_blocks=1, bump_factor=1.4, max_gas_price_factor=1.6)
+    original_gas_price = stuck_tx['gas_price']
+
+    engine.check('Replacement', stuck_tx)
+    pending_blocks(node, engine, stuck_tx, 1)
+    assert pending_blocks(node, engine, stuck_tx, 1) is not None
+    assert stuck_tx['gas_price'] == multiply_gas_price(original_gas_price, 1.6)
+
+    # at the cap: not replaced anymore
+    assert pending_blocks(node, engine, stuck_tx, 1) is None
+    assert len(stuck_tx['replacements']) == 2
+
+
+def test_no_underpriced_replacement_under_the_cap(node, connection_manager, stuck_tx):
+
+    engine = ReplacementEngine(connection_manager, bump_after_blocks=1, bump_factor=1.4, max_gas_price_factor=1.5)
+    original_gas_price = stuck_tx['gas_price']
+
+    engine.check('Replacement', stuck_tx)
+    pending_blocks(node, engine, stuck_tx, 1)
+    assert stuck_tx['gas_price'] == multiply_gas_price(original_gas_price, 1.4)
+
+    # 1.5 is less than 1.1 times 1.4, the node would answer underpriced
+    node.reset_stats()
+    assert pending_blocks(node, engine, stuck_tx, 1) is None
+    assert 'eth_sendRawTransaction' not in node.stats()['methods']
@@ -0,0 +1,52 @@
+import pytest
+from eth_account import Account
+
+from automator.base.main import ConnectionHelperBase
+from automator.tasks import AutomatorTasks
+from automator.tasks_manager import Task
+from benchmarks.mock_node import DEV_PRIVATE_KEY
+
+
+@pytest.fixture
+def second_account(node, monkeypatch):
+
+    account = Account.create()
+    node.set_balance(account.address, 10 ** 20)
+    monkeypatch.setenv('ACCOUNT_PK_SECRET', '{0},{1}'.format(DEV_PRIVATE_KEY, account.key.hex()))
+
+    return account
+
+
+def test_every_task_on_the_first_account_by_default(automator_config, second_account):
+
+    sender_pool = ConnectionHelperBase(automator_config).connection_manager.sender_pool
+
+    assert [sender_pool.select(task_name) for task_name in ('A', 'B', 'C')] == [0, 0, 0]
+    # only an explicit account in the task settings
+    assert sender_pool.select('D', dict(account=1)) == 1
+
+
+def test_pinned_spreads_the_tasks(automator_config, second_account):
+
+    automator_config['senders'] = dict(policy='pinned')
+    sender_pool = ConnectionHelperBase(automator_config).connection_manager.sender_pool
+
+    assert [sender_pool.select(task_name) for task_name in ('A', 'B', 'A')] == [0, 1, 0]
+
+
+def test_pending_account_does_not_take_a_turn(node, automator_config, second_account):
+
+    automator_config['senders'] = dict(policy='round_robin')
+    automator = AutomatorTasks(automator_config)
+    connection_manager = automator.connection_helper.connection_manager
+    node.enable_settlement(steps=10)
+    node.mine()
+
+    # the next step goes from the account of the transactions in flight
+    task = Task(None, task_name='Pipeline')
+    task_result = dict(pending_transactions=[dict(account=second_account.address)])
+    automator.send_task_transaction(task, task_result, automator.contracts_loaded['MoC'].run_settlement, 1,
+                                    task_settings=automator_config['tasks']['run_settlement'])
+
+    assert task_result['pending_transactions'][-1]['account'] == second_account.address
+    assert connection_manager.sender_pool.select('Other') == 0
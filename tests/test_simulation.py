@@ -0,0 +1,49 @@
+import pytest
+
+from automator.base.main import ConnectionHelperBase
+from automator.base.network import SimulationReverted
+from automator.contracts import MoC
+
+
+@pytest.fixture
+def simulation_config(automator_config):
+
+    automator_config['simulation'] = dict(enabled=True, block_identifier='pending')
+    return automator_config
+
+
+@pytest.fixture
+def moc(simulation_config):
+
+    connection_manager = ConnectionHelperBase(simulation_config).connection_manager
+    return MoC(connection_manager, contract_address=simulation_config['addresses']['MoC'])
+
+
+def send(moc):
+
+    return moc.connection_manager.send_function_transaction(moc.sc.functions.runSettlement, 1, gas_limit=500000)
+
+
+def test_reverting_transaction_is_not_sent(node, moc):
+
+    address = moc.connection_manager.accounts[0].address
+    node.contracts['MoC'].reverts['runSettlement'] = 'Settlement not yet in progress'
+
+    with pytest.raises(SimulationReverted, match='Settlement not yet in progress'):
+        send(moc)
+
+    assert node.transactions == dict()
+    # the nonce was not used
+    assert moc.connection_manager.nonce_manager.allocate(address) == 0
+
+
+def test_good_transaction_is_sent(node, moc):
+
+    node.enable_settlement(steps=10)
+    node.mine()
+    node.reset_stats()
+
+    send(moc)
+
+    assert node.stats()['methods']['eth_call'] == 1
+    assert len(node.transactions) == 1
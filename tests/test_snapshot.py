@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from automator.base.snapshot import AddressesSnapshot
+from automator.tasks import AutomatorTasks
+
+
+@pytest.fixture
+def snapshot_config(automator_config, tmp_path):
+
+    automator_config['addresses_snapshot'] = dict(enabled=True, path=os.path.join(tmp_path, 'addresses.json'))
+    return automator_config
+
+
+def test_addresses_discovered_in_three_calls(node, automator_config):
+
+    node.reset_stats()
+    automator = AutomatorTasks(automator_config)
+
+    # connector, the 4 contracts of the connector in one Multicall2 and the price provider
+    assert node.stats()['methods']['eth_call'] == 3
+    assert automator.contracts_addresses['MoCState'].lower() == node.contracts['MoCState'].address.lower()
+
+
+def test_warm_restart_from_the_snapshot(node, snapshot_config, monkeypatch):
+
+    discovered = AutomatorTasks(snapshot_config).contracts_addresses
+    snapshot = AddressesSnapshot(snapshot_config['addresses_snapshot']['path'])
+    addresses = snapshot.load(snapshot_config['chain_id'], snapshot_config['addresses']['MoC'])
+    assert {name: address.lower() for name, address in addresses.items()} == \
+        {name: discovered[name].lower() for name in addresses}
+
+    # without the verification in background, nothing is asked to the node
+    monkeypatch.setattr(AutomatorTasks, 'verify_addresses_snapshot', lambda self, addresses: None)
+    node.reset_stats()
+    automator = AutomatorTasks(snapshot_config)
+
+    assert automator.contracts_addresses == discovered
+    assert 'eth_call' not in node.stats()['methods']
+
+
+def test_not_valid_snapshot_is_ignored(node, snapshot_config):
+
+    with open(snapshot_config['addresses_snapshot']['path'], 'w') as f:
+        f.write('{not json')
+
+    automator = AutomatorTasks(snapshot_config)
+
+    assert automator.contracts_addresses['MoCState'].lower() == node.contracts['MoCState'].address.lower()
+    with open(snapshot_config['addresses_snapshot']['path']) as f:
+        assert len(json.load(f)) == 1
@@ -0,0 +1,63 @@
+from automator.base.metrics import metrics
+from automator.steps import StepsController
+
+
+def test_initial_steps_without_receipts():
+
+    controller = StepsController('Steps', gas_limit=1000000, initial_steps=20)
+
+    assert controller.steps() == 20
+
+
+def test_largest_steps_under_the_budget():
+
+    controller = StepsController('Steps', gas_limit=1000000, initial_steps=20, safety_margin=0.2)
+
+    controller.observe(10, 100000, 1)
+    # a run with less work uses less gas per step, the max is kept
+    controller.observe(10, 50000, 1)
+
+    assert controller.steps() == 80
+
+
+def test_out_of_gas_counts_the_gas_limit():
+
+    controller = StepsController('Steps', gas_limit=1000000, initial_steps=20, safety_margin=0.2)
+
+    controller.observe(20, 990000, 0)
+
+    assert controller.steps() == 16
+    assert controller.stats()['out_of_gas'] == 1
+
+
+def test_min_and_max_steps():
+
+    controller = StepsController('Steps', gas_limit=1000000, initial_steps=20, min_steps=5, max_steps=50)
+
+    controller.observe(1, 10000, 1)
+    assert controller.steps() == 50
+
+    controller.observe(1, 900000, 1)
+    assert controller.steps() == 5
+
+
+def test_only_enabled_in_the_settings():
+
+    settings = dict(gas_limit=1000000, partial_execution_steps=20)
+    assert StepsController.from_settings('Steps', settings) is None
+
+    settings['adaptive_steps'] = dict(enabled=True, max_steps=100)
+    assert StepsController.from_settings('Steps', settings).max_steps == 100
+
+
+def test_choices_and_gas_used_exported():
+
+    controller = StepsController('Exported Steps', gas_limit=1000000, initial_steps=20)
+
+    controller.steps()
+    controller.observe(20, 990000, 0)
+
+    labels = dict(task='Exported Steps')
+    assert metrics.registry.get_sample_value('automator_steps_chosen', labels) == 20
+    assert metrics.registry.get_sample_value('automator_steps_gas_used_sum', labels) == 1000000
+    assert metrics.registry.get_sample_value('automator_steps_out_of_gas_total', labels) == 1
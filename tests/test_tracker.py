@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+from web3 import Web3
+
+from automator.base.tracker import PendingTransactionsTracker
+from automator.contracts import MoC
+from automator.tasks_manager import PendingTransactionsTasksManager, Task
+
+
+@pytest.fixture
+def moc(node, connection_manager, automator_config):
+
+    node.enable_settlement(steps=1000)
+    return MoC(connection_manager, contract_address=automator_config['addresses']['MoC'])
+
+
+def send(connection_manager, moc):
+
+    return connection_manager.send_function_transaction(moc.sc.functions.runSettlement, 1, gas_limit=500000)
+
+
+def pending_tx(connection_manager, tx_hash, nonce):
+
+    return dict(hash=tx_hash, timestamp=datetime.datetime.now(), gas_price=connection_manager.web3.eth.gas_price,
+                nonce=nonce, timeout=240, account=connection_manager.accounts[0].address)
+
+
+def test_one_batch_per_block(node, connection_manager, moc):
+
+    address = connection_manager.accounts[0].address
+    mined_hash = Web3.to_hex(send(connection_manager, moc))
+    node.mine()
+    pending_hash = Web3.to_hex(send(connection_manager, moc))
+    unknown_hash = '0x' + 'ab' * 32
+
+    tracker = PendingTransactionsTracker(connection_manager, lambda: [mined_hash, pending_hash, unknown_hash])
+
+    node.reset_stats()
+    nonce, status = tracker.lookup([mined_hash], address)
+    assert tracker.lookup([pending_hash, unknown_hash], address)[1] == [(True, None), (False, None)]
+
+    assert node.stats()['batches'] == 1
+    assert nonce == 1
+    found, receipt = status[0]
+    assert found
+    assert receipt == connection_manager.web3.eth.get_transaction_receipt(mined_hash)
+
+    node.mine()
+    tracker.lookup([pending_hash], address)
+    assert node.stats()['batches'] == 2
+
+
+def test_dropped_transaction_resets_the_nonce_once(node, automator_config, connection_helper, connection_manager,
+                                                   moc):
+
+    manager = PendingTransactionsTasksManager(automator_config, connection_helper, dict())
+    nonce_manager = connection_manager.nonce_manager
+    address = connection_manager.accounts[0].address
+
+    node.drop_next_transactions = 1
+    tx_hash = send(connection_manager, moc)
+    node.mine()
+
+    task = Task(None, task_name='Dropped')
+    task.pending_transactions = [pending_tx(connection_manager, tx_hash, 0)]
+
+    manager.pending_transactions(task)
+    assert task.pending_transactions[0]['dropped']
+    assert address not in nonce_manager.next_nonce
+
+    # the nonce of the dropped transaction is used again, and not reset on the next block
+    assert nonce_manager.allocate(address) == 0
+    node.mine()
+    manager.pending_transactions(task)
+    assert nonce_manager.next_nonce[address] == 1
+
@@ -0,0 +1,52 @@
+import time
+
+from automator.base.watcher import BlockWatcher
+
+
+def wait_for(condition, timeout=5):
+
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_subscribers_called_once_per_new_block(node, connection_manager):
+
+    watcher = BlockWatcher(connection_manager, poll_interval=0.01)
+    blocks = list()
+    watcher.subscribe(blocks.append)
+    watcher.start()
+    try:
+        wait_for(lambda: blocks)
+        node.mine()
+        wait_for(lambda: len(blocks) == 2)
+        # polled many times without a new block
+        time.sleep(0.1)
+    finally:
+        watcher.stop()
+
+    assert blocks == [node.block_number - 1, node.block_number]
+
+
+def test_older_heads_are_ignored(connection_manager):
+
+    watcher = BlockWatcher(connection_manager)
+    blocks = list()
+    watcher.subscribe(blocks.append)
+
+    for block_number in (10, 10, 9, 11):
+        watcher.on_block_number(block_number)
+
+    assert blocks == [10, 11]
+
+
+def test_subscriber_error_does_not_stop_the_others(connection_manager):
+
+    watcher = BlockWatcher(connection_manager)
+    blocks = list()
+    watcher.subscribe(lambda block_number: 1 / 0)
+    watcher.subscribe(blocks.append)
+
+    watcher.on_block_number(10)
+
+    assert blocks == [10]